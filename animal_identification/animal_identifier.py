@@ -3,12 +3,34 @@
 Animal Identifier using SpeciesNet
 
 This script runs the SpeciesNet classifier to identify wildlife in camera trap images.
+
+Any arguments are passed straight to SpeciesNet's run_model, as before. The
+"bulk" subcommand instead classifies a whole directory tree across a pool of
+worker processes, checkpointing after every shard so that a rerun picks up
+where a crashed or interrupted run stopped:
+
+    python animal_identifier.py bulk /data/camera_traps --predictions traps.json --workers 4
 """
 
+import argparse
+import json
+import multiprocessing
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
+from model_backends import BACKENDS, ONNX_PRECISIONS
+from tiered_inference import DEFAULT_ANIMAL_THRESHOLD, summarise_tiers
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".avif", ".heic"}
+
+# Set in each bulk worker process by _init_worker
+_model = None
+_load_seconds = 0.0
+
 
 def check_dependencies():
     """Check if speciesnet package is installed."""
@@ -27,15 +49,15 @@ def run_speciesnet():
     # Check for required packages
     if not check_dependencies():
         sys.exit(1)
-    
+
     # Import the run_model module
     from speciesnet.scripts import run_model
-    
+
     # Get the command line arguments (excluding the script name)
     argv = sys.argv[1:]
-    
+
     print(f"\nRunning SpeciesNet with arguments: {' '.join(argv)}")
-    
+
     # Run the model with the arguments
     try:
         run_model.main(argv)
@@ -45,5 +67,231 @@ def run_speciesnet():
         sys.exit(1)
 
 
+def find_images(root):
+    """Every image under root, in a stable order."""
+    images = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if Path(name).suffix.lower() in IMAGE_EXTENSIONS:
+                images.append(os.path.abspath(os.path.join(dirpath, name)))
+    return images
+
+
+def checkpoint_path_for(predictions_path):
+    return f"{predictions_path}.checkpoint.jsonl"
+
+
+def load_checkpoint(predictions_path):
+    """Predictions from a previous run, by filepath: the final file plus any checkpointed shards."""
+    done = {}
+    if os.path.exists(predictions_path):
+        with open(predictions_path, "r") as f:
+            for prediction in json.load(f).get("predictions", []):
+                done[prediction["filepath"]] = prediction
+
+    checkpoint = checkpoint_path_for(predictions_path)
+    if os.path.exists(checkpoint):
+        with open(checkpoint, "r") as f:
+            for line in f:
+                try:
+                    prediction = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write; that image is simply redone
+                    continue
+                done[prediction["filepath"]] = prediction
+
+    # Failed images are retried, successfully classified ones are skipped
+    return {path: p for path, p in done.items() if not p.get("failures")}
+
+
+def write_predictions(predictions_path, predictions):
+    """Write the final predictions file atomically."""
+    partial = f"{predictions_path}.partial"
+    with open(partial, "w") as f:
+        json.dump({"predictions": predictions}, f, indent=1)
+    os.replace(partial, predictions_path)
+
+
+def _init_worker(model_name, tiered_threshold=None, backend="speciesnet", backend_options=None):
+    """Load SpeciesNet once per worker process."""
+    global _model, _load_seconds
+    from model_backends import load_model
+
+    started = time.perf_counter()
+    _model = load_model(backend, model_name, tiered_threshold, **(backend_options or {}))
+    _load_seconds = time.perf_counter() - started
+
+
+def _classify_shard(filepaths, batch_size):
+    """Classify one shard in a worker; returns (pid, model load seconds, inference seconds, predictions)."""
+    started = time.perf_counter()
+    output = _model.predict(filepaths=filepaths, batch_size=batch_size, progress_bars=False)
+    seconds = time.perf_counter() - started
+    return os.getpid(), _load_seconds, seconds, (output or {}).get("predictions", [])
+
+
+def run_bulk(
+    root,
+    predictions_path,
+    workers=1,
+    shard_size=64,
+    batch_size=8,
+    model_name=None,
+    tiered_threshold=None,
+    backend="speciesnet",
+    backend_options=None,
+):
+    """
+    Classify every image under root into predictions_path, resuming from any checkpoint.
+
+    Returns a per-stage timing summary.
+    """
+    stages = {}
+
+    started = time.perf_counter()
+    images = find_images(root)
+    stages["scan"] = {"seconds": time.perf_counter() - started, "items": len(images)}
+
+    started = time.perf_counter()
+    done = load_checkpoint(predictions_path)
+    todo = [path for path in images if path not in done]
+    stages["resume"] = {"seconds": time.perf_counter() - started, "items": len(images) - len(todo)}
+
+    print(f"Found {len(images)} images; {len(images) - len(todo)} already classified, {len(todo)} to go")
+
+    shards = [todo[i:i + shard_size] for i in range(0, len(todo), shard_size)]
+    load_seconds = {}
+    fresh = []
+    inference_seconds = 0.0
+    checkpoint_seconds = 0.0
+    classified = 0
+    crashed = False
+
+    run_started = time.perf_counter()
+    if shards:
+        ctx = multiprocessing.get_context("spawn")
+        with open(checkpoint_path_for(predictions_path), "a") as checkpoint, ProcessPoolExecutor(
+            max_workers=min(workers, len(shards)),
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(model_name, tiered_threshold, backend, backend_options),
+        ) as pool:
+            futures = [pool.submit(_classify_shard, shard, batch_size) for shard in shards]
+            for future in as_completed(futures):
+                try:
+                    pid, load, seconds, predictions = future.result()
+                except BrokenProcessPool:
+                    crashed = True
+                    break
+                except Exception as e:
+                    print(f"Shard failed: {e}")
+                    continue
+
+                load_seconds[pid] = load
+                inference_seconds += seconds
+
+                t0 = time.perf_counter()
+                for prediction in predictions:
+                    checkpoint.write(json.dumps(prediction) + "\n")
+                    done[prediction["filepath"]] = prediction
+                fresh.extend(predictions)
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+                checkpoint_seconds += time.perf_counter() - t0
+
+                classified += len(predictions)
+                elapsed = time.perf_counter() - run_started
+                print(f"{classified}/{len(todo)} classified ({classified / elapsed:.1f} images/s)")
+    wall = time.perf_counter() - run_started
+
+    if crashed:
+        print("\nA worker process died; progress so far is checkpointed. Rerun the same command to resume.")
+
+    stages["model_load"] = {"seconds": sum(load_seconds.values()), "items": len(load_seconds)}
+    stages["inference"] = {"seconds": inference_seconds, "items": classified}
+    stages["checkpoint"] = {"seconds": checkpoint_seconds, "items": classified}
+
+    started = time.perf_counter()
+    ordered = [done[path] for path in images if path in done]
+    write_predictions(predictions_path, ordered)
+    if not crashed and len(ordered) == len(images):
+        Path(checkpoint_path_for(predictions_path)).unlink(missing_ok=True)
+    stages["write"] = {"seconds": time.perf_counter() - started, "items": len(ordered)}
+
+    return {
+        "images": len(images),
+        "skipped": len(images) - len(todo),
+        "classified": classified,
+        "remaining": len(images) - len(ordered),
+        "wall_seconds": wall,
+        "images_per_s": classified / wall if wall else 0.0,
+        "stages": stages,
+        "tiered": summarise_tiers(fresh),
+        "crashed": crashed,
+    }
+
+
+def print_summary(summary):
+    print("\nThroughput summary")
+    print(f"  {summary['classified']} images classified in {summary['wall_seconds']:.1f}s "
+          f"({summary['images_per_s']:.2f} images/s overall), {summary['skipped']} skipped, "
+          f"{summary['remaining']} remaining")
+    for name, stage in summary["stages"].items():
+        rate = stage["items"] / stage["seconds"] if stage["seconds"] else 0.0
+        unit = "workers" if name == "model_load" else "images"
+        print(f"  {name:<11} {stage['seconds']:8.2f}s  {stage['items']:>8} {unit:<8} {rate:10.1f}/s")
+    tiers = summary.get("tiered")
+    if tiers:
+        saved = tiers["estimated_seconds_saved"]
+        print(f"  tiered: classifier skipped on {tiers['classifier_skipped']}/{tiers['images']} images "
+              f"({tiers['skip_rate']:.0%}), detector {tiers['detector_seconds']:.1f}s, "
+              f"classifier {tiers['classifier_seconds']:.1f}s"
+              + (f", ~{saved:.1f}s of classifier time saved" if saved is not None else ""))
+
+
+def run_bulk_cli(argv):
+    parser = argparse.ArgumentParser(prog="animal_identifier.py bulk", description="Classify a directory tree of images")
+    parser.add_argument("root", help="Directory to walk for images")
+    parser.add_argument("--predictions", required=True, help="Predictions JSON to write (and resume from)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Worker processes")
+    parser.add_argument("--shard-size", type=int, default=64, help="Images per shard (the checkpoint unit)")
+    parser.add_argument("--batch-size", type=int, default=8, help="SpeciesNet batch size within a shard")
+    parser.add_argument("--model", default=None, help="SpeciesNet model name (default: the package default)")
+    parser.add_argument("--tiered", type=float, nargs="?", const=DEFAULT_ANIMAL_THRESHOLD, default=None,
+                        metavar="THRESHOLD",
+                        help="Run the detector first and only classify frames with an animal detection "
+                             f"at or above THRESHOLD (default {DEFAULT_ANIMAL_THRESHOLD})")
+    parser.add_argument("--backend", choices=BACKENDS, default="speciesnet", help="Model runtime (default: speciesnet)")
+    parser.add_argument("--onnx-dir", default=None, help="Exported ONNX models (default: onnx_models/ next to this script)")
+    parser.add_argument("--precision", choices=ONNX_PRECISIONS, default="int8", help="ONNX weight precision")
+    parser.add_argument("--intra-op-threads", type=int, default=0, help="ONNX Runtime threads per operator (0 = auto)")
+    parser.add_argument("--inter-op-threads", type=int, default=0, help="ONNX Runtime parallel operators (0 = auto)")
+    args = parser.parse_args(argv)
+
+    # The ONNX backend still runs SpeciesNet's pre- and post-processing; the fake one needs nothing
+    if args.backend != "fake" and not check_dependencies():
+        sys.exit(1)
+
+    backend_options = None
+    if args.backend == "onnx":
+        backend_options = {
+            "onnx_dir": args.onnx_dir,
+            "precision": args.precision,
+            "intra_op_threads": args.intra_op_threads,
+            "inter_op_threads": args.inter_op_threads,
+        }
+    summary = run_bulk(
+        args.root, args.predictions, args.workers, args.shard_size, args.batch_size,
+        args.model, args.tiered, args.backend, backend_options,
+    )
+    print_summary(summary)
+    if summary["crashed"]:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
-    run_speciesnet()
\ No newline at end of file
+    if sys.argv[1:2] == ["bulk"]:
+        run_bulk_cli(sys.argv[2:])
+    else:
+        run_speciesnet()
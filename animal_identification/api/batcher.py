@@ -0,0 +1,164 @@
+"""
+Cross-session micro-batching
+
+Images from concurrent uploads are merged into one model call, bounded by a
+maximum batch size and a maximum wait. Each image gets its own Future, so the
+predictions can be split back out to whichever session submitted them.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _Item:
+    __slots__ = ("filepath", "future", "enqueued_at")
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """Collects single-image requests and runs them through submit_batch in groups.
+
+    submit_batch(filepaths, batch_size) must return a Future that resolves to a
+    SpeciesNet-style {"predictions": [...]} dict. At most max_in_flight batches
+    are handed over at once; while every slot is busy new images keep
+    accumulating, so batches grow under load and shrink when it is quiet.
+    """
+
+    def __init__(self, submit_batch, max_batch_size=16, max_wait_ms=50, max_queue=0, max_in_flight=1):
+        self.submit_batch = submit_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_in_flight = max(1, max_in_flight)
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._slots = threading.Semaphore(self.max_in_flight)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "images": 0,
+            "failed_batches": 0,
+            "max_queue_depth": 0,
+            "total_wait_ms": 0.0,
+            "batch_sizes": {},
+        }
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            item.future.set_exception(RuntimeError("Batcher stopped"))
+
+    def submit(self, filepath):
+        """Queue one image; raises queue.Full when max_queue is reached."""
+        item = _Item(str(filepath))
+        self._queue.put_nowait(item)
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            if depth > self._stats["max_queue_depth"]:
+                self._stats["max_queue_depth"] = depth
+        return item.future
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["batch_sizes"] = dict(self._stats["batch_sizes"])
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_batch_size"] = stats["images"] / stats["batches"] if stats["batches"] else 0.0
+        stats["avg_wait_ms"] = stats["total_wait_ms"] / stats["images"] if stats["images"] else 0.0
+        stats["config"] = {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_queue": self._queue.maxsize,
+            "max_in_flight": self.max_in_flight,
+        }
+        return stats
+
+    def _collect(self):
+        """Block for the first item, then gather more until full or the wait expires."""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Take whatever is already waiting, but don't wait for more
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if not self._slots.acquire(timeout=0.5):
+                continue
+
+            batch = self._collect()
+            if not batch:
+                self._slots.release()
+                continue
+
+            now = time.monotonic()
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["images"] += len(batch)
+                self._stats["total_wait_ms"] += sum((now - item.enqueued_at) * 1000.0 for item in batch)
+                sizes = self._stats["batch_sizes"]
+                sizes[len(batch)] = sizes.get(len(batch), 0) + 1
+
+            try:
+                future = self.submit_batch([item.filepath for item in batch], len(batch))
+            except Exception as e:
+                self._finish(batch, error=e)
+                continue
+            future.add_done_callback(lambda done, batch=batch: self._on_batch_done(batch, done))
+
+    def _on_batch_done(self, batch, future):
+        try:
+            output = future.result()
+        except Exception as e:
+            self._finish(batch, error=e)
+            return
+        self._finish(batch, output=output)
+
+    def _finish(self, batch, output=None, error=None):
+        self._slots.release()
+
+        if error is not None:
+            with self._stats_lock:
+                self._stats["failed_batches"] += 1
+            for item in batch:
+                item.future.set_exception(error)
+            return
+
+        by_path = {prediction.get("filepath"): prediction for prediction in output.get("predictions", [])}
+        for item in batch:
+            prediction = by_path.get(item.filepath)
+            if prediction is None:
+                item.future.set_exception(RuntimeError(f"No prediction returned for {item.filepath}"))
+            else:
+                item.future.set_result(prediction)
@@ -0,0 +1,175 @@
+"""
+Versioned catalog of taxonomy entries joined with their descriptions
+
+Clients used to ship the whole taxonomy_release.txt and parse every line, and
+never got the descriptions at all. The catalog is one entry per taxonomy UUID
+(the taxonomy fields plus its description) kept in SQLite with a version:
+
+- refresh() rebuilds the entries from the taxonomy and description store and
+  bumps the catalog version only if something changed; changed and new
+  entries are stamped with the new version, removed ones become tombstones
+- full() is the whole catalog at the current version
+- delta(since) is only what changed after version since: changed entries and
+  the UUIDs of removed ones, so a client that synced before downloads
+  kilobytes instead of the full catalog
+
+Run as a script to refresh the catalog and write a gzip bundle, e.g. to ship
+with an app build:
+
+    python catalog.py --db catalog.sqlite3 --out catalog.json.gz
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from taxonomy import entry_name, entry_to_dict
+
+NO_DESCRIPTION = "No description found."
+
+
+def build_entries(taxonomy, description_rows):
+    """{uuid: catalog entry} joining each taxonomy entry with its description by UUID, then name."""
+    by_uuid, by_name = {}, {}
+    for row in description_rows:
+        if row["description"] == NO_DESCRIPTION:
+            continue
+        if row.get("uuid"):
+            by_uuid.setdefault(row["uuid"], row)
+        by_name.setdefault(row["name"], row)
+
+    entries = {}
+    for entry in taxonomy.entries:
+        row = by_uuid.get(entry.uuid) or by_name.get(entry_name(entry).lower())
+        item = entry_to_dict(entry)
+        item["description"] = row["description"] if row else None
+        entries[entry.uuid] = item
+    return entries
+
+
+class Catalog:
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS catalog_entries (
+                uuid TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                payload TEXT,
+                version INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS catalog_entries_version ON catalog_entries (version);
+            CREATE TABLE IF NOT EXISTS catalog_meta (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            INSERT OR IGNORE INTO catalog_meta (id, version, updated_at) VALUES (1, 0, 0);
+            """
+        )
+        self._conn.commit()
+
+    @property
+    def version(self):
+        with self._lock:
+            return self._conn.execute("SELECT version FROM catalog_meta").fetchone()[0]
+
+    def refresh(self, taxonomy, description_rows):
+        """Bring the catalog up to date; returns (version, entries changed or removed)."""
+        entries = build_entries(taxonomy, description_rows)
+        payloads = {uuid: json.dumps(item, sort_keys=True, ensure_ascii=False) for uuid, item in entries.items()}
+        digests = {uuid: hashlib.sha1(payload.encode()).hexdigest() for uuid, payload in payloads.items()}
+
+        with self._lock, self._conn:
+            version = self._conn.execute("SELECT version FROM catalog_meta").fetchone()[0]
+            stored = dict(self._conn.execute("SELECT uuid, digest FROM catalog_entries"))
+            changed = [uuid for uuid, digest in digests.items() if stored.get(uuid) != digest]
+            removed = [uuid for uuid, digest in stored.items() if uuid not in digests and digest != ""]
+            if not changed and not removed:
+                return version, 0
+
+            version += 1
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO catalog_entries (uuid, digest, payload, version) VALUES (?, ?, ?, ?)",
+                [(uuid, digests[uuid], payloads[uuid], version) for uuid in changed],
+            )
+            # Tombstones keep removals visible to delta(); an empty digest marks them
+            self._conn.executemany(
+                "UPDATE catalog_entries SET digest = '', payload = NULL, version = ? WHERE uuid = ?",
+                [(version, uuid) for uuid in removed],
+            )
+            self._conn.execute("UPDATE catalog_meta SET version = ?, updated_at = ?", (version, time.time()))
+        return version, len(changed) + len(removed)
+
+    def full(self):
+        """{"version", "full": True, "entries": [...]} for the whole catalog."""
+        with self._lock:
+            version = self._conn.execute("SELECT version FROM catalog_meta").fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT payload FROM catalog_entries WHERE payload IS NOT NULL ORDER BY uuid"
+            ).fetchall()
+        return {"version": version, "full": True, "entries": [json.loads(payload) for payload, in rows]}
+
+    def delta(self, since):
+        """Entries changed and UUIDs removed after version since; the full catalog if since is unknown."""
+        with self._lock:
+            version = self._conn.execute("SELECT version FROM catalog_meta").fetchone()[0]
+            if since > version:
+                # The client saw a catalog this database never had (e.g. it was rebuilt)
+                rows = None
+            else:
+                rows = self._conn.execute(
+                    "SELECT uuid, payload FROM catalog_entries WHERE version > ? ORDER BY uuid", (since,)
+                ).fetchall()
+        if rows is None:
+            return self.full()
+        return {
+            "version": version,
+            "since": since,
+            "full": False,
+            "entries": [json.loads(payload) for _, payload in rows if payload is not None],
+            "deleted": [uuid for uuid, payload in rows if payload is None],
+        }
+
+    def stats(self):
+        with self._lock:
+            version, updated_at = self._conn.execute("SELECT version, updated_at FROM catalog_meta").fetchone()
+            entries, described = self._conn.execute(
+                "SELECT COUNT(payload), COUNT(CASE WHEN json_extract(payload, '$.description') IS NOT NULL THEN 1 END) "
+                "FROM catalog_entries"
+            ).fetchone()
+        return {"version": version, "updated_at": updated_at or None, "entries": entries, "with_description": described}
+
+
+def main():
+    from description_store import DescriptionStore
+    from taxonomy import Taxonomy
+
+    parser = argparse.ArgumentParser(description="Refresh the catalog and write it out as a gzip JSON bundle")
+    parser.add_argument("--db", default=os.environ.get("CATALOG_DB_PATH", "catalog.sqlite3"))
+    parser.add_argument("--descriptions-db", default=None, help="Description store (default: DESCRIPTIONS_DB or the bundled one)")
+    parser.add_argument("--taxonomy", default=None, help="taxonomy_release.txt (default: TAXONOMY_PATH or the app's copy)")
+    parser.add_argument("--out", default="catalog.json.gz")
+    args = parser.parse_args()
+
+    catalog = Catalog(args.db)
+    version, changed = catalog.refresh(Taxonomy.load(args.taxonomy), DescriptionStore(args.descriptions_db).all())
+    with gzip.open(args.out, "wt", encoding="utf-8") as f:
+        json.dump(catalog.full(), f, separators=(",", ":"), ensure_ascii=False)
+    print(f"Catalog version {version} ({changed} entries changed), wrote {args.out} ({os.path.getsize(args.out) / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Perceptual near-duplicate grouping for burst uploads
+
+Burst captures produce a dozen frames a few milliseconds apart that all show
+the same animal. Each frame gets a 64-bit difference hash (dHash); frames
+within a Hamming distance of each other are grouped so that only one
+representative (or a small sample) per group has to be classified.
+"""
+
+import logging
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+HASH_SIZE = 8
+
+log = logging.getLogger(__name__)
+
+
+def is_available():
+    return Image is not None
+
+
+def dhash(path, hash_size=HASH_SIZE):
+    """Difference hash: compare neighbouring pixels of a tiny grayscale copy."""
+    with Image.open(path) as img:
+        img.draft("L", (hash_size * 8, hash_size * 8))
+        small = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+        pixels = list(small.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def group_near_duplicates(filepaths, threshold=6):
+    """Group filepaths whose dHashes are within threshold bits of a group's first member.
+
+    Returns a list of groups in input order; images that can't be hashed end
+    up in a group of their own.
+    """
+    groups = []
+    hashes = []
+    for filepath in filepaths:
+        try:
+            value = dhash(filepath)
+        except Exception as e:
+            log.warning("Could not hash %s for burst dedupe: %s", filepath, e)
+            groups.append([filepath])
+            hashes.append(None)
+            continue
+
+        for index, group_hash in enumerate(hashes):
+            if group_hash is not None and hamming(value, group_hash) <= threshold:
+                groups[index].append(filepath)
+                break
+        else:
+            groups.append([filepath])
+            hashes.append(value)
+    return groups
+
+
+def pick_samples(group, samples_per_group=1):
+    """Members of a group to actually classify, spread evenly across the burst."""
+    if samples_per_group >= len(group):
+        return list(group)
+    if samples_per_group <= 1:
+        return [group[0]]
+    step = (len(group) - 1) / (samples_per_group - 1)
+    return [group[round(i * step)] for i in range(samples_per_group)]
+
+
+def propagate(group, predictions):
+    """Copy the best sampled prediction onto the group members that weren't classified.
+
+    predictions maps filepath -> prediction for the sampled members; the
+    returned dict covers every member of the group.
+    """
+    sampled = [predictions[filepath] for filepath in group if filepath in predictions]
+    usable = [prediction for prediction in sampled if prediction.get("prediction")]
+    if not usable:
+        usable = sampled
+    best = max(usable, key=lambda prediction: prediction.get("prediction_score") or 0)
+
+    results = {}
+    for filepath in group:
+        if filepath in predictions:
+            results[filepath] = predictions[filepath]
+        else:
+            copied = dict(best)
+            copied["filepath"] = filepath
+            copied["propagated"] = True
+            copied["propagated_from"] = best["filepath"]
+            results[filepath] = copied
+    return results
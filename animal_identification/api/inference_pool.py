@@ -0,0 +1,272 @@
+"""
+Warm SpeciesNet worker pool
+
+Each worker process loads the detector and classifier once and then serves
+jobs sent down its own pipe, so an upload only pays for inference instead of a
+fresh interpreter, framework import and weight load. Workers get a private
+pipe rather than a shared queue so that a crashing worker can never leave a
+queue lock held for its siblings.
+"""
+
+import collections
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+log = logging.getLogger(__name__)
+
+
+def _worker_main(slot, model_name, conn, tiered_threshold=None, backend="speciesnet", backend_options=None):
+    """Load the model once, then answer jobs until a None sentinel arrives."""
+    try:
+        from model_backends import load_model
+
+        model = load_model(backend, model_name, tiered_threshold, **(backend_options or {}))
+    except Exception:
+        conn.send(("load_error", None, traceback.format_exc()))
+        return
+
+    conn.send(("ready", None, None))
+
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+
+        job_id, filepaths, batch_size = job
+        try:
+            output = model.predict(filepaths=filepaths, batch_size=batch_size, progress_bars=False)
+            conn.send(("done", job_id, output or {"predictions": []}))
+        except Exception:
+            conn.send(("failed", job_id, traceback.format_exc()))
+
+
+class WorkerCrashed(RuntimeError):
+    """Raised for a job whose worker process died before answering."""
+
+
+class InferencePool:
+    """A fixed number of model-holding processes fed from one backlog."""
+
+    def __init__(
+        self,
+        num_workers,
+        model_name=None,
+        restart_backoff=1.0,
+        max_restart_backoff=60.0,
+        tiered_threshold=None,
+        backend="speciesnet",
+        backend_options=None,
+    ):
+        self.num_workers = num_workers
+        self.model_name = model_name
+        self.tiered_threshold = tiered_threshold
+        self.backend = backend
+        self.backend_options = backend_options or {}
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = {}
+        self._backlog = collections.deque()
+        self._pending = {}
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._wake_recv, self._wake_send = multiprocessing.Pipe(duplex=False)
+        self._thread = None
+        self.restarts = 0
+        self.last_error = None
+        self.load_seconds = {}
+
+    def start(self):
+        """Spawn the workers and the thread that feeds and supervises them."""
+        self._stopping.clear()
+        for slot in range(self.num_workers):
+            self._spawn(slot)
+
+        self._thread = threading.Thread(target=self._run, name="inference-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10.0):
+        """Ask every worker to exit and fail whatever is still pending."""
+        self._stopping.set()
+        self._wake()
+        if self._thread:
+            self._thread.join(timeout)
+
+        for worker in self._workers.values():
+            try:
+                worker["conn"].send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers.values():
+            worker["process"].join(timeout)
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._backlog.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Inference pool stopped"))
+
+    def submit(self, filepaths, batch_size=8):
+        """Queue a job and return a Future resolving to the predictions dict."""
+        future = Future()
+        job_id = next(self._job_ids)
+        with self._lock:
+            self._pending[job_id] = future
+            self._backlog.append((job_id, [str(path) for path in filepaths], batch_size))
+        self._wake()
+        return future
+
+    def predict(self, filepaths, timeout=None, batch_size=8):
+        """Blocking wrapper around submit()."""
+        return self.submit(filepaths, batch_size).result(timeout)
+
+    def status(self):
+        """Readiness summary for the /ready endpoint."""
+        with self._lock:
+            workers = list(self._workers.values())
+            queued = len(self._backlog)
+        return {
+            "workers": self.num_workers,
+            "alive": sum(1 for worker in workers if worker["process"].is_alive()),
+            "ready": sum(1 for worker in workers if worker["ready"]),
+            "busy": sum(1 for worker in workers if worker["job_id"] is not None),
+            "queued_jobs": queued,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "load_seconds": dict(self.load_seconds),
+        }
+
+    def is_ready(self):
+        return self.status()["ready"] > 0
+
+    def _wake(self):
+        try:
+            self._wake_send.send(None)
+        except OSError:
+            pass
+
+    def _spawn(self, slot):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(slot, self.model_name, child_conn, self.tiered_threshold, self.backend, self.backend_options),
+            name=f"speciesnet-worker-{slot}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+
+        previous = self._workers.get(slot)
+        with self._lock:
+            self._workers[slot] = {
+                "process": process,
+                "conn": parent_conn,
+                "ready": False,
+                "job_id": None,
+                "failures": previous["failures"] if previous else 0,
+                "restart_at": None,
+                "spawned_at": time.monotonic(),
+            }
+        log.info("Started SpeciesNet worker %d (pid %d)", slot, process.pid)
+
+    def _resolve(self, job_id, result=None, error=None):
+        with self._lock:
+            future = self._pending.pop(job_id, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._dispatch()
+
+            conns = {worker["conn"]: slot for slot, worker in self._workers.items() if worker["restart_at"] is None}
+            for conn in wait(list(conns) + [self._wake_recv], timeout=1.0):
+                if conn is self._wake_recv:
+                    while self._wake_recv.poll():
+                        self._wake_recv.recv()
+                    continue
+                self._receive(conns[conn])
+
+            self._supervise()
+
+    def _dispatch(self):
+        """Hand queued jobs to idle, warm workers."""
+        for worker in self._workers.values():
+            if not worker["ready"] or worker["job_id"] is not None or worker["restart_at"] is not None:
+                continue
+            with self._lock:
+                if not self._backlog:
+                    return
+                job = self._backlog.popleft()
+            worker["job_id"] = job[0]
+            try:
+                worker["conn"].send(job)
+            except (BrokenPipeError, OSError):
+                # Put it back; the supervisor will notice the dead worker
+                with self._lock:
+                    self._backlog.appendleft(job)
+                worker["job_id"] = None
+
+    def _receive(self, slot):
+        worker = self._workers[slot]
+        try:
+            kind, job_id, payload = worker["conn"].recv()
+        except (EOFError, OSError):
+            # The process is gone; _supervise handles the restart
+            worker["process"].join(0.1)
+            return
+
+        if kind == "ready":
+            worker["ready"] = True
+            worker["failures"] = 0
+            self.load_seconds[slot] = time.monotonic() - worker["spawned_at"]
+            log.info("SpeciesNet worker %d loaded its model in %.1fs", slot, self.load_seconds[slot])
+        elif kind == "load_error":
+            self.last_error = payload
+            log.error("SpeciesNet worker %d failed to load the model:\n%s", slot, payload)
+        elif kind == "done":
+            worker["job_id"] = None
+            self._resolve(job_id, result=payload)
+        elif kind == "failed":
+            worker["job_id"] = None
+            self._resolve(job_id, error=RuntimeError(payload))
+
+    def _supervise(self):
+        now = time.monotonic()
+        for slot, worker in list(self._workers.items()):
+            if worker["process"].is_alive():
+                continue
+
+            if worker["restart_at"] is None:
+                # First time we notice the death: fail its job and schedule a
+                # restart with exponential backoff so a model that cannot load
+                # does not spin the CPU.
+                exitcode = worker["process"].exitcode
+                worker["failures"] += 1
+                worker["ready"] = False
+                delay = min(self.restart_backoff * (2 ** (worker["failures"] - 1)), self.max_restart_backoff)
+                worker["restart_at"] = now + delay
+                worker["conn"].close()
+                if worker["job_id"] is not None:
+                    self._resolve(worker["job_id"], error=WorkerCrashed(f"Worker {slot} exited with code {exitcode}"))
+                    worker["job_id"] = None
+                log.warning("SpeciesNet worker %d died (exit code %s), restarting in %.1fs", slot, exitcode, delay)
+            elif now >= worker["restart_at"]:
+                self.restarts += 1
+                self._spawn(slot)
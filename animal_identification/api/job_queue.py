@@ -0,0 +1,187 @@
+"""
+Bounded detection job queue with admission control
+
+Uploads used to be scheduled with FastAPI's BackgroundTasks, which starts
+every job straight away, so a burst of uploads meant a burst of concurrent
+model runs. Jobs now go through a fixed number of runner threads:
+
+- at most max_concurrent jobs run at once, the rest wait in the queue
+- at most max_depth jobs wait; past that, reserve() raises Rejected and the
+  API answers 429 with a Retry-After estimated from recent job durations
+- each client may have at most client_max_jobs jobs waiting or running
+- the "interactive" lane (single captures from the camera screen) is always
+  served before the "bulk" lane (gallery imports)
+
+A job is reserved before its upload is written to disk, so rejected uploads
+cost nothing, and is then either enqueued with its JSON-serialisable payload
+or cancelled. job_store.JobStore offers the same reserve/enqueue/cancel
+interface for deployments where separate worker processes run the jobs.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import Counter, deque
+
+log = logging.getLogger(__name__)
+
+LANES = ("interactive", "bulk")
+DEFAULT_JOB_SECONDS = 10.0
+
+
+class Rejected(Exception):
+    def __init__(self, detail, retry_after):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Job:
+    __slots__ = ("client", "lane", "payload", "reserved_at", "queued_at")
+
+    def __init__(self, client, lane):
+        self.client = client
+        self.lane = lane
+        self.payload = None
+        self.reserved_at = time.monotonic()
+        self.queued_at = None
+
+
+class JobQueue:
+    """In-process queue; handler(payload) runs each job on one of max_concurrent threads."""
+
+    def __init__(self, handler, max_depth=64, max_concurrent=2, client_max_jobs=8):
+        self.handler = handler
+        self.max_depth = max(1, max_depth)
+        self.max_concurrent = max(1, max_concurrent)
+        self.client_max_jobs = max(1, client_max_jobs)
+
+        self._cond = threading.Condition()
+        self._lanes = {lane: deque() for lane in LANES}
+        self._reserved = 0
+        self._running = 0
+        self._clients = Counter()
+        self._durations = deque(maxlen=50)
+        self._threads = []
+        self._stopping = False
+        self._stats = {
+            "completed": 0,
+            "failed": 0,
+            "rejected_full": 0,
+            "rejected_quota": 0,
+            "max_depth_seen": 0,
+            "total_wait_ms": {lane: 0.0 for lane in LANES},
+            "started": {lane: 0 for lane in LANES},
+        }
+
+    def start(self):
+        with self._cond:
+            self._stopping = False
+        for index in range(self.max_concurrent):
+            thread = threading.Thread(target=self._run, name=f"job-runner-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def reserve(self, client, lane):
+        """Claim a queue slot for a client's job, or raise Rejected."""
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane {lane!r}; expected one of {', '.join(LANES)}")
+        with self._cond:
+            if self._depth() >= self.max_depth:
+                self._stats["rejected_full"] += 1
+                raise Rejected("Detection queue is full", self._retry_after())
+            if self._clients[client] >= self.client_max_jobs:
+                self._stats["rejected_quota"] += 1
+                raise Rejected(f"At most {self.client_max_jobs} detection jobs per client", self._retry_after())
+            self._reserved += 1
+            self._clients[client] += 1
+            self._stats["max_depth_seen"] = max(self._stats["max_depth_seen"], self._depth())
+            return Job(client, lane)
+
+    def enqueue(self, job, payload):
+        """Hand a reserved job its work; it runs once a runner is free and no higher lane is waiting."""
+        job.payload = payload
+        job.queued_at = time.monotonic()
+        with self._cond:
+            self._reserved -= 1
+            self._lanes[job.lane].append(job)
+            self._cond.notify()
+
+    def cancel(self, job):
+        """Give back a reservation whose upload was rejected."""
+        with self._cond:
+            self._reserved -= 1
+            self._release(job.client)
+
+    def stats(self):
+        with self._cond:
+            stats = {
+                "max_depth": self.max_depth,
+                "max_concurrent": self.max_concurrent,
+                "client_max_jobs": self.client_max_jobs,
+                "depth": self._depth(),
+                "running": self._running,
+                "queued": {lane: len(jobs) for lane, jobs in self._lanes.items()},
+                "mean_job_seconds": self._mean_duration(),
+                "retry_after": self._retry_after(),
+            }
+            for key, value in self._stats.items():
+                stats[key] = dict(value) if isinstance(value, dict) else value
+        stats["mean_wait_ms"] = {
+            lane: stats["total_wait_ms"][lane] / stats["started"][lane] if stats["started"][lane] else None
+            for lane in LANES
+        }
+        del stats["total_wait_ms"]
+        return stats
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and not any(self._lanes.values()):
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                job = next(jobs for jobs in self._lanes.values() if jobs).popleft()
+                self._running += 1
+                self._stats["started"][job.lane] += 1
+                self._stats["total_wait_ms"][job.lane] += (time.monotonic() - job.queued_at) * 1000
+
+            started = time.monotonic()
+            failed = False
+            try:
+                self.handler(job.payload)
+            except Exception as e:
+                failed = True
+                log.error("Detection job for %s failed: %r", job.client, e)
+
+            with self._cond:
+                self._running -= 1
+                self._durations.append(time.monotonic() - started)
+                self._stats["failed" if failed else "completed"] += 1
+                self._release(job.client)
+
+    def _depth(self):
+        return self._reserved + sum(len(jobs) for jobs in self._lanes.values())
+
+    def _release(self, client):
+        self._clients[client] -= 1
+        if self._clients[client] <= 0:
+            del self._clients[client]
+
+    def _mean_duration(self):
+        return sum(self._durations) / len(self._durations) if self._durations else None
+
+    def _retry_after(self):
+        """Seconds until the backlog ahead of a new job should have drained, 1-300."""
+        waves = math.ceil((self._depth() + self._running) / self.max_concurrent) or 1
+        seconds = (self._mean_duration() or DEFAULT_JOB_SECONDS) * waves
+        return int(min(300, max(1, math.ceil(seconds))))
@@ -0,0 +1,236 @@
+"""
+Durable detection job queue shared by API replicas and inference workers
+
+In the split deployment (SERVICE_ROLE=api plus worker.py processes) jobs live
+in a SQLite table instead of in an API process's memory:
+
+- API replicas call reserve()/enqueue() exactly like job_queue.JobQueue; depth
+  and per-client quotas are counted from the table, so they hold across
+  replicas (two replicas admitting at the same instant can overshoot by one)
+- workers claim() the oldest job of the highest-priority lane under a lease
+  and heartbeat() while it runs; a job whose lease runs out because its
+  worker died is handed to the next worker that asks
+- after max_attempts leases a job is given up on, so one image that
+  crashes the model cannot take down every worker in turn
+
+Claims run inside BEGIN IMMEDIATE transactions, so any number of processes
+sharing the database file (WAL mode) see each job exactly once per lease.
+"""
+
+import json
+import math
+import sqlite3
+import threading
+import time
+
+from job_queue import DEFAULT_JOB_SECONDS, LANES, Job, Rejected
+
+LANE_PRIORITY = {lane: index for index, lane in enumerate(LANES)}
+
+
+class JobStore:
+    def __init__(self, path, max_depth=64, client_max_jobs=8, lease_seconds=60.0, max_attempts=3):
+        self.path = str(path)
+        self.max_depth = max(1, max_depth)
+        self.client_max_jobs = max(1, client_max_jobs)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                lane TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                client TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, priority, created_at);
+            CREATE INDEX IF NOT EXISTS jobs_client ON jobs (client, status);
+            CREATE TABLE IF NOT EXISTS workers (
+                id TEXT PRIMARY KEY,
+                started_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL
+            );
+            """
+        )
+
+    # API side: the same interface as job_queue.JobQueue
+
+    def start(self):
+        """Nothing runs in the API process; workers pull jobs themselves."""
+
+    def stop(self, timeout=5.0):
+        pass
+
+    def reserve(self, client, lane):
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane {lane!r}; expected one of {', '.join(LANES)}")
+        with self._lock:
+            depth = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if depth >= self.max_depth:
+                raise Rejected("Detection queue is full", self._retry_after())
+            in_flight = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE client = ? AND status IN ('queued', 'leased')", (client,)
+            ).fetchone()[0]
+            if in_flight >= self.client_max_jobs:
+                raise Rejected(f"At most {self.client_max_jobs} detection jobs per client", self._retry_after())
+        return Job(client, lane)
+
+    def enqueue(self, job, payload):
+        """Persist a reserved job; payload["session_id"] doubles as the job id."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, lane, priority, client, payload, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (payload["session_id"], job.lane, LANE_PRIORITY[job.lane], job.client, json.dumps(payload), time.time()),
+            )
+
+    def cancel(self, job):
+        """Reservations are not persisted, so there is nothing to give back."""
+
+    def stats(self):
+        with self._lock:
+            counts = {
+                (lane, status): count
+                for lane, status, count in self._conn.execute(
+                    "SELECT lane, status, COUNT(*) FROM jobs GROUP BY lane, status"
+                )
+            }
+            workers = self._live_workers()
+            mean = self._mean_duration()
+            retry_after = self._retry_after()
+        return {
+            "backend": "sqlite",
+            "max_depth": self.max_depth,
+            "client_max_jobs": self.client_max_jobs,
+            "lease_seconds": self.lease_seconds,
+            "live_workers": workers,
+            "depth": sum(count for (_, status), count in counts.items() if status == "queued"),
+            "running": sum(count for (_, status), count in counts.items() if status == "leased"),
+            "queued": {lane: counts.get((lane, "queued"), 0) for lane in LANES},
+            "completed": sum(count for (_, status), count in counts.items() if status == "done"),
+            "failed": sum(count for (_, status), count in counts.items() if status == "failed"),
+            "mean_job_seconds": mean,
+            "retry_after": retry_after,
+        }
+
+    # Worker side
+
+    def claim(self, worker_id):
+        """Lease the next job, redelivering expired leases; returns (payload, attempt) or None."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, payload, attempts FROM jobs "
+                    "WHERE (status = 'queued' OR (status = 'leased' AND lease_expires < ?)) AND attempts < ? "
+                    "ORDER BY priority, created_at LIMIT 1",
+                    (now, self.max_attempts),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                        "attempts = attempts + 1, started_at = ? WHERE id = ?",
+                        (worker_id, now + self.lease_seconds, now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return json.loads(row[1]), row[2] + 1
+
+    def heartbeat(self, worker_id, job_ids=()):
+        """Extend this worker's leases; returns the ids it still holds."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workers (id, started_at, heartbeat_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (worker_id, now, now),
+            )
+            held = set()
+            for job_id in job_ids:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                    (now + self.lease_seconds, job_id, worker_id),
+                )
+                if cursor.rowcount:
+                    held.add(job_id)
+        return held
+
+    def finish(self, job_id, worker_id, error=None):
+        """Mark a leased job done (or failed); ignored if the lease has moved to another worker."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, lease_owner = NULL "
+                "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                ("failed" if error else "done", error, time.time(), job_id, worker_id),
+            )
+            return cursor.rowcount > 0
+
+    def give_up_exhausted(self):
+        """Fail jobs whose lease expired on their last attempt; returns their payloads."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, payload FROM jobs WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (now, self.max_attempts),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease_owner = NULL WHERE id = ?",
+                    [(f"Worker lost {self.max_attempts} times", now, job_id) for job_id, _ in rows],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [json.loads(payload) for _, payload in rows]
+
+    def unregister(self, worker_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def prune(self, older_than_seconds):
+        """Delete finished jobs and silent workers older than the cutoff."""
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            jobs = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (cutoff,)
+            ).rowcount
+            self._conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (cutoff,))
+        return jobs
+
+    def _live_workers(self):
+        cutoff = time.time() - self.lease_seconds
+        return self._conn.execute("SELECT COUNT(*) FROM workers WHERE heartbeat_at >= ?", (cutoff,)).fetchone()[0]
+
+    def _mean_duration(self):
+        row = self._conn.execute(
+            "SELECT AVG(finished_at - started_at) FROM "
+            "(SELECT finished_at, started_at FROM jobs WHERE status = 'done' ORDER BY finished_at DESC LIMIT 50)"
+        ).fetchone()
+        return row[0]
+
+    def _retry_after(self):
+        """Same estimate as JobQueue, with live workers standing in for runner threads."""
+        backlog = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'leased')").fetchone()[0]
+        waves = math.ceil(backlog / max(1, self._live_workers())) or 1
+        seconds = (self._mean_duration() or DEFAULT_JOB_SECONDS) * waves
+        return int(min(300, max(1, math.ceil(seconds))))
@@ -0,0 +1,72 @@
+"""
+Event-loop lag sampling
+
+A background task asks to sleep for a fixed interval and records how late it
+wakes up. Anything that blocks the event loop (synchronous file or database
+work in a handler, CPU-heavy formatting, a large JSON dump) shows up as lag,
+which is delay every other request on this process pays too.
+"""
+
+import asyncio
+import time
+from collections import deque
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list, or None if it is empty."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+class LoopLagMonitor:
+    def __init__(self, interval_ms=50, window=1200):
+        self.interval = interval_ms / 1000.0
+        self._samples = deque(maxlen=window)
+        self._max = 0.0
+        self._count = 0
+        self._since = time.time()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def reset(self):
+        self._samples.clear()
+        self._max = 0.0
+        self._count = 0
+        self._since = time.time()
+
+    def stats(self):
+        """Lag in milliseconds over the most recent window of samples."""
+        samples = sorted(self._samples)
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self._count,
+            "since": self._since,
+            "mean_ms": _ms(sum(samples) / len(samples)) if samples else None,
+            "p50_ms": _ms(percentile(samples, 0.50)),
+            "p99_ms": _ms(percentile(samples, 0.99)),
+            "max_ms": _ms(self._max),
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self._samples.append(lag)
+            self._count += 1
+            if lag > self._max:
+                self._max = lag
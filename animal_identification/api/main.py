@@ -1,15 +1,49 @@
-from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from typing import List, Optional
 import os
+import time
 import uuid
+import asyncio
 import shutil
 import json
 import importlib
+import logging
 import sys
+import threading
+from collections import OrderedDict
 from pathlib import Path
 import subprocess
+from functools import lru_cache
+from concurrent.futures import TimeoutError as FuturesTimeout, as_completed
+from starlette.concurrency import run_in_threadpool
+
+# Shared modules (taxonomy, descriptions) live one level up in animal_identification/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import dedupe
+import preprocess
+import telemetry
+from batcher import MicroBatcher
+from catalog import Catalog
+from description_store import DEFAULT_TEXT_PATH, DescriptionStore
+from inference_pool import InferencePool
+from job_queue import LANES, JobQueue, Rejected
+from job_store import JobStore
+from loop_monitor import LoopLagMonitor
+from ingest import RequestBudget, RequestSizeLimit, UploadRejected, safe_filename, save_upload
+from prediction_cache import PredictionCache, hash_file
+from preprocess import Preprocessor, output_paths
+from result_store import ResultStore, SqliteResultStore
+from responses import MIN_COMPRESS_BYTES, compress, dumps, encoded_json, pick_encoding
+from resumable_uploads import ResumableUploads
+from results_db import ResultsDB
+from sighting_aggregates import SightingAggregates
+from sighting_index import InvalidSighting, SightingIndex, parse_timestamp
+from taxonomy import RANKS, entry_name, entry_to_dict, get_taxonomy
+from telemetry import Registry, Tracer, configure_logging, log_fields
+from tiered_inference import DEFAULT_ANIMAL_THRESHOLD, summarise_tiers
 
 app = FastAPI(title="Animal Detection API")
 
@@ -28,101 +62,1251 @@ RESULTS_DIR = Path("results")
 UPLOAD_DIR.mkdir(exist_ok=True)
 RESULTS_DIR.mkdir(exist_ok=True)
 
+# Leveled logging as JSON lines (LOG_FORMAT=text for a console); LOG_LEVEL=DEBUG
+# adds one line per pipeline span and the subprocess fallback's output
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+configure_logging(LOG_LEVEL, LOG_FORMAT)
+log = logging.getLogger("api")
+
+# Prometheus metrics at /metrics and per-stage trace spans of recent sessions
+TRACE_MAX_SESSIONS = int(os.environ.get("TRACE_MAX_SESSIONS", "500"))
+
+metrics = Registry()
+tracer = Tracer(metrics, TRACE_MAX_SESSIONS)
+images_processed = metrics.counter("detection_images_total", "Images finished, by what answered them", ["source"])
+detection_failures = metrics.counter("detection_failures_total", "Detection failures, by cause", ["cause"])
+sessions_finished = metrics.counter("detection_sessions_total", "Detection sessions finished, by status", ["status"])
+upload_rejections = metrics.counter("detection_upload_rejections_total", "Uploads refused before queueing, by reason", ["reason"])
+uploaded_bytes = metrics.counter("detection_uploaded_bytes_total", "Bytes of accepted uploads")
+request_seconds = metrics.histogram("http_request_duration_seconds", "API request latency", ["method", "route", "status"])
+
+# Deployment role. "all" ingests and runs inference in this process. "api" only
+# ingests, queueing jobs in the shared JOB_STORE_PATH database for worker.py
+# processes (role "worker") to run; uploaded_images/ and RESULTS_DB_PATH must
+# then be on storage shared by every replica and worker.
+SERVICE_ROLE = os.environ.get("SERVICE_ROLE", "all")
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", "jobs.sqlite3")
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+RUNS_INFERENCE = SERVICE_ROLE != "api"
+
+if SERVICE_ROLE not in ("all", "api", "worker"):
+    raise ValueError(f"SERVICE_ROLE must be all, api or worker, not {SERVICE_ROLE!r}")
+
+# Number of warm SpeciesNet processes; 0 falls back to one subprocess per upload
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+SPECIESNET_MODEL = os.environ.get("SPECIESNET_MODEL")
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", "600"))
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".avif", ".heic"}
+
+# Micro-batching: images from concurrent sessions share one model call
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "50"))
+BATCH_MAX_QUEUE = int(os.environ.get("BATCH_MAX_QUEUE", "0"))
+
+# Tiered inference: run the detector first and only classify frames with an animal in them
+TIERED_INFERENCE = os.environ.get("TIERED_INFERENCE", "0") == "1"
+TIERED_ANIMAL_THRESHOLD = float(os.environ.get("TIERED_ANIMAL_THRESHOLD", str(DEFAULT_ANIMAL_THRESHOLD)))
+
+if TIERED_INFERENCE and INFERENCE_WORKERS == 0:
+    log.warning("TIERED_INFERENCE needs INFERENCE_WORKERS > 0; the subprocess fallback always runs the full pipeline")
+
+# Model runtime for the pool workers: stock SpeciesNet, the ONNX Runtime CPU backend or a fake
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "speciesnet")
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR") or None
+ONNX_PRECISION = os.environ.get("ONNX_PRECISION", "int8")
+ONNX_INTRA_OP_THREADS = int(os.environ.get("ONNX_INTRA_OP_THREADS", "0"))
+ONNX_INTER_OP_THREADS = int(os.environ.get("ONNX_INTER_OP_THREADS", "0"))
+
+# Deterministic stand-in used by the benchmark harness (INFERENCE_BACKEND=fake)
+FAKE_INFERENCE_MS = float(os.environ.get("FAKE_INFERENCE_MS", "50"))
+FAKE_BLANK_RATE = float(os.environ.get("FAKE_BLANK_RATE", "0.2"))
+
+if INFERENCE_BACKEND != "speciesnet" and INFERENCE_WORKERS == 0:
+    log.warning("INFERENCE_BACKEND=%s needs INFERENCE_WORKERS > 0; the subprocess fallback uses stock SpeciesNet", INFERENCE_BACKEND)
+
+inference_pool = InferencePool(
+    INFERENCE_WORKERS,
+    SPECIESNET_MODEL,
+    tiered_threshold=TIERED_ANIMAL_THRESHOLD if TIERED_INFERENCE else None,
+    backend=INFERENCE_BACKEND,
+    backend_options={
+        "onnx": {
+            "onnx_dir": ONNX_MODEL_DIR,
+            "precision": ONNX_PRECISION,
+            "intra_op_threads": ONNX_INTRA_OP_THREADS,
+            "inter_op_threads": ONNX_INTER_OP_THREADS,
+        },
+        "fake": {"ms_per_image": FAKE_INFERENCE_MS, "blank_rate": FAKE_BLANK_RATE},
+    }.get(INFERENCE_BACKEND),
+) if INFERENCE_WORKERS > 0 and RUNS_INFERENCE else None
+batcher = MicroBatcher(
+    inference_pool.submit,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_queue=BATCH_MAX_QUEUE,
+    max_in_flight=INFERENCE_WORKERS,
+) if inference_pool else None
+
+# Detection job queue: bounded depth, bounded concurrency, per-client quotas and
+# an interactive lane that is served ahead of bulk imports
+JOB_QUEUE_MAX_DEPTH = int(os.environ.get("JOB_QUEUE_MAX_DEPTH", "64"))
+JOB_MAX_CONCURRENT = int(os.environ.get("JOB_MAX_CONCURRENT", "2"))
+JOB_CLIENT_MAX_JOBS = int(os.environ.get("JOB_CLIENT_MAX_JOBS", "8"))
+
+if SERVICE_ROLE == "all":
+    job_queue = JobQueue(lambda payload: run_detection_job(payload), JOB_QUEUE_MAX_DEPTH, JOB_MAX_CONCURRENT, JOB_CLIENT_MAX_JOBS)
+else:
+    job_queue = JobStore(JOB_STORE_PATH, JOB_QUEUE_MAX_DEPTH, JOB_CLIENT_MAX_JOBS, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS)
+
+# Content-hash prediction cache; re-uploaded images skip inference entirely
+PREDICTION_CACHE_PATH = os.environ.get("PREDICTION_CACHE_PATH", "prediction_cache.sqlite3")
+PREDICTION_CACHE_MAX_MB = float(os.environ.get("PREDICTION_CACHE_MAX_MB", "64"))
+SPECIESNET_MODEL_VERSION = os.environ.get("SPECIESNET_MODEL_VERSION", "4.0.0a")
+
+# Predictions from the ONNX or fake backends must never be replayed as stock SpeciesNet ones
+if INFERENCE_BACKEND == "speciesnet" or INFERENCE_WORKERS == 0:
+    PREDICTION_CACHE_VERSION = SPECIESNET_MODEL_VERSION
+elif INFERENCE_BACKEND == "onnx":
+    PREDICTION_CACHE_VERSION = f"{SPECIESNET_MODEL_VERSION}+onnx-{ONNX_PRECISION}"
+else:
+    PREDICTION_CACHE_VERSION = f"{SPECIESNET_MODEL_VERSION}+{INFERENCE_BACKEND}"
+
+prediction_cache = PredictionCache(
+    PREDICTION_CACHE_PATH,
+    PREDICTION_CACHE_VERSION,
+    max_bytes=int(PREDICTION_CACHE_MAX_MB * 1024 * 1024),
+) if PREDICTION_CACHE_PATH else None
+
+# Preprocessing: decode, EXIF-rotate and downscale each upload once on a process
+# pool, so the workers read model-sized copies and the gallery gets thumbnails.
+# 0 workers turns it off and the workers read the originals.
+PREPROCESS_WORKERS = int(os.environ.get("PREPROCESS_WORKERS", "2"))
+PREPROCESS_MODEL_SIZE = int(os.environ.get("PREPROCESS_MODEL_SIZE", "1280"))
+PREPROCESS_THUMB_SIZE = int(os.environ.get("PREPROCESS_THUMB_SIZE", "256"))
+
+if PREPROCESS_WORKERS > 0 and not preprocess.is_available():
+    log.warning("Preprocessing needs Pillow; workers will read the original uploads")
+preprocessor = Preprocessor(
+    PREPROCESS_WORKERS,
+    model_size=PREPROCESS_MODEL_SIZE,
+    thumb_size=PREPROCESS_THUMB_SIZE,
+) if PREPROCESS_WORKERS > 0 and preprocess.is_available() and RUNS_INFERENCE else None
+
+# Burst dedupe: classify one frame (or a few) per group of near-identical frames
+BURST_DEDUPE = os.environ.get("BURST_DEDUPE", "0") == "1"
+BURST_HAMMING_THRESHOLD = int(os.environ.get("BURST_HAMMING_THRESHOLD", "6"))
+BURST_SAMPLES_PER_GROUP = int(os.environ.get("BURST_SAMPLES_PER_GROUP", "1"))
+
+if BURST_DEDUPE and not dedupe.is_available():
+    log.warning("BURST_DEDUPE is set but Pillow is not installed; burst dedupe is disabled")
+
+# Upload limits, enforced while the bytes stream in
+MAX_UPLOAD_FILE_MB = float(os.environ.get("MAX_UPLOAD_FILE_MB", "25"))
+MAX_UPLOAD_REQUEST_MB = float(os.environ.get("MAX_UPLOAD_REQUEST_MB", "200"))
+MAX_UPLOAD_FILE_BYTES = int(MAX_UPLOAD_FILE_MB * 1024 * 1024)
+MAX_UPLOAD_REQUEST_BYTES = int(MAX_UPLOAD_REQUEST_MB * 1024 * 1024)
+
+# Resumable uploads: files are sent in offset-checked chunks and detection starts
+# once all of them are in. Uploads untouched for PARTIAL_UPLOAD_TTL_HOURS are removed.
+PARTIAL_UPLOAD_DIR = Path(os.environ.get("PARTIAL_UPLOAD_DIR", "partial_uploads"))
+PARTIAL_UPLOAD_TTL_HOURS = float(os.environ.get("PARTIAL_UPLOAD_TTL_HOURS", "24"))
+UPLOAD_CHUNK_MB = float(os.environ.get("UPLOAD_CHUNK_MB", "1"))
+
+resumable_uploads = ResumableUploads(
+    PARTIAL_UPLOAD_DIR,
+    MAX_UPLOAD_FILE_BYTES,
+    MAX_UPLOAD_REQUEST_BYTES,
+    ttl_seconds=PARTIAL_UPLOAD_TTL_HOURS * 3600,
+    chunk_size=int(UPLOAD_CHUNK_MB * 1024 * 1024),
+) if SERVICE_ROLE != "worker" else None
+
+# Finished results are kept in memory, formatted once, for polls and SSE
+RESULT_STORE_MAX_SESSIONS = int(os.environ.get("RESULT_STORE_MAX_SESSIONS", "1000"))
+SSE_KEEPALIVE_SECONDS = float(os.environ.get("SSE_KEEPALIVE_SECONDS", "15"))
+
+# Status polls: ?limit= pages through large sessions, at most STATUS_PAGE_MAX results a page
+STATUS_PAGE_MAX = int(os.environ.get("STATUS_PAGE_MAX", "500"))
+RESULT_FIELDS = ("filename", "original_path", "thumbnail", "animal", "taxonomy_id", "description", "confidence")
+
+# Split deployments share results through the job store's database instead
+result_store = ResultStore(RESULT_STORE_MAX_SESSIONS) if SERVICE_ROLE == "all" else SqliteResultStore(JOB_STORE_PATH)
+
+# Finished sessions, indexed by session, content hash and species. Sessions and
+# their uploads are deleted RESULTS_TTL_HOURS after finishing (0 keeps them forever).
+RESULTS_DB_PATH = os.environ.get("RESULTS_DB_PATH", "results.sqlite3")
+RESULTS_TTL_HOURS = float(os.environ.get("RESULTS_TTL_HOURS", "168"))
+RESULTS_GC_INTERVAL_MINUTES = float(os.environ.get("RESULTS_GC_INTERVAL_MINUTES", "30"))
+
+results_db = ResultsDB(RESULTS_DB_PATH)
+
+# Event-loop lag sampling, reported at /loop/stats (0 turns it off)
+LOOP_LAG_INTERVAL_MS = float(os.environ.get("LOOP_LAG_INTERVAL_MS", "50"))
+
+loop_monitor = LoopLagMonitor(LOOP_LAG_INTERVAL_MS) if LOOP_LAG_INTERVAL_MS > 0 else None
+
+# Animal descriptions, looked up by name or taxonomy UUID
+DESCRIPTION_CACHE_SIZE = int(os.environ.get("DESCRIPTION_CACHE_SIZE", "4096"))
+
+description_store = DescriptionStore()
+
+# Versioned taxonomy + description catalog for clients, synced with /catalog?since=<version>
+CATALOG_DB_PATH = os.environ.get("CATALOG_DB_PATH", "catalog.sqlite3")
+CATALOG_REFRESH_MINUTES = float(os.environ.get("CATALOG_REFRESH_MINUTES", "10"))
+
+catalog = Catalog(CATALOG_DB_PATH) if SERVICE_ROLE != "worker" else None
+
+# Bounding-box / time-window index over map sightings
+SIGHTING_DB_PATH = os.environ.get("SIGHTING_DB_PATH", "sightings.sqlite3")
+SIGHTING_CELL_DEGREES = float(os.environ.get("SIGHTING_CELL_DEGREES", "0.1"))
+SIGHTING_PAGE_MAX = int(os.environ.get("SIGHTING_PAGE_MAX", "5000"))
+
+sighting_index = SightingIndex(SIGHTING_DB_PATH or None, SIGHTING_CELL_DEGREES)
+
+# Per-species daily summaries and heatmap tiles, updated as sightings are indexed
+HEATMAP_ZOOMS = [int(z) for z in os.environ.get("HEATMAP_ZOOMS", "3,6,9,12").split(",")]
+HEATMAP_BINS = int(os.environ.get("HEATMAP_BINS", "32"))
+
+sighting_aggregates = SightingAggregates(HEATMAP_ZOOMS, HEATMAP_BINS)
+sighting_index.add_listener(sighting_aggregates.add)
+
+# Caps how much of a multipart upload Starlette spools before /detect-animals runs
+app.add_middleware(
+    RequestSizeLimit,
+    paths=["/detect-animals"],
+    max_bytes=MAX_UPLOAD_REQUEST_BYTES,
+    on_reject=lambda: upload_rejections.inc(reason="size"),
+)
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    """Request latency by route template, so path parameters don't become label values."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        request_seconds.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status,
+        )
+
+def collect_pipeline_metrics():
+    """Gauges read from the queue, scheduler, pool, cache and loop monitor at scrape time."""
+    queue = job_queue.stats()
+    collected = [
+        ("detection_queue_depth", "Detection jobs reserved or waiting", queue["depth"]),
+        ("detection_queue_running", "Detection jobs running", queue["running"]),
+        ("detection_queue_waiting", "Detection jobs waiting, by lane",
+         {(("lane", lane),): count for lane, count in queue["queued"].items()}),
+    ]
+    if "rejected_full" in queue:
+        collected.append(("detection_queue_rejections", "Jobs refused since startup, by reason",
+                          {(("reason", "full"),): queue["rejected_full"], (("reason", "quota"),): queue["rejected_quota"]}))
+    if "live_workers" in queue:
+        collected.append(("detection_live_workers", "Inference workers heartbeating into the job store", queue["live_workers"]))
+    if batcher is not None:
+        collected.append(("inference_batch_queue_depth", "Images waiting for a model batch", batcher.stats()["queue_depth"]))
+    if inference_pool is not None:
+        status = inference_pool.status()
+        collected += [
+            ("inference_workers_ready", "Model workers loaded and serving", status["ready"]),
+            ("inference_workers_busy", "Model workers running a batch", status["busy"]),
+            ("inference_worker_restarts", "Model worker restarts since startup", status["restarts"]),
+            ("inference_model_load_seconds", "How long each worker took to load its model",
+             {(("slot", slot),): seconds for slot, seconds in status["load_seconds"].items()}),
+        ]
+    if prediction_cache is not None:
+        cache = prediction_cache.stats()
+        collected += [
+            ("prediction_cache_lookups", "Prediction cache lookups since startup, by result",
+             {(("result", "hit"),): cache["hits"], (("result", "miss"),): cache["misses"]}),
+            ("prediction_cache_bytes", "Size of the prediction cache", cache["bytes"]),
+        ]
+    if preprocessor is not None:
+        collected.append(("preprocess_failures", "Uploads that could not be preprocessed", preprocessor.failures))
+    if loop_monitor is not None:
+        lag = loop_monitor.stats()
+        collected.append(("event_loop_lag_ms", "Event loop wake-up lag over the sampling window",
+                          {(("quantile", "0.99"),): lag["p99_ms"], (("quantile", "1"),): lag["max_ms"]}))
+    return collected
+
+metrics.add_collector(collect_pipeline_metrics)
+
+@app.on_event("startup")
+async def start_inference_pool():
+    result_store.bind_loop(asyncio.get_running_loop())
+    if loop_monitor:
+        loop_monitor.start()
+    await run_in_threadpool(get_taxonomy)
+    if description_store.count() == 0 and DEFAULT_TEXT_PATH.exists():
+        imported, skipped = await run_in_threadpool(description_store.import_text_file, DEFAULT_TEXT_PATH, get_taxonomy())
+        lookup_description.cache_clear()
+        log.info("Imported %d descriptions from %s", imported, DEFAULT_TEXT_PATH.name)
+    if catalog:
+        await refresh_catalog()
+        if CATALOG_REFRESH_MINUTES > 0:
+            asyncio.get_running_loop().create_task(refresh_catalog_periodically())
+    loaded = await run_in_threadpool(sighting_index.load)
+    if loaded:
+        log.info("Loaded %d sightings into the index", loaded)
+    if results_db.stats()["sessions"] == 0 and any(RESULTS_DIR.glob("*.json")):
+        log.warning("%s/ has session files from before the results database; import them with migrate_results.py", RESULTS_DIR)
+    if RESULTS_TTL_HOURS > 0 and SERVICE_ROLE != "worker":
+        asyncio.get_running_loop().create_task(collect_garbage_periodically())
+    if resumable_uploads and PARTIAL_UPLOAD_TTL_HOURS > 0:
+        asyncio.get_running_loop().create_task(expire_partial_uploads_periodically())
+    if preprocessor:
+        preprocessor.start()
+    job_queue.start()
+    if inference_pool:
+        inference_pool.start()
+        batcher.start()
+
+@app.on_event("shutdown")
+async def stop_inference_pool():
+    if loop_monitor:
+        loop_monitor.stop()
+    await run_in_threadpool(job_queue.stop)
+    if preprocessor:
+        preprocessor.stop()
+    if inference_pool:
+        batcher.stop()
+        inference_pool.stop()
+
+async def collect_garbage_periodically():
+    """Drop expired sessions, their uploads and their cached status in the background."""
+    while True:
+        try:
+            expired, removed_dirs = await run_in_threadpool(results_db.collect_garbage, RESULTS_TTL_HOURS * 3600, UPLOAD_DIR)
+            for session_id in expired:
+                await run_in_threadpool(result_store.forget, session_id)
+            if expired or removed_dirs:
+                log.info("Expired %d sessions and removed %d upload directories", len(expired), removed_dirs)
+        except Exception as e:
+            log.error("Results garbage collection failed: %r", e)
+        await asyncio.sleep(RESULTS_GC_INTERVAL_MINUTES * 60)
+
+async def refresh_catalog():
+    """Pick up new or changed descriptions (and taxonomy) as a new catalog version."""
+    try:
+        version, changed = await run_in_threadpool(catalog.refresh, get_taxonomy(), description_store.all())
+        if changed:
+            # Descriptions written by description_maker.py show up here; drop the stale lookups
+            lookup_description.cache_clear()
+            log.info("Catalog is now version %d (%d entries changed)", version, changed)
+    except Exception as e:
+        log.error("Catalog refresh failed: %r", e)
+
+async def refresh_catalog_periodically():
+    while True:
+        await asyncio.sleep(CATALOG_REFRESH_MINUTES * 60)
+        await refresh_catalog()
+
+async def expire_partial_uploads_periodically():
+    """Remove resumable uploads that were abandoned part way."""
+    while True:
+        try:
+            removed = await run_in_threadpool(resumable_uploads.collect_garbage)
+            if removed:
+                log.info("Removed %d abandoned partial uploads", removed)
+        except Exception as e:
+            log.error("Partial upload cleanup failed: %r", e)
+        await asyncio.sleep(RESULTS_GC_INTERVAL_MINUTES * 60)
+
 @app.get("/")
 async def root():
     return {"message": "Animal Detection API is running"}
 
+@app.get("/ready")
+async def ready():
+    """Report whether the SpeciesNet workers have finished loading their models."""
+    if SERVICE_ROLE == "api":
+        # Uploads are accepted with no workers up; they wait in the job store
+        stats = await run_in_threadpool(job_queue.stats)
+        return {"ready": True, "mode": "api", "live_workers": stats["live_workers"]}
+    if inference_pool is None:
+        return {"ready": True, "mode": "subprocess"}
+
+    status = inference_pool.status()
+    status["mode"] = "pool"
+    status["ready"] = status["ready"] > 0
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    """Batch size, wait time and queue depth of the micro-batching scheduler."""
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **batcher.stats()}
+
+@app.get("/loop/stats")
+async def loop_stats(reset: bool = False):
+    """How late the event loop wakes up; reset=true starts a fresh measurement window."""
+    if loop_monitor is None:
+        return {"enabled": False}
+    stats = {"enabled": True, **loop_monitor.stats()}
+    if reset:
+        loop_monitor.reset()
+    return stats
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of the pipeline counters, stage timings and queue gauges."""
+    return Response(await run_in_threadpool(metrics.render), media_type=telemetry.CONTENT_TYPE)
+
+@app.get("/detection-trace/{session_id}")
+async def detection_trace(session_id: str):
+    """Per-stage spans this process recorded for a session (workers log theirs at DEBUG)."""
+    spans = tracer.trace(session_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail="No trace for this session")
+    return {"session_id": session_id, "spans": spans}
+
+@app.get("/queue/stats")
+async def queue_stats():
+    """Depth, lanes, rejections and wait times of the detection job queue."""
+    return await run_in_threadpool(job_queue.stats)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and size of the prediction cache."""
+    if prediction_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **prediction_cache.stats()}
+
+@app.get("/preprocess/stats")
+async def preprocess_stats():
+    """Throughput and failure count of the preprocessing pool."""
+    if preprocessor is None:
+        return {"enabled": False}
+    return {"enabled": True, **preprocessor.stats()}
+
+@app.get("/thumbnails/{session_id}/{filename}")
+async def get_thumbnail(session_id: str, filename: str):
+    """Small JPEG of an uploaded image, for the gallery instead of the original."""
+    try:
+        uuid.UUID(session_id)
+        filename = safe_filename(filename)
+    except (ValueError, UploadRejected):
+        raise HTTPException(status_code=404, detail="Unknown thumbnail")
+    _, thumb_path = output_paths(UPLOAD_DIR / session_id / filename)
+    if not thumb_path.is_file():
+        raise HTTPException(status_code=404, detail="Unknown thumbnail")
+    # Uploads never change once saved, so clients can cache thumbnails indefinitely
+    return FileResponse(thumb_path, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/results/search")
+async def search_results(species: Optional[str] = None, content_hash: Optional[str] = None, limit: int = 100):
+    """Past predictions for a taxonomy UUID and/or image content hash, newest first."""
+    if not species and not content_hash:
+        raise HTTPException(status_code=400, detail="Pass species and/or content_hash")
+    rows = await run_in_threadpool(results_db.search, species, content_hash, max(1, min(limit, 1000)))
+    return {
+        "results": [
+            dict(format_prediction(prediction), session_id=session_id, finished_at=finished_at)
+            for session_id, finished_at, prediction in rows
+        ]
+    }
+
+@app.get("/results/stats")
+async def results_stats():
+    """Size of the results store and its retention settings."""
+    stats = await run_in_threadpool(results_db.stats)
+    return {**stats, "ttl_hours": RESULTS_TTL_HOURS or None}
+
+@app.get("/taxonomy/lookup")
+async def taxonomy_lookup(uuid: Optional[str] = None, label: Optional[str] = None, name: Optional[str] = None):
+    """Resolve a taxonomy UUID, a raw prediction string or an exact name."""
+    taxonomy = get_taxonomy()
+    if uuid:
+        entries = [taxonomy.get(uuid)] if taxonomy.get(uuid) else []
+    elif label:
+        entries = [taxonomy.parse_label(label)]
+    elif name:
+        entries = taxonomy.by_name(name)
+    else:
+        raise HTTPException(status_code=400, detail="Pass one of uuid, label or name")
+
+    if not entries:
+        raise HTTPException(status_code=404, detail="No matching taxonomy entry")
+    return {"results": [entry_to_dict(entry) for entry in entries]}
+
+@app.get("/taxonomy/search")
+async def taxonomy_search(q: str = "", rank: Optional[str] = None, value: Optional[str] = None, limit: int = 20):
+    """Search names by word prefix, optionally within one class/order/family/genus."""
+    taxonomy = get_taxonomy()
+    if rank is not None and rank not in RANKS:
+        raise HTTPException(status_code=400, detail=f"rank must be one of {', '.join(RANKS)}")
+    limit = max(1, min(limit, 200))
+
+    if q.strip():
+        entries = taxonomy.search(q, limit=limit, rank=rank, value=value)
+    elif rank and value:
+        entries = taxonomy.by_rank(rank, value)[:limit]
+    else:
+        raise HTTPException(status_code=400, detail="Pass q, or rank and value")
+    return {"results": [entry_to_dict(entry) for entry in entries]}
+
+@app.get("/catalog")
+async def get_catalog(request: Request, since: Optional[int] = None):
+    """
+    Taxonomy entries joined with their descriptions, keyed by UUID. With
+    since=<version> only entries changed after that version are returned, plus
+    the UUIDs of deleted ones; "full": true means replace everything instead.
+    """
+    if since is not None and since < 0:
+        raise HTTPException(status_code=400, detail="since must be a catalog version >= 0")
+    def catalog_headers(version):
+        etag = f'"catalog-{version}"' if since is None else f'"catalog-{since}-{version}"'
+        return {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    headers = catalog_headers(await run_in_threadpool(lambda: catalog.version))
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    # A refresh may land after the check above; the ETag follows the version the body was read at
+    version, body, encoding = await run_in_threadpool(
+        encode_catalog, since, pick_encoding(request.headers.get("accept-encoding"))
+    )
+    headers = catalog_headers(version)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+@app.get("/catalog/stats")
+async def catalog_stats():
+    return await run_in_threadpool(catalog.stats)
+
+@app.get("/descriptions/{key}")
+async def get_description(key: str):
+    """Description for a taxonomy name or UUID."""
+    try:
+        return lookup_description(key)
+    except LookupError:
+        raise HTTPException(status_code=404, detail=f"No description for {key}")
+
+@app.post("/sightings")
+async def add_sightings(request: Request):
+    """Index photo sightings: a JSON list (or {"sightings": [...]}) of photo documents."""
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+    records = body.get("sightings") if isinstance(body, dict) else body
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Expected a list of sightings")
+    try:
+        added, duplicates = await run_in_threadpool(sighting_index.ingest, records)
+    except InvalidSighting as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"added": added, "duplicates": duplicates, "total": len(sighting_index)}
+
+@app.get("/sightings")
+async def query_sightings(
+    min_lat: float = -90, min_lng: float = -180, max_lat: float = 90, max_lng: float = 180,
+    since: Optional[str] = None, until: Optional[str] = None, days: Optional[float] = None,
+    species: Optional[str] = None, limit: int = 500, cursor: Optional[str] = None,
+    cluster: bool = False, grid: int = 64,
+):
+    """
+    Sightings inside a bounding box and time window, optionally for some species
+    (comma-separated). Pages are followed with next_cursor; cluster=true returns
+    per-area counts instead of individual sightings for zoomed-out views.
+    """
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+        raise HTTPException(status_code=400, detail="Invalid bounding box")
+    try:
+        until_ts = parse_timestamp(until) if until else time.time()
+        if since:
+            since_ts = parse_timestamp(since)
+        elif days is not None:
+            since_ts = until_ts - days * 86400
+        else:
+            since_ts = 0.0
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    species_list = [name.strip() for name in species.split(",") if name.strip()] if species else None
+    box = (min_lat, min_lng, max_lat, max_lng, since_ts, until_ts)
+
+    if cluster:
+        clusters = await run_in_threadpool(sighting_index.clusters, *box, species_list, max(1, min(grid, 512)))
+        return {"clusters": clusters, "total": sum(c["count"] for c in clusters)}
+
+    try:
+        sightings, next_cursor = await run_in_threadpool(
+            sighting_index.query, *box, species_list, max(1, min(limit, SIGHTING_PAGE_MAX)), cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"sightings": sightings, "next_cursor": next_cursor}
+
+@app.get("/sightings/stats")
+async def sighting_stats():
+    return {**sighting_index.stats(), "aggregates": sighting_aggregates.stats()}
+
+@app.get("/aggregates/species")
+async def aggregate_species():
+    """Every species with sightings, most sighted first."""
+    return {"species": sighting_aggregates.species()}
+
+@app.get("/aggregates/species/{species}")
+async def aggregate_species_timeline(species: str, since: Optional[str] = None, until: Optional[str] = None):
+    """Daily counts, centroid drift and range extent for one species."""
+    try:
+        since_ts = parse_timestamp(since) if since else None
+        until_ts = parse_timestamp(until) if until else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    timeline = sighting_aggregates.species_timeline(species, since_ts, until_ts)
+    if timeline is None:
+        raise HTTPException(status_code=404, detail=f"No sightings of {species}")
+    return timeline
+
+@app.get("/heatmap/{zoom}/{x}/{y}")
+async def heatmap_tile(
+    zoom: int, x: int, y: int, request: Request,
+    species: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+):
+    """Pre-binned sighting counts for one web-mercator tile."""
+    if not (0 <= zoom <= 22 and 0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom):
+        raise HTTPException(status_code=400, detail="Invalid tile")
+    try:
+        since_ts = parse_timestamp(since) if since else None
+        until_ts = parse_timestamp(until) if until else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    etag = f'W/"{zoom}-{x}-{y}-{sighting_aggregates.tile_version(zoom, x, y)}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    tile = sighting_aggregates.heatmap_tile(zoom, x, y, species, since_ts, until_ts)
+    return JSONResponse(tile, headers={"ETag": etag})
+
 @app.post("/detect-animals")
 async def detect_animals(
-    background_tasks: BackgroundTasks,
-    files: List[UploadFile] = File(...)
+    request: Request,
+    files: List[UploadFile] = File(...),
+    burst: Optional[bool] = Form(None),
+    priority: Optional[str] = Form(None)
 ):
+    lane = pick_lane(priority, len(files))
+
+    # Claim a queue slot before anything is written to disk
+    job = await reserve_job(request, lane)
+
     # Create a unique session ID for this request
     session_id = str(uuid.uuid4())
     session_dir = UPLOAD_DIR / session_id
     session_dir.mkdir(exist_ok=True)
     
-    # Save uploaded files
+    # Stream uploaded files to disk off the event loop, hashing and
+    # validating them on the way through
     saved_files = []
-    for file in files:
-        file_path = session_dir / file.filename
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        saved_files.append(str(file_path))
-    
-    # Path for results
+    file_hashes = {}
+    saved_bytes = 0
+    budget = RequestBudget(MAX_UPLOAD_REQUEST_BYTES)
+    try:
+        with tracer.span("upload", session_id, len(files), lane=lane) as span:
+            for file in files:
+                file_path = session_dir / safe_filename(file.filename)
+                size, content_hash = await save_upload(file, file_path, MAX_UPLOAD_FILE_BYTES, budget)
+                saved_files.append(str(file_path))
+                file_hashes[str(file_path)] = content_hash
+                saved_bytes += size
+            span["bytes"] = saved_bytes
+    except BaseException as e:
+        job_queue.cancel(job)
+        await run_in_threadpool(shutil.rmtree, session_dir, True)
+        if isinstance(e, UploadRejected):
+            upload_rejections.inc(reason="size" if e.status_code == 413 else "invalid")
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        raise
+    uploaded_bytes.inc(saved_bytes)
+
+    return await start_detection(job, session_id, session_dir, saved_files, file_hashes, burst, lane)
+
+def pick_lane(priority: Optional[str], images: int):
+    """Single captures default to the interactive lane, multi-photo imports to bulk"""
+    lane = priority or ("interactive" if images == 1 else "bulk")
+    if lane not in LANES:
+        raise HTTPException(status_code=422, detail=f"priority must be one of {', '.join(LANES)}")
+    return lane
+
+async def reserve_job(request: Request, lane: str):
+    """Claim a queue slot for the calling client, or answer 429 with a Retry-After"""
+    client = request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+    try:
+        return await run_in_threadpool(job_queue.reserve, client, lane)
+    except Rejected as e:
+        upload_rejections.inc(reason="queue")
+        raise HTTPException(status_code=429, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+async def start_detection(job, session_id: str, session_dir: Path, saved_files: List[str], file_hashes: dict, burst: Optional[bool], lane: str):
+    """Queue a saved session on its reserved job and answer like /detect-animals"""
+    # Scratch path for the subprocess fallback; finished results go to results_db
     results_path = RESULTS_DIR / f"{session_id}.json"
-    
-    # Run the detection in the background
-    background_tasks.add_task(
-        run_detection_model,
-        session_dir,
-        results_path
-    )
-    
+    await run_in_threadpool(result_store.create, session_id, [os.path.basename(path) for path in saved_files])
+
+    # Run the detection once a job runner (or worker process) is free
+    await run_in_threadpool(job_queue.enqueue, job, {
+        "session_id": session_id,
+        "session_dir": str(session_dir),
+        "results_path": str(results_path),
+        "file_hashes": file_hashes,
+        "burst": BURST_DEDUPE if burst is None else burst,
+        "queued_at": time.time(),
+    })
+
     return {
         "message": "Images uploaded successfully and processing has started",
         "session_id": session_id,
+        "priority": lane,
         "status_endpoint": f"/detection-status/{session_id}"
     }
 
+@app.post("/uploads", status_code=201)
+async def create_upload(request: Request):
+    """
+    Start a resumable upload: {"files": [{"name", "size"}], "priority"?, "burst"?}.
+    Send each file with PATCH /uploads/{upload_id}/{filename} and an Upload-Offset
+    header; detection starts when the last byte of the last file arrives.
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
+    options = {"priority": body.get("priority"), "burst": body.get("burst")}
+    pick_lane(options["priority"], len(body.get("files") or []))
+    try:
+        return await run_in_threadpool(resumable_uploads.create, body.get("files"), options)
+    except UploadRejected as e:
+        upload_rejections.inc(reason="size" if e.status_code == 413 else "invalid")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@app.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    """Committed offset of every file, and the detection session once it has started."""
+    try:
+        return await run_in_threadpool(resumable_uploads.status, upload_id)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@app.head("/uploads/{upload_id}/{filename}")
+async def upload_offset(upload_id: str, filename: str):
+    """Where to resume a file: Upload-Offset is the number of bytes committed so far."""
+    try:
+        offset, size = await run_in_threadpool(resumable_uploads.file_offset, upload_id, filename)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return Response(headers={"Upload-Offset": str(offset), "Upload-Length": str(size), "Cache-Control": "no-store"})
+
+@app.patch("/uploads/{upload_id}/{filename}")
+async def upload_chunk(upload_id: str, filename: str, request: Request):
+    """Append the request body to a file at Upload-Offset; the reply carries the new offset."""
+    offset_header = request.headers.get("upload-offset", "")
+    if not offset_header.isdigit():
+        raise HTTPException(status_code=400, detail="Upload-Offset header is required")
+    try:
+        committed = await resumable_uploads.append(upload_id, filename, int(offset_header), request.stream())
+    except UploadRejected as e:
+        if e.status_code != 409:
+            upload_rejections.inc(reason="size" if e.status_code == 413 else "invalid")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    uploaded_bytes.inc(committed - int(offset_header))
+
+    response = {"offset": committed, "detection": None}
+    status = await run_in_threadpool(resumable_uploads.status, upload_id)
+    if status["complete"]:
+        # The queue may be full, or another request may be starting it; either way
+        # the upload stays complete and GET /uploads/{id} or POST .../start follows up
+        try:
+            response["detection"] = await start_resumable_upload(upload_id, request)
+        except HTTPException as e:
+            if e.status_code == 429:
+                response["retry_after"] = int(e.headers["Retry-After"])
+            elif e.status_code != 409:
+                raise
+    return JSONResponse(response, headers={"Upload-Offset": str(committed)})
+
+@app.post("/uploads/{upload_id}/start")
+async def start_upload(upload_id: str, request: Request):
+    """Queue detection for a complete upload; repeated calls return the same session."""
+    return await start_resumable_upload(upload_id, request)
+
+@app.delete("/uploads/{upload_id}", status_code=204)
+async def abort_upload(upload_id: str):
+    try:
+        await run_in_threadpool(resumable_uploads.abort, upload_id)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return Response(status_code=204)
+
+async def start_resumable_upload(upload_id: str, request: Request):
+    """Move a complete upload into a session directory and queue it under the upload's ID"""
+    try:
+        manifest = await run_in_threadpool(resumable_uploads.manifest, upload_id)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if manifest["detection"] is not None:
+        return manifest["detection"]
+
+    # Held across processes, so two replicas never queue the same upload twice
+    try:
+        lock = await run_in_threadpool(resumable_uploads.lock, upload_id)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    try:
+        # Whoever held the lock before us may have started it already
+        manifest = await run_in_threadpool(resumable_uploads.manifest, upload_id)
+        if manifest["detection"] is not None:
+            return manifest["detection"]
+        lane = pick_lane(manifest["options"].get("priority"), len(manifest["files"]))
+        job = await reserve_job(request, lane)
+        session_dir = UPLOAD_DIR / upload_id
+        # Until the job is queued, any failure must hand the reservation back.
+        # The files are left where commit() put them, and a retry carries on from there.
+        try:
+            saved_files = await run_in_threadpool(resumable_uploads.commit, upload_id, session_dir)
+            file_hashes = {path: await run_in_threadpool(hash_file, path) for path in saved_files}
+            tracer.record("upload", time.time() - manifest["created_at"], upload_id, len(saved_files),
+                          manifest["created_at"], lane=lane, resumable=True)
+            detection = await start_detection(job, upload_id, session_dir, saved_files, file_hashes, manifest["options"].get("burst"), lane)
+        except BaseException as e:
+            job_queue.cancel(job)
+            if isinstance(e, UploadRejected):
+                raise HTTPException(status_code=e.status_code, detail=e.detail)
+            raise
+        await run_in_threadpool(resumable_uploads.mark_started, upload_id, detection)
+        return detection
+    finally:
+        await run_in_threadpool(resumable_uploads.unlock, lock)
+
 @app.get("/detection-status/{session_id}")
-async def get_detection_status(session_id: str):
-    results_path = RESULTS_DIR / f"{session_id}.json"
-    
-    if not results_path.exists():
+async def get_detection_status(
+    session_id: str, request: Request,
+    compact: bool = False, fields: Optional[str] = None, offset: int = 0, limit: Optional[int] = None,
+):
+    """
+    Session status and results. compact=true drops server paths and the debug
+    block, fields=animal,confidence,... returns only those result fields (plus
+    filename), and limit/offset page through the results with next_offset.
+    """
+    field_set = None
+    if fields:
+        field_set = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = field_set - set(RESULT_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields {', '.join(sorted(unknown))}; choose from {', '.join(RESULT_FIELDS)}")
+        field_set.add("filename")
+    if offset < 0 or (limit is not None and limit < 1):
+        raise HTTPException(status_code=400, detail="offset must be >= 0 and limit >= 1")
+    page = (offset, min(limit, STATUS_PAGE_MAX)) if limit is not None else None
+
+    snapshot = await read_snapshot(session_id)
+    if snapshot is None:
+        snapshot = await run_in_threadpool(load_session_from_db, session_id)
+    if snapshot is None:
         return {"status": "processing"}
-    
-    with open(results_path, "r") as f:
-        results = json.load(f)
-    
-    # Check if there was an error
-    if "error" in results:
-        return {
-            "status": "error",
-            "error": results["error"]
+
+    # Idle polls cost a dict lookup and an ETag comparison. The ETag names the
+    # normalised query too, so a cached full body never validates a compact page
+    compact = compact or field_set is not None
+    query = "{}:{}:{}".format(
+        "compact" if compact else "full",
+        ",".join(sorted(field_set)) if field_set else "*",
+        f"{page[0]}+{page[1]}" if page else "all",
+    )
+    etag = f'W/"{session_id}-{snapshot["version"]}-{query}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    response = status_response(snapshot, compact, field_set, page)
+    accept_encoding = request.headers.get("accept-encoding")
+    # Serialising and compressing a big session is kept off the event loop
+    if len(response.get("results", ())) > 100:
+        return await run_in_threadpool(encoded_json, response, accept_encoding, 200, headers)
+    return encoded_json(response, accept_encoding, headers=headers)
+
+@app.get("/detection-events/{session_id}")
+async def detection_events(session_id: str, request: Request):
+    """Server-Sent Events stream of per-image results for one session."""
+    if not await run_in_threadpool(result_store.has, session_id):
+        await run_in_threadpool(load_session_from_db, session_id)
+    snapshot, queue = result_store.subscribe(session_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Unknown session")
+
+    async def stream():
+        try:
+            for result in snapshot["results"]:
+                yield sse_message("result", result, snapshot["version"])
+            if snapshot["status"] != "processing":
+                yield sse_message(snapshot["status"], status_response(snapshot), snapshot["version"])
+                return
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+
+                if message["event"] == "result":
+                    yield sse_message("result", message["data"], message["version"])
+                else:
+                    final = await read_snapshot(session_id)
+                    yield sse_message(message["event"], status_response(final), message["version"])
+                    return
+        finally:
+            result_store.unsubscribe(session_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def read_snapshot(session_id: str):
+    """The in-memory store answers inline; the shared SQLite store is read off the loop."""
+    if isinstance(result_store, SqliteResultStore):
+        return await run_in_threadpool(result_store.snapshot, session_id)
+    return result_store.snapshot(session_id)
+
+def sse_message(event: str, data, version: int):
+    return f"id: {version}\nevent: {event}\ndata: {dumps(data).decode()}\n\n"
+
+def status_response(snapshot: dict, compact: bool = False, fields: Optional[set] = None, page: Optional[tuple] = None):
+    """Shape a result store snapshot like the original polling response, optionally compact and paged"""
+    if snapshot["status"] == "error":
+        return {"status": "error", "error": snapshot["error"]}
+
+    results = snapshot["results"]
+    if page is not None:
+        offset, limit = page
+        results = results[offset:offset + limit]
+    if fields is not None:
+        results = [{key: value for key, value in result.items() if key in fields} for result in results]
+    elif compact:
+        results = [{key: value for key, value in result.items() if key != "original_path"} for result in results]
+
+    response = {
+        "status": snapshot["status"],
+        "results": results,
+    }
+    if page is not None:
+        # While processing, later pages can still gain results that finish out of order
+        response["offset"] = offset
+        response["next_offset"] = offset + limit if offset + limit < len(snapshot["results"]) else None
+    if snapshot["status"] == "processing":
+        response["completed"] = len(snapshot["results"])
+        response["total"] = snapshot["total"]
+    elif not compact:
+        response["debug"] = {
+            "raw_predictions_count": len(snapshot["results"]),
+            "formatted_results_count": len(snapshot["results"]),
         }
-    
-    # Process results to make them more user-friendly
-    formatted_results = []
-    if "predictions" in results:
-        print(f"Raw predictions: {results['predictions']}")  # Debug log
-        
-        for prediction in results["predictions"]:
-            filepath = prediction["filepath"]
-            filename = os.path.basename(filepath)
-            
-            print(f"Processing prediction for file: {filepath}, basename: {filename}")  # Debug log
-            
-            # Extract animal name from prediction
-            animal_name = "Unknown"
-            if prediction["prediction"] and isinstance(prediction["prediction"], str):
-                pred_parts = prediction["prediction"].split(';')
-                print(f"Prediction parts: {pred_parts}")  # Debug log
-                
-                if len(pred_parts) >= 7:
-                    animal_name = pred_parts[6]
-                    print(f"Extracted animal name: {animal_name}")  # Debug log
-            
-            formatted_results.append({
-                "filename": filename,
-                "original_path": filepath,
-                "animal": animal_name,
-                "confidence": prediction.get("confidence", 0)
-            })
-    
-    print(f"Formatted results: {formatted_results}")  # Debug log
+    if snapshot["summary"]:
+        response["summary"] = snapshot["summary"]
+    return response
+
+def format_prediction(prediction: dict):
+    """Turn a raw SpeciesNet prediction into the client-facing result"""
+    filepath = prediction["filepath"]
+
+    # Resolve the prediction string through the taxonomy index
+    animal_name = "Unknown"
+    taxonomy_id = None
+    if prediction.get("prediction") and isinstance(prediction["prediction"], str):
+        entry = get_taxonomy().parse_label(prediction["prediction"])
+        animal_name = entry_name(entry)
+        taxonomy_id = entry.uuid
+
+    description = None
+    try:
+        description = lookup_description(taxonomy_id or animal_name)["description"]
+    except LookupError:
+        pass
+
     return {
-        "status": "complete",
-        "results": formatted_results,
-        "debug": {
-            "raw_predictions_count": len(results.get("predictions", [])),
-            "formatted_results_count": len(formatted_results)
-        }
+        "filename": os.path.basename(filepath),
+        "original_path": filepath,
+        "thumbnail": thumbnail_url(filepath),
+        "animal": animal_name,
+        "taxonomy_id": taxonomy_id,
+        "description": description,
+        "confidence": prediction.get("confidence", prediction.get("prediction_score", 0))
     }
 
-def run_detection_model(input_dir: Path, output_path: Path):
+def thumbnail_url(filepath: str):
+    _, thumb_path = output_paths(filepath)
+    if not thumb_path.is_file():
+        return None
+    return f"/thumbnails/{Path(filepath).parent.name}/{os.path.basename(filepath)}"
+
+# Serialised catalog bodies by (version, since, encoding), most recently used last
+ENCODED_CATALOG_CACHE_SIZE = 64
+encoded_catalogs = OrderedDict()
+encoded_catalogs_lock = threading.Lock()
+
+def encode_catalog(since: Optional[int], encoding: Optional[str]):
+    """
+    (version, body, content encoding) of the catalog or a delta. A body is
+    cached under the version of the read that built it, never the version
+    seen before the read, so a refresh in between cannot pair them wrongly.
+    """
+    key = (catalog.version, since, encoding)
+    with encoded_catalogs_lock:
+        cached = encoded_catalogs.get(key)
+        if cached is not None:
+            encoded_catalogs.move_to_end(key)
+            return (key[0],) + cached
+
+    payload = catalog.full() if since is None else catalog.delta(since)
+    body = dumps(payload)
+    if encoding and len(body) >= MIN_COMPRESS_BYTES:
+        body = compress(body, encoding)
+    else:
+        encoding = None
+    with encoded_catalogs_lock:
+        encoded_catalogs[(payload["version"], since, key[2])] = (body, encoding)
+        while len(encoded_catalogs) > ENCODED_CATALOG_CACHE_SIZE:
+            encoded_catalogs.popitem(last=False)
+    return payload["version"], body, encoding
+
+@lru_cache(maxsize=DESCRIPTION_CACHE_SIZE)
+def lookup_description(key: str):
+    """
+    Cached store lookup; misses raise LookupError so they are not cached.
+    Cleared whenever a catalog refresh finds changed descriptions, and by
+    workers every CATALOG_REFRESH_MINUTES.
+    """
+    row = description_store.get_by_uuid(key) or description_store.get(key)
+    if row is None:
+        raise LookupError(key)
+    return row
+
+def load_session_from_db(session_id: str):
+    """Fill the result store from a session finished before a restart or eviction"""
+    results = results_db.get_session(session_id)
+    if results is None:
+        return None
+
+    if "error" in results:
+        result_store.load(session_id, [], status="error", error=results["error"])
+    else:
+        result_store.load(
+            session_id,
+            [format_prediction(prediction) for prediction in results.get("predictions", [])],
+            summary=results.get("summary"),
+        )
+    return result_store.snapshot(session_id)
+
+def run_detection_job(payload: dict):
+    """Run a queued job; the payload is JSON so it can cross to worker processes."""
+    session_id = payload["session_id"]
+    images = len(payload["file_hashes"])
+    if payload.get("queued_at"):
+        tracer.record("queue", max(0.0, time.time() - payload["queued_at"]), session_id, images, payload["queued_at"])
+    try:
+        with tracer.span("job", session_id, images):
+            run_detection_model(
+                Path(payload["session_dir"]),
+                Path(payload["results_path"]),
+                payload["file_hashes"],
+                payload["burst"],
+            )
+    except Exception as e:
+        # Whatever broke, the session must not be left "processing" for clients to poll forever
+        detection_failures.inc(cause="job_error")
+        sessions_finished.inc(status="error")
+        error = f"Detection failed: {e!r}"
+        log.exception("Detection job for session %s failed", session_id)
+        try:
+            results_db.save_session(session_id, {"predictions": [], "error": error})
+        except Exception as db_error:
+            log.error("Could not record the failure of session %s: %r", session_id, db_error)
+        result_store.fail(session_id, error)
+        raise
+
+def run_detection_model(input_dir: Path, output_path: Path, file_hashes: dict = None, burst_dedupe: bool = False):
     """Run the animal detection model on the input images"""
+    session_id = input_dir.name
+    filepaths = list_session_images(input_dir)
+    file_hashes = dict(file_hashes or {})
+    if not result_store.has(session_id):
+        result_store.create(session_id, [os.path.basename(filepath) for filepath in filepaths])
+
+    # Decode, orient and downscale every upload once; thumbnails are made for
+    # cache hits too, and only the misses' model inputs are read by the workers
+    model_inputs = {}
+    if preprocessor:
+        with tracer.span("preprocess", session_id, len(filepaths)):
+            model_inputs = preprocessor.run(filepaths)
+
+    predictions = {}
+    format_seconds = 0.0
+
+    def record(filepath, prediction, cacheable=True):
+        """Keep a finished prediction and publish it to the session straight away"""
+        nonlocal format_seconds
+        prediction["content_hash"] = file_hashes[filepath]
+        predictions[filepath] = prediction
+        if (cacheable and prediction_cache and prediction.get("prediction")
+                and not prediction.get("failures") and not prediction.get("propagated")):
+            prediction_cache.put(file_hashes[filepath], prediction)
+        images_processed.inc(source=prediction_source(prediction))
+        started = time.perf_counter()
+        result = format_prediction(prediction)
+        format_seconds += time.perf_counter() - started
+        result_store.add_result(session_id, result)
+
+    # Serve re-uploaded images from the cache and only classify the rest
+    misses = []
+    with tracer.span("cache", session_id, len(filepaths)) as span:
+        for filepath in filepaths:
+            file_hashes[filepath] = file_hashes.get(filepath) or hash_file(filepath)
+            cached = prediction_cache.get(file_hashes[filepath]) if prediction_cache else None
+            if cached is not None:
+                cached.update({"filepath": filepath, "cached": True})
+                record(filepath, cached, cacheable=False)
+            else:
+                misses.append(filepath)
+        span["hits"] = len(filepaths) - len(misses)
+
+    # Collapse near-identical burst frames so only a sample per group is classified
+    groups = [[filepath] for filepath in misses]
+    if burst_dedupe and len(misses) > 1 and dedupe.is_available():
+        with tracer.span("dedupe", session_id, len(misses)) as span:
+            # Hashing the downscaled copies gives the same groups for a fraction of the decode
+            originals = {model_inputs.get(filepath, filepath): filepath for filepath in misses}
+            groups = [
+                [originals[path] for path in group]
+                for group in dedupe.group_near_duplicates(list(originals), BURST_HAMMING_THRESHOLD)
+            ]
+            span["groups"] = len(groups)
+    samples = [dedupe.pick_samples(group, BURST_SAMPLES_PER_GROUP) for group in groups]
+    group_of = {filepath: index for index, group_samples in enumerate(samples) for filepath in group_samples}
+    to_classify = [filepath for group_samples in samples for filepath in group_samples]
+
+    fresh = {}
+
+    def on_classified(filepath, prediction):
+        # A group is published as soon as all of its sampled frames are back
+        fresh[filepath] = prediction
+        index = group_of[filepath]
+        if all(member in fresh for member in samples[index]):
+            for member, member_prediction in dedupe.propagate(groups[index], fresh).items():
+                record(member, member_prediction)
+
+    # The model reads the preprocessed copies; results are reported against the originals
+    originals = {model_inputs.get(filepath, filepath): filepath for filepath in to_classify}
+
+    def on_model_result(model_path, prediction):
+        prediction["filepath"] = originals[model_path]
+        on_classified(originals[model_path], prediction)
+
+    errors = []
+    if to_classify:
+        with tracer.span("inference", session_id, len(to_classify), mode="pool" if inference_pool else "subprocess") as span:
+            if inference_pool is not None:
+                errors = classify_in_pool(list(originals), on_model_result)
+            else:
+                errors = classify_in_subprocess(list(originals), output_path, on_model_result)
+            span["errors"] = len(errors)
+    # Formatting happens as results arrive, so this span overlaps the ones above
+    tracer.record("format", format_seconds, session_id, len(filepaths))
+
+    output = {"predictions": [predictions[filepath] for filepath in filepaths]}
+    failed = bool(errors) and not any(prediction.get("prediction") for prediction in predictions.values())
+    if failed:
+        output["error"] = "; ".join(errors)
+
+    # Skip rate and compute saved by detector-first inference
+    tiers = summarise_tiers(output["predictions"])
+    if tiers:
+        output["summary"] = {"tiered": tiers}
+
+    with tracer.span("persist", session_id, len(filepaths)):
+        results_db.save_session(session_id, output)
+
+    sessions_finished.inc(status="error" if failed else "complete")
+    if failed:
+        result_store.fail(session_id, output["error"])
+    else:
+        result_store.complete(session_id, output.get("summary"))
+
+def list_session_images(input_dir: Path):
+    return sorted(
+        str(path) for path in input_dir.iterdir()
+        if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS
+    )
+
+def failed_prediction(filepath: str, cause: str):
+    return {"filepath": filepath, "prediction": None, "failures": [cause]}
+
+def prediction_source(prediction: dict):
+    """Metrics label for what answered an image: cache, burst (a group sample), model or failed."""
+    if prediction.get("cached"):
+        return "cache"
+    if prediction.get("failures") or not prediction.get("prediction"):
+        return "failed"
+    if prediction.get("propagated"):
+        return "burst"
+    return "model"
+
+def classify_in_pool(filepaths: List[str], on_classified):
+    """Classify images through the batcher and warm worker pool, reporting each as it finishes"""
+    futures = {}
+    errors = []
+    for filepath in filepaths:
+        try:
+            futures[batcher.submit(filepath)] = filepath
+        except Exception as e:
+            log.error("Error queueing %s: %r", filepath, e)
+            detection_failures.inc(cause="queue_error")
+            errors.append(f"{os.path.basename(filepath)}: {e!r}")
+            on_classified(filepath, failed_prediction(filepath, "INFERENCE"))
+
+    try:
+        for future in as_completed(futures, timeout=INFERENCE_TIMEOUT):
+            filepath = futures.pop(future)
+            try:
+                prediction = future.result()
+            except Exception as e:
+                log.error("Error running detection model on %s: %r", filepath, e)
+                detection_failures.inc(cause="inference_error")
+                errors.append(f"{os.path.basename(filepath)}: {e!r}")
+                prediction = failed_prediction(filepath, "INFERENCE")
+            on_classified(filepath, prediction)
+    except FuturesTimeout:
+        detection_failures.inc(len(futures), cause="timeout")
+        for filepath in futures.values():
+            errors.append(f"{os.path.basename(filepath)}: timed out")
+            on_classified(filepath, failed_prediction(filepath, "TIMEOUT"))
+
+    return errors
+
+def classify_in_subprocess(filepaths: List[str], output_path: Path, on_classified):
+    """Classify images with a one-off SpeciesNet subprocess"""
+    predictions, errors = run_speciesnet_subprocess(filepaths, output_path)
+    for filepath in filepaths:
+        on_classified(filepath, predictions[filepath])
+    return errors
+
+def run_speciesnet_subprocess(filepaths: List[str], output_path: Path):
+    partial_path = output_path.with_name(f"{output_path.stem}.partial.json")
     try:
         # Method 1: Try using subprocess to run the command directly
         # This is more reliable than importing Python modules dynamically
@@ -130,11 +1314,11 @@ def run_detection_model(input_dir: Path, output_path: Path):
             "python",
             "-m",
             "speciesnet.scripts.run_model",
-            "--folders", str(input_dir),
-            "--predictions_json", str(output_path)
+            "--filepaths", ",".join(filepaths),
+            "--predictions_json", str(partial_path)
         ]
         
-        print(f"Running command: {' '.join(cmd)}")
+        log.debug("Running command: %s", " ".join(cmd))
         process = subprocess.run(
             cmd, 
             capture_output=True, 
@@ -142,36 +1326,33 @@ def run_detection_model(input_dir: Path, output_path: Path):
         )
         
         if process.returncode != 0:
-            print(f"Command failed with return code: {process.returncode}")
-            print(f"Error output: {process.stderr}")
+            log_fields(log, logging.ERROR, "SpeciesNet subprocess failed",
+                       returncode=process.returncode, images=len(filepaths), stderr=process.stderr[-2000:])
+            detection_failures.inc(cause="subprocess_returncode")
+            return {filepath: failed_prediction(filepath, "INFERENCE") for filepath in filepaths}, [process.stderr] * len(filepaths)
             
-            # Create error output JSON
-            with open(output_path, "w") as f:
-                json.dump({
-                    "error": process.stderr,
-                    "predictions": []
-                }, f)
-            return
-            
-        print(f"Command output: {process.stdout}")
+        log.debug("Command output: %s", process.stdout)
         
-        # If the command ran but didn't generate a results file, create an empty one
-        if not output_path.exists():
-            print("Command ran but no output file was created")
-            with open(output_path, "w") as f:
-                json.dump({
-                    "error": "Command completed but no output file was generated",
-                    "predictions": []
-                }, f)
+        # If the command ran but didn't generate a results file, report it
+        if not partial_path.exists():
+            log.error("SpeciesNet subprocess exited cleanly but wrote no %s", partial_path.name)
+            detection_failures.inc(cause="subprocess_no_output")
+            error = "Command completed but no output file was generated"
+            return {filepath: failed_prediction(filepath, "INFERENCE") for filepath in filepaths}, [error] * len(filepaths)
+
+        with open(partial_path, "r") as f:
+            output = json.load(f)
+        partial_path.unlink()
+
+        predictions = {prediction["filepath"]: prediction for prediction in output.get("predictions", [])}
+        for filepath in filepaths:
+            predictions.setdefault(filepath, failed_prediction(filepath, "INFERENCE"))
+        return predictions, []
         
     except Exception as e:
-        print(f"Error running detection model: {e}")
-        # Create error output
-        with open(output_path, "w") as f:
-            json.dump({
-                "error": str(e),
-                "predictions": []
-            }, f)
+        log.error("Error running detection model: %r", e)
+        detection_failures.inc(cause="subprocess_error")
+        return {filepath: failed_prediction(filepath, "INFERENCE") for filepath in filepaths}, [str(e)] * len(filepaths)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,60 @@
+"""
+Import legacy results/<session_id>.json files into the results database
+
+    python migrate_results.py --results-dir results --db results.sqlite3 [--delete]
+
+Each file becomes one session, finished at the file's modification time, so
+the normal retention period applies from when the session originally ran.
+Re-running is safe: sessions already imported are replaced, not duplicated.
+With --delete each JSON file is removed once it has been imported.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from results_db import ResultsDB
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import results/*.json session files into the results database")
+    parser.add_argument("--results-dir", default="results")
+    parser.add_argument("--db", default=os.environ.get("RESULTS_DB_PATH", "results.sqlite3"))
+    parser.add_argument("--delete", action="store_true", help="Remove each JSON file after importing it")
+    args = parser.parse_args()
+
+    # Scratch files from the subprocess fallback are not sessions
+    paths = sorted(path for path in Path(args.results_dir).glob("*.json") if not path.name.endswith(".partial.json"))
+    if not paths:
+        print(f"No session files in {args.results_dir}")
+        return
+
+    db = ResultsDB(args.db)
+    started = time.perf_counter()
+    sessions = predictions = failed = 0
+    freed = 0
+    for path in paths:
+        try:
+            predictions += db.import_json_file(path)
+        except (OSError, ValueError, json.JSONDecodeError) as e:
+            print(f"Skipping {path.name}: {e}")
+            failed += 1
+            continue
+        sessions += 1
+        if args.delete:
+            freed += path.stat().st_size
+            path.unlink()
+
+    elapsed = time.perf_counter() - started
+    print(f"Imported {sessions} sessions ({predictions} predictions) in {elapsed:.1f}s, {failed} skipped")
+    if args.delete:
+        print(f"Removed {sessions} JSON files ({freed / (1024 * 1024):.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
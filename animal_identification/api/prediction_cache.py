@@ -0,0 +1,135 @@
+"""
+Persistent prediction cache keyed by image content hash
+
+Phones re-upload the same photos constantly, so predictions are stored under
+the SHA-256 of the image bytes plus the model version the cache was opened
+with. The cache is a single SQLite file with size-based LRU eviction; entries
+from other model versions are never served and age out through the same LRU,
+so switching versions back and forth does not throw the cache away.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Per-upload fields that must not be replayed from the cache
+SESSION_KEYS = {"filepath", "content_hash", "cached"}
+
+
+def hash_file(path):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, path, model_version, max_bytes=64 * 1024 * 1024):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.model_version = str(model_version)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS predictions (
+                content_hash TEXT NOT NULL,
+                model_version TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (content_hash, model_version)
+            );
+            CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (last_used);
+            """
+        )
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM predictions"
+        ).fetchone()[0]
+
+    def get(self, content_hash):
+        """Return the cached prediction for this content, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM predictions WHERE content_hash = ? AND model_version = ?",
+                (content_hash, self.model_version),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE predictions SET last_used = ? WHERE content_hash = ? AND model_version = ?",
+                    (time.time(), content_hash, self.model_version),
+                )
+        return json.loads(row[0])
+
+    def put(self, content_hash, prediction):
+        """Store a prediction (without its session-specific filepath) under the cache's model version."""
+        stored = {key: value for key, value in prediction.items() if key not in SESSION_KEYS}
+        payload = json.dumps(stored, separators=(",", ":"))
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            with self._conn:
+                old = self._conn.execute(
+                    "SELECT size FROM predictions WHERE content_hash = ? AND model_version = ?",
+                    (content_hash, self.model_version),
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)",
+                    (content_hash, self.model_version, payload, size, time.time()),
+                )
+                self._total_bytes += size - (old[0] if old else 0)
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT content_hash, model_version, size FROM predictions ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for content_hash, model_version, size in rows:
+                self._conn.execute(
+                    "DELETE FROM predictions WHERE content_hash = ? AND model_version = ?",
+                    (content_hash, model_version),
+                )
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= self.max_bytes:
+                    return
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "model_version": self.model_version,
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
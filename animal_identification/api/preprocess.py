@@ -0,0 +1,126 @@
+"""
+Parallel image preprocessing ahead of inference
+
+Phone photos arrive as full-resolution JPEGs/PNGs (12+ MP), but SpeciesNet's
+detector letterboxes to 1280px and the classifier crops down to 480px. Each
+upload is decoded once on a process pool, rotated by its EXIF orientation and
+written out twice next to the original:
+
+- <session>/.model/<filename>.jpg: longest side capped at the model input size,
+  which the workers read instead of the original
+- <session>/.thumbs/<filename>.jpg: a small thumbnail served to the gallery
+
+JPEG decoding uses PIL's draft mode, so large photos are decoded at a reduced
+DCT scale instead of at full size and then resized. Images that fail
+preprocessing keep using the original file.
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+MODEL_DIR = ".model"
+THUMB_DIR = ".thumbs"
+DEFAULT_MODEL_SIZE = 1280
+DEFAULT_THUMB_SIZE = 256
+
+log = logging.getLogger(__name__)
+
+
+def is_available():
+    return Image is not None
+
+
+def output_paths(filepath):
+    """(model input path, thumbnail path) for an uploaded image."""
+    path = Path(filepath)
+    # Keep the extension so photo.png and photo.jpg don't collide
+    name = f"{path.name}.jpg"
+    return path.parent / MODEL_DIR / name, path.parent / THUMB_DIR / name
+
+
+def preprocess_image(filepath, model_size=DEFAULT_MODEL_SIZE, thumb_size=DEFAULT_THUMB_SIZE, quality=90):
+    """Write the model input and thumbnail for one image; returns their paths as strings."""
+    model_path, thumb_path = output_paths(filepath)
+    model_path.parent.mkdir(exist_ok=True)
+    thumb_path.parent.mkdir(exist_ok=True)
+
+    with Image.open(filepath) as img:
+        # Orientation 5-8 swap width and height, so draft to the larger side either way
+        img.draft("RGB", (model_size, model_size))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+
+    img.thumbnail((model_size, model_size), Image.LANCZOS)
+    img.save(model_path, "JPEG", quality=quality)
+    img.thumbnail((thumb_size, thumb_size), Image.BILINEAR)
+    img.save(thumb_path, "JPEG", quality=80, optimize=True)
+    return str(model_path), str(thumb_path)
+
+
+def _preprocess_one(filepath, model_size, thumb_size):
+    try:
+        return filepath, preprocess_image(filepath, model_size, thumb_size), None
+    except Exception as e:
+        return filepath, None, repr(e)
+
+
+class Preprocessor:
+    """Process pool that prepares model inputs and thumbnails for uploaded images."""
+
+    def __init__(self, workers=None, model_size=DEFAULT_MODEL_SIZE, thumb_size=DEFAULT_THUMB_SIZE):
+        self.workers = workers or max(1, (os.cpu_count() or 2) // 2)
+        self.model_size = model_size
+        self.thumb_size = thumb_size
+        self.images = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self._executor = None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"))
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def run(self, filepaths):
+        """{original filepath: model input path} for the images that were preprocessed."""
+        if not filepaths:
+            return {}
+        self.start()
+        started = time.perf_counter()
+        model_inputs = {}
+        futures = [
+            self._executor.submit(_preprocess_one, filepath, self.model_size, self.thumb_size)
+            for filepath in filepaths
+        ]
+        for future in futures:
+            filepath, paths, error = future.result()
+            if error:
+                log.warning("Preprocessing %s failed, using the original: %s", filepath, error)
+                self.failures += 1
+            else:
+                model_inputs[filepath] = paths[0]
+        self.images += len(filepaths)
+        self.seconds += time.perf_counter() - started
+        return model_inputs
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "model_size": self.model_size,
+            "thumb_size": self.thumb_size,
+            "images": self.images,
+            "failures": self.failures,
+            "images_per_second": self.images / self.seconds if self.seconds else None,
+        }
@@ -0,0 +1,84 @@
+"""
+Compact, compressed JSON responses
+
+Status polls of bulk imports carry hundreds of results and are downloaded
+again every time the session changes. encoded_json() serialises with orjson
+when it is installed (stdlib json otherwise) and compresses with brotli or
+gzip, whichever the client's Accept-Encoding prefers and the server has.
+Bodies under MIN_COMPRESS_BYTES go out uncompressed, where the framing would
+cost more than it saves.
+"""
+
+import gzip
+import json
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps(obj):
+    """Compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def pick_encoding(accept_encoding):
+    """"br", "gzip" or None for an Accept-Encoding header, honouring q=0 and server support."""
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+
+    candidates = [("br", brotli is not None), ("gzip", True)]
+    available = [
+        (weights.get(name, weights.get("*", 0.0)), -index, name)
+        for index, (name, supported) in enumerate(candidates)
+        if supported
+    ]
+    q, _, name = max(available)
+    return name if q > 0 else None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+def encoded_json(content, accept_encoding=None, status_code=200, headers=None):
+    """A JSON Response compressed for the client; Vary is set so caches keep encodings apart."""
+    body = dumps(content)
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    encoding = pick_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
@@ -0,0 +1,329 @@
+"""
+In-memory store of finished, already-formatted detection results
+
+Inference threads add each image's result as soon as it is ready. The polling
+endpoint reads sessions from here instead of re-parsing the predictions file,
+and Server-Sent Events subscribers get every new result pushed to them. Every
+change bumps a per-session version, which doubles as the ETag.
+
+SqliteResultStore is the shared variant for split API/worker deployments.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultStore:
+    def __init__(self, max_sessions=1000):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def bind_loop(self, loop):
+        """Remember the event loop so worker threads can wake SSE subscribers."""
+        self._loop = loop
+
+    def create(self, session_id, filenames):
+        with self._lock:
+            self._sessions[session_id] = {
+                "status": "processing",
+                "total": len(filenames),
+                "results": {},
+                "order": list(filenames),
+                "summary": {},
+                "error": None,
+                "version": 1,
+                "updated_at": time.time(),
+                "subscribers": [],
+            }
+            self._evict()
+
+    def has(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def add_result(self, session_id, result):
+        """Record one formatted image result and push it to subscribers."""
+        self._update(session_id, "result", result, lambda session: session["results"].__setitem__(result["filename"], result))
+
+    def complete(self, session_id, summary=None):
+        def apply(session):
+            session["status"] = "complete"
+            session["summary"].update(summary or {})
+
+        self._update(session_id, "complete", {"status": "complete"}, apply)
+
+    def fail(self, session_id, error):
+        def apply(session):
+            session["status"] = "error"
+            session["error"] = error
+
+        self._update(session_id, "error", {"status": "error", "error": error}, apply)
+
+    def load(self, session_id, results, status="complete", error=None, summary=None):
+        """Populate a finished session in one go, e.g. from a results file after a restart."""
+        self.create(session_id, [result["filename"] for result in results])
+        for result in results:
+            self.add_result(session_id, result)
+        if status == "error":
+            self.fail(session_id, error)
+        else:
+            self.complete(session_id, summary)
+
+    def forget(self, session_id):
+        """Drop a finished session, e.g. once its retention period is over."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session and session["status"] != "processing" and not session["subscribers"]:
+                del self._sessions[session_id]
+
+    def snapshot(self, session_id):
+        """Current status, ordered results and version, or None if unknown."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            return self._snapshot(session)
+
+    def subscribe(self, session_id):
+        """Register an SSE listener; returns (snapshot, queue) or (None, None). Call on the loop."""
+        queue = asyncio.Queue()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None, None
+            session["subscribers"].append(queue)
+            return self._snapshot(session), queue
+
+    def unsubscribe(self, session_id, queue):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session and queue in session["subscribers"]:
+                session["subscribers"].remove(queue)
+
+    def _snapshot(self, session):
+        results = session["results"]
+        ordered = [results[name] for name in session["order"] if name in results]
+        ordered += [result for name, result in results.items() if name not in session["order"]]
+        return {
+            "status": session["status"],
+            "total": session["total"],
+            "results": ordered,
+            "summary": dict(session["summary"]),
+            "error": session["error"],
+            "version": session["version"],
+        }
+
+    def _update(self, session_id, event, data, apply):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            apply(session)
+            session["version"] += 1
+            session["updated_at"] = time.time()
+            subscribers = list(session["subscribers"])
+            version = session["version"]
+
+        if subscribers and self._loop is not None:
+            message = {"event": event, "data": data, "version": version}
+            for queue in subscribers:
+                self._loop.call_soon_threadsafe(queue.put_nowait, message)
+
+    def _evict(self):
+        """Drop the oldest finished sessions once over max_sessions."""
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        for session_id in list(self._sessions):
+            if excess <= 0:
+                break
+            session = self._sessions[session_id]
+            if session["status"] != "processing" and not session["subscribers"]:
+                del self._sessions[session_id]
+                excess -= 1
+
+
+class SqliteResultStore:
+    """
+    ResultStore with the same interface, kept in a SQLite file that every API
+    replica and inference worker opens, so any replica can answer for any
+    session. SSE subscribers are fed by polling the session's version.
+    """
+
+    def __init__(self, path, poll_interval=0.5):
+        self.path = str(path)
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._pollers = {}
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                filenames TEXT NOT NULL,
+                summary TEXT NOT NULL DEFAULT '{}',
+                error TEXT,
+                version INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS session_results (
+                session_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                PRIMARY KEY (session_id, filename)
+            );
+            """
+        )
+
+    def bind_loop(self, loop):
+        """Subscribers poll on the loop they subscribed from; nothing to remember."""
+
+    def create(self, session_id, filenames):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, status, total, filenames, version, updated_at) "
+                "VALUES (?, 'processing', ?, ?, 1, ?)",
+                (session_id, len(filenames), json.dumps(list(filenames)), time.time()),
+            )
+
+    def has(self, session_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone() is not None
+
+    def add_result(self, session_id, result):
+        def apply(version):
+            self._conn.execute(
+                "INSERT OR REPLACE INTO session_results (session_id, filename, payload, version) VALUES (?, ?, ?, ?)",
+                (session_id, result["filename"], json.dumps(result), version),
+            )
+
+        self._update(session_id, apply)
+
+    def complete(self, session_id, summary=None):
+        def apply(version):
+            row = self._conn.execute("SELECT summary FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            merged = json.loads(row[0])
+            merged.update(summary or {})
+            self._conn.execute(
+                "UPDATE sessions SET status = 'complete', summary = ? WHERE id = ?", (json.dumps(merged), session_id)
+            )
+
+        self._update(session_id, apply)
+
+    def fail(self, session_id, error):
+        def apply(version):
+            self._conn.execute("UPDATE sessions SET status = 'error', error = ? WHERE id = ?", (error, session_id))
+
+        self._update(session_id, apply)
+
+    def load(self, session_id, results, status="complete", error=None, summary=None):
+        self.create(session_id, [result["filename"] for result in results])
+        for result in results:
+            self.add_result(session_id, result)
+        if status == "error":
+            self.fail(session_id, error)
+        else:
+            self.complete(session_id, summary)
+
+    def forget(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM session_results WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE id = ? AND status != 'processing'", (session_id,))
+
+    def snapshot(self, session_id):
+        with self._lock:
+            return self._snapshot(session_id)
+
+    def subscribe(self, session_id):
+        """Register an SSE listener; returns (snapshot, queue) or (None, None). Call on the loop."""
+        snapshot = self.snapshot(session_id)
+        if snapshot is None:
+            return None, None
+        queue = asyncio.Queue()
+        if snapshot["status"] == "processing":
+            self._pollers[queue] = asyncio.get_running_loop().create_task(
+                self._poll(session_id, queue, snapshot["version"])
+            )
+        return snapshot, queue
+
+    def unsubscribe(self, session_id, queue):
+        task = self._pollers.pop(queue, None)
+        if task is not None:
+            task.cancel()
+
+    async def _poll(self, session_id, queue, version):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            changes = await loop.run_in_executor(None, self._changes_since, session_id, version)
+            if changes is None:
+                continue
+            status, version, results = changes
+            for result, result_version in results:
+                queue.put_nowait({"event": "result", "data": result, "version": result_version})
+            if status != "processing":
+                queue.put_nowait({"event": status, "data": {"status": status}, "version": version})
+                return
+
+    def _changes_since(self, session_id, version):
+        """(status, version, [(result, version)]) of results newer than version, or None if unchanged."""
+        with self._lock:
+            row = self._conn.execute("SELECT status, version FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None or row[1] <= version:
+                return None
+            results = self._conn.execute(
+                "SELECT payload, version FROM session_results WHERE session_id = ? AND version > ? ORDER BY version",
+                (session_id, version),
+            ).fetchall()
+        return row[0], row[1], [(json.loads(payload), result_version) for payload, result_version in results]
+
+    def _snapshot(self, session_id):
+        row = self._conn.execute(
+            "SELECT status, total, filenames, summary, error, version FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, total, filenames, summary, error, version = row
+        results = {
+            filename: json.loads(payload)
+            for filename, payload in self._conn.execute(
+                "SELECT filename, payload FROM session_results WHERE session_id = ?", (session_id,)
+            )
+        }
+        order = json.loads(filenames)
+        ordered = [results[name] for name in order if name in results]
+        ordered += [result for name, result in results.items() if name not in order]
+        return {
+            "status": status,
+            "total": total,
+            "results": ordered,
+            "summary": json.loads(summary),
+            "error": error,
+            "version": version,
+        }
+
+    def _update(self, session_id, apply):
+        """Bump the session's version and apply a change in one write transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(
+                    "UPDATE sessions SET version = version + 1, updated_at = ? WHERE id = ?", (time.time(), session_id)
+                )
+                if cursor.rowcount:
+                    version = self._conn.execute("SELECT version FROM sessions WHERE id = ?", (session_id,)).fetchone()[0]
+                    apply(version)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
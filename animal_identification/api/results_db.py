@@ -0,0 +1,183 @@
+"""
+Consolidated SQLite store of finished detection sessions
+
+Every session used to leave a results/<session_id>.json file and an
+uploaded_images/<session_id>/ directory behind forever, and restarts re-read
+those JSON files on every cold status poll. Sessions are now rows here, with
+each image's raw prediction indexed by session, content hash and species:
+
+- get_session() rebuilds the old results-file dict for a session
+- search() finds past predictions by content hash or taxonomy UUID
+- collect_garbage() drops sessions finished more than ttl_seconds ago, along
+  with their upload directories, plus upload directories that never got a
+  session row (abandoned or failed uploads)
+- import_json_file() is used by migrate_results.py for old results/*.json files
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from taxonomy import entry_name, get_taxonomy
+
+
+def species_of(prediction):
+    """(taxonomy UUID, common name) of a raw prediction, or (None, None)."""
+    label = prediction.get("prediction")
+    if not label or not isinstance(label, str):
+        return None, None
+    entry = get_taxonomy().parse_label(label)
+    return entry.uuid, entry_name(entry)
+
+
+class ResultsDB:
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS finished_sessions (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                error TEXT,
+                summary TEXT,
+                images INTEGER NOT NULL,
+                finished_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS finished_sessions_at ON finished_sessions (finished_at);
+            CREATE TABLE IF NOT EXISTS session_predictions (
+                session_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                content_hash TEXT,
+                species TEXT,
+                animal TEXT,
+                confidence REAL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (session_id, position)
+            );
+            CREATE INDEX IF NOT EXISTS session_predictions_hash ON session_predictions (content_hash);
+            CREATE INDEX IF NOT EXISTS session_predictions_species ON session_predictions (species);
+            """
+        )
+        self._conn.commit()
+
+    def save_session(self, session_id, output, finished_at=None):
+        """Store a finished session in the shape run_detection_model produces."""
+        predictions = output.get("predictions", [])
+        rows = []
+        for position, prediction in enumerate(predictions):
+            species, animal = species_of(prediction)
+            rows.append((
+                session_id,
+                position,
+                os.path.basename(prediction.get("filepath", "")),
+                prediction.get("content_hash"),
+                species,
+                animal,
+                prediction.get("prediction_score"),
+                json.dumps(prediction),
+            ))
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM session_predictions WHERE session_id = ?", (session_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO finished_sessions (id, status, error, summary, images, finished_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    session_id,
+                    "error" if "error" in output else "complete",
+                    output.get("error"),
+                    json.dumps(output["summary"]) if output.get("summary") else None,
+                    len(predictions),
+                    finished_at or time.time(),
+                ),
+            )
+            self._conn.executemany("INSERT INTO session_predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def get_session(self, session_id):
+        """The session's {"predictions", "summary"?, "error"?} dict, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute("SELECT error, summary FROM finished_sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            payloads = self._conn.execute(
+                "SELECT payload FROM session_predictions WHERE session_id = ? ORDER BY position", (session_id,)
+            ).fetchall()
+
+        output = {"predictions": [json.loads(payload) for payload, in payloads]}
+        error, summary = row
+        if error is not None:
+            output["error"] = error
+        if summary:
+            output["summary"] = json.loads(summary)
+        return output
+
+    def search(self, species=None, content_hash=None, limit=100):
+        """Most recent predictions for a taxonomy UUID and/or content hash, newest first."""
+        clauses, params = [], []
+        if species:
+            clauses.append("p.species = ?")
+            params.append(species)
+        if content_hash:
+            clauses.append("p.content_hash = ?")
+            params.append(content_hash)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.session_id, s.finished_at, p.payload FROM session_predictions p "
+                f"JOIN finished_sessions s ON s.id = p.session_id {where} "
+                "ORDER BY s.finished_at DESC, p.position LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [(session_id, finished_at, json.loads(payload)) for session_id, finished_at, payload in rows]
+
+    def collect_garbage(self, ttl_seconds, upload_dir=None):
+        """Delete sessions (and their uploads) finished over ttl_seconds ago; returns (sessions, upload dirs) removed."""
+        cutoff = time.time() - ttl_seconds
+        with self._lock, self._conn:
+            expired = [row[0] for row in self._conn.execute("SELECT id FROM finished_sessions WHERE finished_at < ?", (cutoff,))]
+            self._conn.executemany("DELETE FROM session_predictions WHERE session_id = ?", [(sid,) for sid in expired])
+            self._conn.executemany("DELETE FROM finished_sessions WHERE id = ?", [(sid,) for sid in expired])
+
+        removed_dirs = 0
+        if upload_dir is not None and Path(upload_dir).is_dir():
+            expired_ids = set(expired)
+            for session_dir in Path(upload_dir).iterdir():
+                if not session_dir.is_dir():
+                    continue
+                # Sessions still known here are kept; anything else is dropped once it is past the TTL
+                if session_dir.name in expired_ids or (
+                    session_dir.stat().st_mtime < cutoff and not self.has(session_dir.name)
+                ):
+                    shutil.rmtree(session_dir, ignore_errors=True)
+                    removed_dirs += 1
+        return expired, removed_dirs
+
+    def has(self, session_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM finished_sessions WHERE id = ?", (session_id,)).fetchone() is not None
+
+    def import_json_file(self, path):
+        """Import one legacy results/<session_id>.json; returns the number of predictions."""
+        path = Path(path)
+        with open(path, "r") as f:
+            output = json.load(f)
+        self.save_session(path.stem, output, finished_at=path.stat().st_mtime)
+        return len(output.get("predictions", []))
+
+    def stats(self):
+        with self._lock:
+            sessions, oldest = self._conn.execute("SELECT COUNT(*), MIN(finished_at) FROM finished_sessions").fetchone()
+            predictions = self._conn.execute("SELECT COUNT(*) FROM session_predictions").fetchone()[0]
+        return {
+            "sessions": sessions,
+            "predictions": predictions,
+            "oldest_age_hours": (time.time() - oldest) / 3600 if oldest else None,
+            "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
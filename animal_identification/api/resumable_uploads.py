@@ -0,0 +1,279 @@
+"""
+Resumable, chunked uploads
+
+/detect-animals takes every image in one multipart POST, so a mobile client
+that loses its connection part way has to send every byte again. Here an
+upload is created first with the name and size of each file, then each file
+is sent in any number of PATCH requests carrying the offset they start at:
+
+- the committed offset of a file is the size of its part file on disk, so
+  bytes written before a dropped connection count, and state survives
+  restarts and is shared by every API replica that sees the same directory
+- a chunk is written under an exclusive flock on its part file and checked
+  against the committed offset under that lock; a chunk whose Upload-Offset
+  is not the committed offset, or that arrives while another process is
+  still writing the file, is refused with 409, and the client asks for the
+  current offset (HEAD) and carries on
+- image type and size limits are checked as the bytes arrive, as in ingest.py
+- once every file is complete the files are moved into a session directory
+  and detection is queued, under the upload's ID as the session ID; the
+  session directory is written to the manifest before anything moves, so a
+  commit that fails part way still reports every file and can be retried
+
+Each upload lives in <root>/<upload_id>/ with a manifest.json, one part file
+per image and a lock file that whoever starts detection holds (lock()), so
+two replicas never commit the same upload. Uploads nobody has touched for
+ttl_seconds are removed by collect_garbage().
+
+The locks are flock()s, which hold across processes on the same host and on
+shared filesystems that support them. Without fcntl (Windows) they fall back
+to a per-process set, so there only a single API process can be trusted.
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from ingest import SNIFF_BYTES, UploadRejected, safe_filename, sniff_image_type
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MANIFEST = "manifest.json"
+LOCK_FILE = "start.lock"
+PART_SUFFIX = ".part"
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+class ResumableUploads:
+    def __init__(self, root, max_file_bytes, max_request_bytes, ttl_seconds=24 * 3600, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_file_bytes = max_file_bytes
+        self.max_request_bytes = max_request_bytes
+        self.ttl_seconds = ttl_seconds
+        self.chunk_size = chunk_size
+        # Paths locked by this process; only consulted when fcntl is missing
+        self._held = set()
+
+    def create(self, files, options=None):
+        """Start an upload of [{"name", "size"}]; returns its status."""
+        if not isinstance(files, list) or not files:
+            raise UploadRejected(400, "Pass a non-empty list of files")
+        entries = []
+        for item in files:
+            if not isinstance(item, dict) or not isinstance(item.get("size"), int) or item["size"] <= 0:
+                raise UploadRejected(400, "Each file needs a name and a positive integer size")
+            name = safe_filename(item.get("name"))
+            if item["size"] > self.max_file_bytes:
+                raise UploadRejected(413, f"{name} exceeds the per-file size limit")
+            entries.append({"name": name, "size": item["size"]})
+        if len({entry["name"] for entry in entries}) != len(entries):
+            raise UploadRejected(400, "File names must be unique within an upload")
+        if sum(entry["size"] for entry in entries) > self.max_request_bytes:
+            raise UploadRejected(413, "Upload exceeds the per-request size limit")
+
+        upload_id = str(uuid.uuid4())
+        upload_dir = self.root / upload_id
+        upload_dir.mkdir()
+        manifest = {"upload_id": upload_id, "created_at": time.time(), "files": entries, "options": options or {}, "detection": None}
+        self._write_manifest(upload_id, manifest)
+        for entry in entries:
+            (upload_dir / (entry["name"] + PART_SUFFIX)).touch()
+        return self.status(upload_id)
+
+    def manifest(self, upload_id):
+        """The upload's manifest, or raise UploadRejected(404)."""
+        try:
+            uuid.UUID(upload_id)
+            with open(self.root / upload_id / MANIFEST, "r") as f:
+                return json.load(f)
+        except (ValueError, OSError):
+            raise UploadRejected(404, "Unknown upload")
+
+    def status(self, upload_id):
+        manifest = self.manifest(upload_id)
+        files = [dict(entry, offset=self._offset(manifest, entry["name"])) for entry in manifest["files"]]
+        return {
+            "upload_id": upload_id,
+            "files": files,
+            "complete": all(entry["offset"] == entry["size"] for entry in files),
+            "chunk_size": self.chunk_size,
+            "detection": manifest["detection"],
+        }
+
+    def file_offset(self, upload_id, filename):
+        """(committed offset, declared size) of one file."""
+        manifest = self.manifest(upload_id)
+        entry = self._entry(manifest, filename)
+        return self._offset(manifest, entry["name"]), entry["size"]
+
+    async def append(self, upload_id, filename, offset, stream):
+        """Write a chunk that starts at offset; returns the new committed offset."""
+        manifest = await run_in_threadpool(self.manifest, upload_id)
+        if manifest["detection"] is not None or manifest.get("session_dir"):
+            raise UploadRejected(409, "Upload has already been submitted for detection")
+        entry = self._entry(manifest, filename)
+        path = self.root / upload_id / (entry["name"] + PART_SUFFIX)
+        try:
+            # Never recreates a part file a commit has already moved away
+            out = await run_in_threadpool(self._lock, path, f"Another chunk of {entry['name']} is still being written", False)
+        except FileNotFoundError:
+            raise UploadRejected(409, "Upload has already been submitted for detection")
+        try:
+            # A commit may have started while we waited for the lock
+            manifest = await run_in_threadpool(self.manifest, upload_id)
+            if manifest["detection"] is not None or manifest.get("session_dir"):
+                raise UploadRejected(409, "Upload has already been submitted for detection")
+            # The offset is read under the lock, so no other writer can move it before we append
+            committed = (await run_in_threadpool(os.fstat, out.fileno())).st_size
+            if offset != committed:
+                raise UploadRejected(409, f"Upload-Offset {offset} does not match the committed offset {committed}")
+
+            position = committed
+            try:
+                async for chunk in stream:
+                    if not chunk:
+                        continue
+                    if position + len(chunk) > entry["size"]:
+                        raise UploadRejected(400, f"Chunk runs past the declared size of {entry['name']}")
+                    await run_in_threadpool(out.write, chunk)
+                    position += len(chunk)
+            except ClientDisconnect:
+                # Whatever arrived is committed; the client resumes from there
+                pass
+            await run_in_threadpool(out.flush)
+
+            if committed < SNIFF_BYTES <= position or (position == entry["size"] and committed < SNIFF_BYTES):
+                await run_in_threadpool(self._check_type, out, path, entry["name"])
+            return position
+        finally:
+            await run_in_threadpool(self.unlock, out)
+
+    def lock(self, upload_id):
+        """Claim an upload for starting detection; returns a handle for unlock(), or raise 409 if it is taken."""
+        self.manifest(upload_id)
+        return self._lock(self.root / upload_id / LOCK_FILE, "Upload is already being submitted")
+
+    def unlock(self, handle):
+        if fcntl is None:
+            self._held.discard(handle.name)
+        handle.close()
+
+    def commit(self, upload_id, session_dir):
+        """
+        Move every finished file into session_dir; returns their paths, or
+        raise 409 if any is incomplete. The caller holds the upload's lock().
+        Calling it again after a failure picks up where the last call stopped.
+        """
+        status = self.status(upload_id)
+        if not status["complete"]:
+            raise UploadRejected(409, "Not every file has been uploaded yet")
+        session_dir = Path(session_dir)
+        manifest = self.manifest(upload_id)
+        if manifest.get("session_dir") != str(session_dir):
+            # Recorded first, so status() can find files that have already moved
+            manifest["session_dir"] = str(session_dir)
+            self._write_manifest(upload_id, manifest)
+        session_dir.mkdir(parents=True, exist_ok=True)
+        saved = []
+        for entry in status["files"]:
+            part = self.root / upload_id / (entry["name"] + PART_SUFFIX)
+            dest = session_dir / entry["name"]
+            if not dest.exists():
+                # Under the part's lock, so a chunk still being written is never moved mid-write
+                handle = self._lock(part, f"A chunk of {entry['name']} is still being written", False)
+                try:
+                    shutil.move(str(part), dest)
+                finally:
+                    self.unlock(handle)
+            saved.append(str(dest))
+        return saved
+
+    def mark_started(self, upload_id, detection):
+        """Record the detection session so repeated start requests get the same answer."""
+        manifest = self.manifest(upload_id)
+        manifest["detection"] = detection
+        self._write_manifest(upload_id, manifest)
+
+    def abort(self, upload_id):
+        self.manifest(upload_id)
+        shutil.rmtree(self.root / upload_id, ignore_errors=True)
+
+    def collect_garbage(self):
+        """Remove uploads with no writes for ttl_seconds; returns how many were removed."""
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for upload_dir in self.root.iterdir():
+            if not upload_dir.is_dir():
+                continue
+            try:
+                last_write = max(path.stat().st_mtime for path in upload_dir.iterdir())
+            except (ValueError, OSError):
+                last_write = upload_dir.stat().st_mtime
+            if last_write < cutoff:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def _entry(self, manifest, filename):
+        for entry in manifest["files"]:
+            if entry["name"] == filename:
+                return entry
+        raise UploadRejected(404, f"{filename} is not part of this upload")
+
+    def _offset(self, manifest, name):
+        if manifest.get("session_dir"):
+            # Once a commit has begun, a file it moved counts before anything left under the upload
+            try:
+                return os.path.getsize(Path(manifest["session_dir"]) / name)
+            except OSError:
+                pass
+        try:
+            return os.path.getsize(self.root / manifest["upload_id"] / (name + PART_SUFFIX))
+        except OSError:
+            return 0
+
+    def _lock(self, path, busy, create=True):
+        """
+        Open path for appending under an exclusive lock, or raise
+        UploadRejected(409, busy). With create=False a missing file raises
+        FileNotFoundError instead of being created.
+        """
+        flags = os.O_WRONLY | os.O_APPEND | (os.O_CREAT if create else 0)
+        f = open(str(path), "ab", opener=lambda name, _: os.open(name, flags, 0o666))
+        if fcntl is None:
+            if f.name in self._held:
+                f.close()
+                raise UploadRejected(409, busy)
+            self._held.add(f.name)
+            return f
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            raise UploadRejected(409, busy)
+        return f
+
+    def _check_type(self, out, path, name):
+        with open(path, "rb") as f:
+            header = f.read(SNIFF_BYTES)
+        if sniff_image_type(header) is None:
+            # Start the file over rather than keep bytes that can never become an image
+            out.truncate(0)
+            raise UploadRejected(415, f"{name} is not a supported image")
+
+    def _write_manifest(self, upload_id, manifest):
+        path = self.root / upload_id / MANIFEST
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, path)
@@ -0,0 +1,211 @@
+"""
+Incrementally maintained sighting aggregates
+
+Every batch of newly indexed sightings is folded into a few small summaries, so
+dashboards and the map never scan raw sightings:
+
+- per species per UTC day: count, coordinate sums (for the centroid) and the
+  lat/lng extent, which together give centroid drift and range over time
+- heatmap tiles: web-mercator tiles at a handful of zoom levels, each split
+  into bins x bins cells with per-day counts, for all species and per species
+
+Only the species-days and tiles a batch touches are updated, and each tile
+keeps a version number that the API uses as its ETag.
+"""
+
+import math
+import threading
+
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def tile_position(lat, lng, zoom):
+    """Fractional web-mercator (x, y) tile coordinates of a point at a zoom level."""
+    n = 1 << zoom
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    x = (lng + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return min(x, n - 1e-9), min(max(y, 0.0), n - 1e-9)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+class SightingAggregates:
+    def __init__(self, zooms=(3, 6, 9, 12), bins=32):
+        self.zooms = tuple(sorted(zooms))
+        self.bins = bins
+        self._lock = threading.Lock()
+        # species -> day -> [count, sum_lat, sum_lng, min_lat, max_lat, min_lng, max_lng]
+        self._daily = {}
+        # zoom -> (x, y) -> species (None for all) -> day -> {bin: count}
+        self._tiles = {zoom: {} for zoom in self.zooms}
+        self._tile_versions = {}
+
+    def add(self, sightings):
+        """Fold in (id, species, ts, lat, lng, user_id) tuples; the SightingIndex listener."""
+        with self._lock:
+            for _, species, ts, lat, lng, _ in sightings:
+                day = int(ts // 86400)
+                stats = self._daily.setdefault(species, {}).get(day)
+                if stats is None:
+                    self._daily[species][day] = [1, lat, lng, lat, lat, lng, lng]
+                else:
+                    stats[0] += 1
+                    stats[1] += lat
+                    stats[2] += lng
+                    stats[3] = min(stats[3], lat)
+                    stats[4] = max(stats[4], lat)
+                    stats[5] = min(stats[5], lng)
+                    stats[6] = max(stats[6], lng)
+
+                for zoom in self.zooms:
+                    fx, fy = tile_position(lat, lng, zoom)
+                    key = (int(fx), int(fy))
+                    cell = int((fy % 1) * self.bins) * self.bins + int((fx % 1) * self.bins)
+                    tile = self._tiles[zoom].setdefault(key, {})
+                    for layer in (None, species):
+                        counts = tile.setdefault(layer, {}).setdefault(day, {})
+                        counts[cell] = counts.get(cell, 0) + 1
+                    version_key = (zoom,) + key
+                    self._tile_versions[version_key] = self._tile_versions.get(version_key, 0) + 1
+
+    def species(self):
+        """Every species seen, with total sightings and first/last day."""
+        with self._lock:
+            summary = []
+            for name, days in self._daily.items():
+                summary.append({
+                    "species": name,
+                    "count": sum(stats[0] for stats in days.values()),
+                    "first_day": min(days) * 86400,
+                    "last_day": max(days) * 86400,
+                })
+        summary.sort(key=lambda item: -item["count"])
+        return summary
+
+    def species_timeline(self, species, since=None, until=None):
+        """
+        Per-day count, centroid and extent for one species, plus how far the
+        centroid has drifted from the first day in the window. None if unknown.
+        """
+        with self._lock:
+            days = self._daily.get(species)
+            if days is None:
+                return None
+            lo = -math.inf if since is None else int(since // 86400)
+            hi = math.inf if until is None else int(until // 86400)
+            rows = [(day, list(stats)) for day, stats in days.items() if lo <= day <= hi]
+        rows.sort()
+
+        timeline = []
+        for day, (count, sum_lat, sum_lng, min_lat, max_lat, min_lng, max_lng) in rows:
+            timeline.append({
+                "day": day * 86400,
+                "count": count,
+                "centroid": [sum_lat / count, sum_lng / count],
+                "extent": [min_lat, min_lng, max_lat, max_lng],
+            })
+        if timeline:
+            start = timeline[0]["centroid"]
+            for point in timeline:
+                point["drift_km"] = haversine_km(*start, *point["centroid"])
+
+        return {
+            "species": species,
+            "count": sum(point["count"] for point in timeline),
+            "timeline": timeline,
+            "drift_km": timeline[-1]["drift_km"] if timeline else 0.0,
+        }
+
+    def _source_zoom(self, zoom):
+        """The built zoom a requested zoom is served from: the nearest coarser one, else the coarsest."""
+        return max((z for z in self.zooms if z <= zoom), default=self.zooms[0])
+
+    def tile_version(self, zoom, x, y):
+        """Changes whenever a sighting lands in the data behind this tile."""
+        source_zoom = self._source_zoom(zoom)
+        with self._lock:
+            if source_zoom <= zoom:
+                shift = zoom - source_zoom
+                return self._tile_versions.get((source_zoom, x >> shift, y >> shift), 0)
+            scale = 1 << (source_zoom - zoom)
+            return sum(
+                self._tile_versions.get((source_zoom, tx, ty), 0)
+                for tx in range(x * scale, (x + 1) * scale)
+                for ty in range(y * scale, (y + 1) * scale)
+            )
+
+    def heatmap_tile(self, zoom, x, y, species=None, since=None, until=None):
+        """
+        Bin counts of one tile summed over the days in the window, as sparse
+        [row, col, count] triples. Zooms without pre-built tiles are served
+        from the nearest coarser zoom that has them; there every bin carries
+        the count of the coarser bin covering it, so density looks the same at
+        every zoom and total is the sum of those sampled bins.
+        """
+        source_zoom = self._source_zoom(zoom)
+        lo = -math.inf if since is None else int(since // 86400)
+        hi = math.inf if until is None else int(until // 86400)
+
+        totals = {}
+        with self._lock:
+            if source_zoom <= zoom:
+                # A coarser tile covering this one; pick out the bins inside it
+                shift = zoom - source_zoom
+                per_day = self._tiles[source_zoom].get((x >> shift, y >> shift), {}).get(species, {})
+                scale = 1 << shift
+                per_cell = {}
+                for day, counts in per_day.items():
+                    if lo <= day <= hi:
+                        for cell, count in counts.items():
+                            per_cell[cell] = per_cell.get(cell, 0) + count
+                # Each source bin covers a scale x scale block of this zoom's bins, counted
+                # from the source tile's corner; fill the part of that block inside this tile
+                top, left = (y % scale) * self.bins, (x % scale) * self.bins
+                for cell, count in per_cell.items():
+                    row, col = divmod(cell, self.bins)
+                    rows = range(max(0, row * scale - top), min(self.bins, (row + 1) * scale - top))
+                    cols = range(max(0, col * scale - left), min(self.bins, (col + 1) * scale - left))
+                    for target_row in rows:
+                        for target_col in cols:
+                            totals[(target_row, target_col)] = count
+            else:
+                # Requested zoom is coarser than anything built: merge the finer tiles
+                shift = source_zoom - zoom
+                scale = 1 << shift
+                children = ((tx, ty) for tx in range(x * scale, (x + 1) * scale) for ty in range(y * scale, (y + 1) * scale))
+                for tx, ty in children:
+                    tile = self._tiles[source_zoom].get((tx, ty))
+                    if tile is None:
+                        continue
+                    for day, counts in tile.get(species, {}).items():
+                        if lo <= day <= hi:
+                            for cell, count in counts.items():
+                                row, col = divmod(cell, self.bins)
+                                target = (int(((ty % scale) * self.bins + row) / scale),
+                                          int(((tx % scale) * self.bins + col) / scale))
+                                totals[target] = totals.get(target, 0) + count
+
+        return {
+            "zoom": zoom,
+            "x": x,
+            "y": y,
+            "bins": self.bins,
+            "source_zoom": source_zoom,
+            "total": sum(totals.values()),
+            "counts": [[row, col, count] for (row, col), count in sorted(totals.items())],
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "species": len(self._daily),
+                "species_days": sum(len(days) for days in self._daily.values()),
+                "tiles": sum(len(tiles) for tiles in self._tiles.values()),
+                "zooms": list(self.zooms),
+                "bins": self.bins,
+            }
@@ -0,0 +1,364 @@
+"""
+Spatio-temporal index of animal sightings
+
+Sightings are bucketed by UTC day and by a fixed lat/lng grid cell. A
+bounding-box / time-window query only visits the (day, cell) buckets that
+overlap it, so its cost depends on the size of the viewport and the page, not
+on how many sightings exist. Every bucket also keeps per-species counts and
+coordinate sums, which is all the zoomed-out cluster view needs, so that mode
+never touches individual sightings.
+
+Columns are held in memory in flat arrays. The index can be backed by a SQLite
+file so it survives restarts.
+"""
+
+import base64
+import bisect
+import datetime
+import math
+import sqlite3
+import threading
+from array import array
+
+
+class InvalidSighting(ValueError):
+    pass
+
+
+def parse_timestamp(value):
+    """Epoch seconds from epoch seconds/milliseconds or an ISO 8601 string (naive means UTC)."""
+    if isinstance(value, (int, float)):
+        return value / 1000.0 if value > 1e11 else float(value)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise InvalidSighting(f"Unrecognised timestamp {value!r}")
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+    raise InvalidSighting(f"Unrecognised timestamp {value!r}")
+
+
+def format_timestamp(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def parse_sighting(record):
+    """Pull (id, species, ts, lat, lng, user_id) out of a photo document as the app stores it."""
+    try:
+        sighting_id = str(record["id"])
+        species = str(record["animalClassification"])
+        ts = parse_timestamp(record["timestamp"])
+        if "location" in record:
+            lat, lng = (float(v) for v in record["location"][:2])
+        else:
+            lat, lng = float(record["latitude"]), float(record["longitude"])
+    except InvalidSighting:
+        raise
+    except KeyError as e:
+        raise InvalidSighting(f"Sighting is missing {e}")
+    except (TypeError, ValueError) as e:
+        raise InvalidSighting(f"Bad sighting: {e}")
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise InvalidSighting(f"Location {lat}, {lng} is out of range")
+    return sighting_id, species, ts, lat, lng, record.get("userId")
+
+
+def encode_cursor(day, cell, offset):
+    return base64.urlsafe_b64encode(f"{day}.{cell}.{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        day, cell, offset = (int(part) for part in base64.urlsafe_b64decode(padded).decode().split("."))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return day, cell, offset
+
+
+class SightingIndex:
+    def __init__(self, path=None, cell_degrees=0.1):
+        self.cell_degrees = cell_degrees
+        self.rows_per_lat = math.ceil(180 / cell_degrees)
+        self.cols = math.ceil(360 / cell_degrees)
+        self._lock = threading.RLock()
+
+        # Columns, one entry per sighting
+        self._ids = []
+        self._species = array("i")
+        self._ts = array("d")
+        self._lat = array("d")
+        self._lng = array("d")
+        self._users = []
+        self._row_of = {}
+
+        self._species_names = []
+        self._species_codes = {}
+
+        # day -> cell -> array of row numbers, plus sorted key lists for range scans
+        self._buckets = {}
+        self._days = []
+        self._day_cells = {}
+        # (day, cell) -> species code -> [count, sum_lat, sum_lng]
+        self._stats = {}
+        self._listeners = []
+
+        self.path = str(path) if path else None
+        self._conn = None
+        if self.path:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sightings (
+                    id TEXT PRIMARY KEY,
+                    species TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    lat REAL NOT NULL,
+                    lng REAL NOT NULL,
+                    user_id TEXT
+                )
+                """
+            )
+
+    def load(self, batch_size=50_000):
+        """Rebuild the in-memory index from the SQLite file; returns the number of sightings."""
+        if self._conn is None:
+            return 0
+        cursor = self._conn.execute("SELECT id, species, ts, lat, lng, user_id FROM sightings")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            with self._lock:
+                added = [row for row in rows if row[0] not in self._row_of]
+                for row in added:
+                    self._add(*row)
+            self._notify(added)
+        return len(self)
+
+    def add_listener(self, callback):
+        """Call callback(sightings) with each batch of newly added (id, species, ts, lat, lng, user_id) tuples."""
+        self._listeners.append(callback)
+
+    def _notify(self, added):
+        if added:
+            for callback in self._listeners:
+                callback(added)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def cell_of(self, lat, lng):
+        row = min(int((lat + 90) / self.cell_degrees), self.rows_per_lat - 1)
+        col = min(int((lng + 180) / self.cell_degrees), self.cols - 1)
+        return row * self.cols + col
+
+    def ingest(self, records):
+        """Add photo documents; returns (added, duplicates). Raises InvalidSighting on a bad record."""
+        parsed = [parse_sighting(record) for record in records]
+        added = []
+        with self._lock:
+            for sighting in parsed:
+                if sighting[0] in self._row_of:
+                    continue
+                self._add(*sighting)
+                added.append(sighting)
+            if self._conn is not None and added:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO sightings (id, species, ts, lat, lng, user_id) VALUES (?, ?, ?, ?, ?, ?)",
+                        added,
+                    )
+        self._notify(added)
+        return len(added), len(parsed) - len(added)
+
+    def _add(self, sighting_id, species, ts, lat, lng, user_id):
+        code = self._species_codes.get(species)
+        if code is None:
+            code = self._species_codes[species] = len(self._species_names)
+            self._species_names.append(species)
+
+        row = len(self._ids)
+        self._ids.append(sighting_id)
+        self._species.append(code)
+        self._ts.append(ts)
+        self._lat.append(lat)
+        self._lng.append(lng)
+        self._users.append(user_id)
+        self._row_of[sighting_id] = row
+
+        day = int(ts // 86400)
+        cell = self.cell_of(lat, lng)
+        cells = self._buckets.get(day)
+        if cells is None:
+            cells = self._buckets[day] = {}
+            self._day_cells[day] = []
+            bisect.insort(self._days, day)
+        bucket = cells.get(cell)
+        if bucket is None:
+            bucket = cells[cell] = array("I")
+            bisect.insort(self._day_cells[day], cell)
+        bucket.append(row)
+
+        stats = self._stats.setdefault((day, cell), {}).setdefault(code, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += lat
+        stats[2] += lng
+
+    def _cell_ranges(self, min_lat, min_lng, max_lat, max_lng):
+        """(row_lo, row_hi, col_lo, col_hi) grid ranges covering the box, split at the antimeridian."""
+        rows = (self.cell_of(min_lat, 0) // self.cols, self.cell_of(max_lat, 0) // self.cols)
+        if min_lng <= max_lng:
+            spans = [(min_lng, max_lng)]
+        else:
+            spans = [(min_lng, 180.0), (-180.0, max_lng)]
+        return [
+            (rows[0], rows[1], self.cell_of(0, lo) % self.cols, self.cell_of(0, hi) % self.cols)
+            for lo, hi in spans
+        ]
+
+    def _cells(self, day, ranges):
+        """Occupied cells of one day inside the grid ranges, in ascending cell order."""
+        occupied = self._day_cells[day]
+        wanted = sum((r1 - r0 + 1) * (c1 - c0 + 1) for r0, r1, c0, c1 in ranges)
+        if wanted < len(occupied):
+            cells = self._buckets[day]
+            found = []
+            for r0, r1, c0, c1 in ranges:
+                for row in range(r0, r1 + 1):
+                    base = row * self.cols
+                    found.extend(cell for cell in range(base + c0, base + c1 + 1) if cell in cells)
+            return sorted(found)
+        return [
+            cell for cell in occupied
+            if any(r0 <= cell // self.cols <= r1 and c0 <= cell % self.cols <= c1 for r0, r1, c0, c1 in ranges)
+        ]
+
+    def _days_between(self, since, until):
+        """Days with data in [since, until], most recent first."""
+        lo = bisect.bisect_left(self._days, int(since // 86400))
+        hi = bisect.bisect_right(self._days, int(until // 86400))
+        return self._days[lo:hi][::-1]
+
+    def _in_box(self, row, min_lat, min_lng, max_lat, max_lng):
+        lat, lng = self._lat[row], self._lng[row]
+        if not min_lat <= lat <= max_lat:
+            return False
+        if min_lng <= max_lng:
+            return min_lng <= lng <= max_lng
+        return lng >= min_lng or lng <= max_lng
+
+    def _species_filter(self, species):
+        if not species:
+            return None
+        return {self._species_codes[name] for name in species if name in self._species_codes}
+
+    def query(self, min_lat, min_lng, max_lat, max_lng, since, until, species=None, limit=500, cursor=None):
+        """
+        Sightings in the box and time window, newest day first, one page at a time.
+
+        Returns (sightings, next_cursor); next_cursor is None on the last page.
+        Pages stay stable while new sightings arrive because buckets are append-only.
+        """
+        wanted_species = self._species_filter(species)
+        if wanted_species is not None and not wanted_species:
+            return [], None
+        start = decode_cursor(cursor) if cursor else None
+
+        with self._lock:
+            ranges = self._cell_ranges(min_lat, min_lng, max_lat, max_lng)
+            results = []
+            for day in self._days_between(since, until):
+                if start and day > start[0]:
+                    continue
+                day_inside = since <= day * 86400 and (day + 1) * 86400 <= until
+                for cell in self._cells(day, ranges):
+                    offset = 0
+                    if start and day == start[0]:
+                        if cell < start[1]:
+                            continue
+                        if cell == start[1]:
+                            offset = start[2]
+
+                    bucket = self._buckets[day][cell]
+                    for position in range(offset, len(bucket)):
+                        row = bucket[position]
+                        if wanted_species is not None and self._species[row] not in wanted_species:
+                            continue
+                        if not day_inside and not since <= self._ts[row] <= until:
+                            continue
+                        if not self._in_box(row, min_lat, min_lng, max_lat, max_lng):
+                            continue
+                        if len(results) == limit:
+                            return results, encode_cursor(day, cell, position)
+                        results.append(self._sighting(row))
+            return results, None
+
+    def clusters(self, min_lat, min_lng, max_lat, max_lng, since, until, species=None, grid=64):
+        """
+        Decimated view for zoomed-out maps: counts and centroids on a grid x grid
+        layout over the box, built from per-bucket totals only.
+
+        Buckets are whole days and whole grid cells, so counts at the edges of the
+        box and time window are approximate.
+        """
+        wanted_species = self._species_filter(species)
+        if wanted_species is not None and not wanted_species:
+            return []
+        lng_span = (max_lng - min_lng) % 360 or 360
+        lat_step = max((max_lat - min_lat) / grid, self.cell_degrees)
+        lng_step = max(lng_span / grid, self.cell_degrees)
+
+        merged = {}
+        with self._lock:
+            ranges = self._cell_ranges(min_lat, min_lng, max_lat, max_lng)
+            for day in self._days_between(since, until):
+                for cell in self._cells(day, ranges):
+                    for code, (count, sum_lat, sum_lng) in self._stats[(day, cell)].items():
+                        if wanted_species is not None and code not in wanted_species:
+                            continue
+                        lat, lng = sum_lat / count, sum_lng / count
+                        key = (int((lat - min_lat) // lat_step), int(((lng - min_lng) % 360) // lng_step))
+                        cluster = merged.setdefault(key, [0, 0.0, 0.0, {}])
+                        cluster[0] += count
+                        cluster[1] += sum_lat
+                        cluster[2] += sum_lng
+                        cluster[3][code] = cluster[3].get(code, 0) + count
+
+            return [
+                {
+                    "lat": sum_lat / count,
+                    "lng": sum_lng / count,
+                    "count": count,
+                    "species": {self._species_names[code]: n for code, n in by_species.items()},
+                }
+                for count, sum_lat, sum_lng, by_species in merged.values()
+            ]
+
+    def _sighting(self, row):
+        return {
+            "id": self._ids[row],
+            "animalClassification": self._species_names[self._species[row]],
+            "timestamp": format_timestamp(self._ts[row]),
+            "location": [self._lat[row], self._lng[row]],
+            "userId": self._users[row],
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sightings": len(self._ids),
+                "species": len(self._species_names),
+                "days": len(self._days),
+                "buckets": len(self._stats),
+                "cell_degrees": self.cell_degrees,
+                "persistent": self.path is not None,
+            }
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
@@ -0,0 +1,279 @@
+"""
+Metrics, per-session trace spans and structured logging
+
+- Counter/Gauge/Histogram live in a Registry that renders the Prometheus text
+  format for /metrics. No client library is needed; collectors registered with
+  add_collector() turn the existing stats() dicts into gauges at scrape time,
+  so nothing is polled between scrapes.
+- Tracer.span() times one pipeline stage of a session (upload, queue,
+  preprocess, cache, dedupe, inference, format, persist) into the
+  detection_stage_seconds histogram, keeps the spans of recent sessions for
+  /detection-trace/<session_id> and logs each one at DEBUG.
+- configure_logging() sets up leveled logging as JSON lines or plain text.
+  Pass fields with log_fields(); disabled levels return before a record or
+  any field dict is built.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+log = logging.getLogger("telemetry")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+def configure_logging(level="INFO", fmt="json"):
+    """Send every logger to stderr at the given level, as JSON lines or text."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+def log_fields(logger, level, message, **fields):
+    """Log message with structured fields, if level is enabled for logger."""
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"fields": fields})
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_value(bound if bound == math.inf else float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """collect() returns [(name, help, {labels tuple: value} or value)], read at every scrape."""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for collect in self._collectors:
+            try:
+                collected = collect()
+            except Exception as e:
+                log.warning("Metrics collector %s failed: %r", getattr(collect, "__name__", collect), e)
+                continue
+            for name, help_text, samples in collected:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+                if not isinstance(samples, dict):
+                    samples = {(): samples}
+                for labels, value in samples.items():
+                    lines.append(f"{name}{_format_labels([label for label, _ in labels], [str(v) for _, v in labels])} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+class Tracer:
+    """Times pipeline stages per session and remembers the spans of the last max_sessions sessions."""
+
+    def __init__(self, registry, max_sessions=500):
+        self.max_sessions = max_sessions
+        self.stage_seconds = registry.histogram(
+            "detection_stage_seconds", "Time spent in each stage of the detection pipeline", ["stage"]
+        )
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+        self._log = logging.getLogger("trace")
+
+    @contextmanager
+    def span(self, stage, session_id=None, images=None, **fields):
+        """Time the with-block as one stage; the yielded dict takes extra fields."""
+        started_at = time.time()
+        started = time.perf_counter()
+        error = None
+        try:
+            yield fields
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            if error:
+                fields["error"] = error
+            self.record(stage, time.perf_counter() - started, session_id, images, started_at, **fields)
+
+    def record(self, stage, seconds, session_id=None, images=None, started_at=None, **fields):
+        """Add a span timed elsewhere, e.g. queue wait measured from the enqueue time."""
+        self.stage_seconds.observe(seconds, stage=stage)
+        span = {
+            "stage": stage,
+            "session_id": session_id,
+            "images": images,
+            "started_at": started_at if started_at is not None else time.time() - seconds,
+            "duration_ms": round(seconds * 1000, 3),
+            **fields,
+        }
+        if session_id is not None:
+            with self._lock:
+                self._traces.setdefault(session_id, []).append(span)
+                self._traces.move_to_end(session_id)
+                while len(self._traces) > self.max_sessions:
+                    self._traces.popitem(last=False)
+        log_fields(self._log, logging.DEBUG, "span", **span)
+
+    def trace(self, session_id):
+        """Spans recorded in this process for a session, in start order, or None."""
+        with self._lock:
+            spans = self._traces.get(session_id)
+            return sorted(spans, key=lambda span: span["started_at"]) if spans is not None else None
+
+
+def serve_metrics(registry, port, host="0.0.0.0"):
+    """Expose registry on http://host:port/metrics from a daemon thread, for processes without an API."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
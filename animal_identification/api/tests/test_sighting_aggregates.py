@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+from sighting_aggregates import SightingAggregates, tile_position
+
+POINT = (51.3811, -2.3590)
+
+
+def tile_of(zoom):
+    fx, fy = tile_position(*POINT, zoom)
+    return int(fx), int(fy)
+
+
+@pytest.fixture
+def aggregates():
+    aggregates = SightingAggregates(zooms=(3, 6, 9, 12), bins=32)
+    aggregates.add([(1, "fox", 0, *POINT, None), (2, "fox", 86400, *POINT, None)])
+    return aggregates
+
+
+# 32 bins is 2**5, so zoom 17 is the last that splits a zoom 12 bin; 18 and up sample it
+@pytest.mark.parametrize("zoom, filled", [(12, 1), (15, 8 * 8), (16, 16 * 16), (17, 32 * 32), (18, 32 * 32), (19, 32 * 32), (22, 32 * 32)])
+def test_upscaled_bin_fills_its_area(aggregates, zoom, filled):
+    tile = aggregates.heatmap_tile(zoom, *tile_of(zoom))
+    assert tile["source_zoom"] == 12
+    assert len(tile["counts"]) == filled
+    assert {count for _, _, count in tile["counts"]} == {2}
+    assert tile["total"] == sum(count for _, _, count in tile["counts"])
+
+
+@pytest.mark.parametrize("zoom", [16, 17, 18])
+def test_point_lies_in_the_filled_area(aggregates, zoom):
+    fx, fy = tile_position(*POINT, zoom)
+    tile = aggregates.heatmap_tile(zoom, int(fx), int(fy))
+    cells = {(row, col): count for row, col, count in tile["counts"]}
+    assert cells[(int((fy % 1) * 32), int((fx % 1) * 32))] == 2
+
+
+def test_neighbouring_tile_past_boundary_is_empty(aggregates):
+    x, y = tile_of(19)
+    # Eight tiles over at zoom 19 is two source bins away at zoom 12 once scaled
+    tile = aggregates.heatmap_tile(19, x + 8, y)
+    assert tile["total"] == 0
+    assert tile["counts"] == []
+
+
+def test_upscaled_tile_respects_day_window(aggregates):
+    tile = aggregates.heatmap_tile(18, *tile_of(18), since=86400)
+    assert {count for _, _, count in tile["counts"]} == {1}
@@ -0,0 +1,147 @@
+"""
+Inference worker for split API/worker deployments
+
+    SERVICE_ROLE=api uvicorn main:app --workers 4     # any number of API replicas
+    python worker.py --jobs 2                          # any number of workers
+
+API replicas only ingest uploads and queue jobs in the shared job store
+(JOB_STORE_PATH). Each worker holds its own warm model pool, claims jobs under
+a lease, heartbeats while they run and writes per-image results to the shared
+result store, where any API replica can serve them. A worker that dies stops
+heartbeating; once its leases expire the jobs are redelivered to another
+worker. Workers read the same environment settings as the API, and
+uploaded_images/ and RESULTS_DB_PATH must be on storage both sides can reach.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+from telemetry import serve_metrics
+
+log = logging.getLogger(__name__)
+
+
+class Worker:
+    """Runs jobs from the shared store through the pipeline of an imported main module."""
+
+    def __init__(self, api, jobs=2, poll_interval=1.0, prune_after=7 * 24 * 3600):
+        self.api = api
+        self.jobs = max(1, jobs)
+        self.poll_interval = poll_interval
+        self.prune_after = prune_after
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.store = api.job_queue
+        self._active = set()
+        self._active_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def run(self):
+        if self.api.preprocessor:
+            self.api.preprocessor.start()
+        if self.api.inference_pool:
+            self.api.inference_pool.start()
+            self.api.batcher.start()
+
+        self.store.heartbeat(self.worker_id)
+        log.info("Worker %s polling %s with %d job slots", self.worker_id, self.api.JOB_STORE_PATH, self.jobs)
+
+        threads = [threading.Thread(target=self._heartbeats, name="heartbeat", daemon=True)]
+        threads += [threading.Thread(target=self._run_jobs, name=f"job-{index}") for index in range(self.jobs)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads[1:]:
+                thread.join()
+        finally:
+            self.store.unregister(self.worker_id)
+            if self.api.inference_pool:
+                self.api.batcher.stop()
+                self.api.inference_pool.stop()
+            if self.api.preprocessor:
+                self.api.preprocessor.stop()
+
+    def stop(self, *args):
+        """Finish the jobs in hand and exit; unclaimed jobs stay queued for other workers."""
+        log.info("Worker %s stopping after its current jobs", self.worker_id)
+        self._stopping.set()
+
+    def _run_jobs(self):
+        while not self._stopping.is_set():
+            for payload in self.store.give_up_exhausted():
+                self.api.result_store.fail(payload["session_id"], "Inference worker crashed repeatedly on this upload")
+
+            claimed = self.store.claim(self.worker_id)
+            if claimed is None:
+                self._stopping.wait(self.poll_interval)
+                continue
+
+            payload, attempt = claimed
+            job_id = payload["session_id"]
+            if attempt > 1:
+                log.warning("Redelivered job %s (attempt %d)", job_id, attempt)
+            with self._active_lock:
+                self._active.add(job_id)
+
+            error = None
+            try:
+                self.api.run_detection_job(payload)
+            except Exception as e:
+                error = repr(e)
+                log.error("Job %s failed: %s", job_id, error)
+                self.api.result_store.fail(job_id, error)
+            finally:
+                with self._active_lock:
+                    self._active.discard(job_id)
+            if not self.store.finish(job_id, self.worker_id, error):
+                log.warning("Lease on job %s was lost before it finished; another worker may have rerun it", job_id)
+
+    def _heartbeats(self):
+        interval = max(1.0, self.store.lease_seconds / 3)
+        last_prune = 0.0
+        last_descriptions = time.time()
+        while not self._stopping.wait(interval):
+            with self._active_lock:
+                active = set(self._active)
+            held = self.store.heartbeat(self.worker_id, active)
+            for job_id in active - held:
+                log.warning("Lost the lease on job %s", job_id)
+            if time.time() - last_prune > 3600:
+                self.store.prune(self.prune_after)
+                last_prune = time.time()
+            # Workers run no catalog refresh, so cached descriptions simply expire
+            if self.api.CATALOG_REFRESH_MINUTES > 0 and time.time() - last_descriptions > self.api.CATALOG_REFRESH_MINUTES * 60:
+                self.api.lookup_description.cache_clear()
+                last_descriptions = time.time()
+
+
+def main():
+    # main reads its role at import time; importing it here rather than at the
+    # top keeps spawned model and preprocessing processes from importing it too
+    os.environ["SERVICE_ROLE"] = "worker"
+    import main as api
+
+    parser = argparse.ArgumentParser(description="Run detection jobs from the shared job store")
+    parser.add_argument("--jobs", type=int, default=api.JOB_MAX_CONCURRENT,
+                        help="Jobs run at once by this worker (default: JOB_MAX_CONCURRENT)")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls when idle")
+    parser.add_argument("--metrics-port", type=int, default=int(os.environ.get("METRICS_PORT", "0")),
+                        help="Serve this worker's /metrics on this port (default: METRICS_PORT, 0 for off)")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        serve_metrics(api.metrics, args.metrics_port)
+        log.info("Serving metrics on port %d", args.metrics_port)
+
+    worker = Worker(api, args.jobs, args.poll_interval)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Async description fetcher for description_maker
+
+One aiohttp session with pooled keep-alive connections is shared by every
+lookup. Each host (DuckDuckGo, Wikipedia) gets its own concurrency limit and
+token-bucket rate limit, and 429/5xx responses are retried with exponential
+backoff. Lookups that still fail are handed back as a retry list instead of
+being written out as "Error: ..." descriptions.
+
+The base URLs are constructor arguments so the whole engine can be pointed at
+a local stub HTTP server.
+"""
+
+import asyncio
+import random
+import re
+import time
+from urllib.parse import quote, urlsplit
+
+import aiohttp
+
+DEFAULT_DDG_URL = "https://api.duckduckgo.com"
+DEFAULT_WIKI_URL = "https://en.wikipedia.org"
+
+USER_AGENT = "Bath-Hack-25 description_maker (+https://github.com/ImBit/Bath-Hack-25)"
+
+NO_DESCRIPTION = "No description found."
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def summarise(text, max_sentences=3):
+    """First few sentences of a block of text, or None if there aren't any."""
+    sentences = [s.strip() for s in re.split(r'[.!?]+', text) if s.strip()]
+    if not sentences:
+        return None
+    return '. '.join(sentences[:max_sentences]) + '.'
+
+
+class TransientError(Exception):
+    """A lookup that failed for reasons worth retrying later (rate limits, 5xx, network)."""
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalise(self, seconds):
+        """Push the bucket into debt after a 429 so the whole host backs off."""
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class HostLimiter:
+    def __init__(self, concurrency, rate):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate)
+
+
+class DescriptionFetcher:
+    def __init__(
+        self,
+        ddg_url=DEFAULT_DDG_URL,
+        wiki_url=DEFAULT_WIKI_URL,
+        concurrency_per_host=4,
+        rate_per_host=5.0,
+        max_retries=4,
+        backoff_base=0.5,
+        backoff_max=30.0,
+        timeout=15.0,
+    ):
+        self.ddg_url = ddg_url.rstrip("/")
+        self.wiki_url = wiki_url.rstrip("/")
+        self.concurrency_per_host = concurrency_per_host
+        self.rate_per_host = rate_per_host
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._limiters = {}
+        self._session = None
+        self.requests = 0
+        self.retries = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit_per_host=self.concurrency_per_host,
+            keepalive_timeout=60,
+            ttl_dns_cache=300,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            headers={"User-Agent": USER_AGENT},
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    def _limiter(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._limiters:
+            self._limiters[host] = HostLimiter(self.concurrency_per_host, self.rate_per_host)
+        return self._limiters[host]
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return delay * (0.5 + random.random() / 2)
+
+    async def get_json(self, url, params=None):
+        """GET a JSON document; None for 404, TransientError once retries run out."""
+        limiter = self._limiter(url)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+            await limiter.bucket.acquire()
+            retry_after = None
+            try:
+                async with limiter.semaphore:
+                    self.requests += 1
+                    async with self._session.get(url, params=params) as response:
+                        if response.status == 200:
+                            return await response.json(content_type=None)
+                        if response.status == 404:
+                            return None
+                        if response.status not in RETRY_STATUSES:
+                            raise TransientError(f"HTTP {response.status} from {url}")
+                        last_error = TransientError(f"HTTP {response.status} from {url}")
+                        header = response.headers.get("Retry-After", "")
+                        if header.isdigit():
+                            retry_after = float(header)
+                        if response.status == 429:
+                            limiter.bucket.penalise(retry_after or self._backoff(attempt))
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                last_error = TransientError(f"{type(e).__name__} from {url}: {e}")
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+        raise last_error
+
+    async def describe(self, animal_name):
+        """Return (description, source); source is None when nothing was found."""
+        # Try DuckDuckGo API first (more friendly to scraping)
+        data = await self.get_json(
+            f"{self.ddg_url}/",
+            params={"q": f"{animal_name} species description habitat", "format": "json"},
+        )
+        if data:
+            if data.get("Abstract"):
+                text = summarise(data["Abstract"])
+                if text:
+                    return text, "duckduckgo"
+            for topic in data.get("RelatedTopics") or []:
+                if "Text" in topic:
+                    text = summarise(topic["Text"])
+                    if text:
+                        return text, "duckduckgo"
+
+        # If DuckDuckGo fails, try Wikipedia API as a backup
+        wiki_data = await self.get_json(
+            f"{self.wiki_url}/api/rest_v1/page/summary/{quote(animal_name.replace(' ', '_'))}"
+        )
+        if wiki_data and wiki_data.get("extract"):
+            text = summarise(wiki_data["extract"])
+            if text:
+                return text, "wikipedia"
+
+        return NO_DESCRIPTION, None
+
+    async def describe_all(self, animals, on_result, on_failure=None, max_in_flight=64):
+        """Describe every animal, calling on_result(animal, description, source) as each finishes.
+
+        Returns (animal, reason) pairs for lookups that failed transiently, for a later retry.
+        """
+        retry = []
+        gate = asyncio.Semaphore(max_in_flight)
+
+        async def one(animal):
+            async with gate:
+                try:
+                    description, source = await self.describe(animal)
+                except TransientError as e:
+                    retry.append((animal, str(e)))
+                    if on_failure:
+                        on_failure(animal)
+                    return
+                on_result(animal, description, source)
+
+        await asyncio.gather(*(one(animal) for animal in animals))
+        return retry
@@ -0,0 +1,183 @@
+"""
+Indexed, crash-safe store of animal descriptions
+
+Replaces the append-only animal_descriptions.txt with a SQLite table keyed by
+taxonomy name and indexed by taxonomy UUID. Writes are single-statement
+upserts, so a crash mid-run can never leave a half-written entry, and each
+entry keeps where it came from and when it was fetched.
+
+Run as a script to import the old text file once:
+
+    python description_store.py import animal_descriptions.txt
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from taxonomy import Taxonomy, entry_name
+
+DEFAULT_DB_PATH = Path(__file__).resolve().parent / "descriptions.sqlite3"
+DEFAULT_TEXT_PATH = Path(__file__).resolve().parent / "animal_descriptions.txt"
+
+
+def _repair_name(name):
+    """Undo the UTF-8-read-as-Latin-1 mangling some names picked up in the text file."""
+    for encoding in ("cp1252", "latin-1"):
+        try:
+            return name.encode(encoding).decode("utf-8")
+        except UnicodeError:
+            continue
+    return name
+
+
+class DescriptionStore:
+    def __init__(self, path=None):
+        self.path = str(path or os.environ.get("DESCRIPTIONS_DB") or DEFAULT_DB_PATH)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS descriptions (
+                name TEXT PRIMARY KEY,
+                uuid TEXT,
+                description TEXT NOT NULL,
+                source TEXT,
+                fetched_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS descriptions_uuid ON descriptions (uuid);
+            """
+        )
+
+    def upsert(self, name, description, source=None, uuid=None, fetched_at=None):
+        """Insert or replace one description atomically."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO descriptions (name, uuid, description, source, fetched_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET
+                    uuid = COALESCE(excluded.uuid, descriptions.uuid),
+                    description = excluded.description,
+                    source = excluded.source,
+                    fetched_at = excluded.fetched_at
+                """,
+                (name.strip().lower(), uuid, description, source, fetched_at or time.time()),
+            )
+
+    def get(self, name):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM descriptions WHERE name = ?", (name.strip().lower(),)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get_by_uuid(self, uuid):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM descriptions WHERE uuid = ? LIMIT 1", (uuid,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def names(self):
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT name FROM descriptions")}
+
+    def all(self):
+        """Every stored description as a list of row dicts."""
+        with self._lock:
+            return [dict(row) for row in self._conn.execute("SELECT * FROM descriptions")]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def import_text_file(self, text_path=DEFAULT_TEXT_PATH, taxonomy=None):
+        """One-shot import of the old "name: description" blank-line separated file.
+
+        The old format breaks when a description itself contains a blank line,
+        so a block only starts a new entry when its "name: " prefix is a known
+        taxonomy name (after repairing mis-decoded accents); anything else is
+        glued back onto the previous entry.
+        "Error: ..." entries were failed fetches and are skipped so they get
+        fetched again.
+        """
+        taxonomy = taxonomy or Taxonomy.load()
+        uuids = {}
+        for entry in taxonomy.entries:
+            uuids.setdefault(entry_name(entry).lower(), entry.uuid)
+
+        with open(text_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        fetched_at = os.path.getmtime(text_path)
+
+        entries = []
+        for block in content.split("\n\n"):
+            block = block.strip()
+            if not block:
+                continue
+            name, sep, description = block.partition(": ")
+            name = name.strip()
+            if name.lower() not in uuids:
+                name = _repair_name(name)
+            name = name.lower()
+            if sep and (name in uuids or not entries) and "\n" not in name:
+                entries.append([name, description.strip()])
+            elif entries:
+                entries[-1][1] += "\n\n" + block
+
+        imported = skipped = 0
+        rows = []
+        for name, description in entries:
+            if description.startswith("Error:"):
+                skipped += 1
+                continue
+            source = None if description == "No description found." else "import"
+            rows.append((name, uuids.get(name), description, source, fetched_at))
+            imported += 1
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO descriptions (name, uuid, description, source, fetched_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (name) DO NOTHING
+                """,
+                rows,
+            )
+        return imported, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the animal description store")
+    parser.add_argument("--db", default=None, help="SQLite file (default: descriptions.sqlite3 next to this script)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Import the old animal_descriptions.txt")
+    import_parser.add_argument("text_file", nargs="?", default=str(DEFAULT_TEXT_PATH))
+
+    get_parser = subparsers.add_parser("get", help="Print the description for a name or UUID")
+    get_parser.add_argument("key")
+
+    args = parser.parse_args()
+    store = DescriptionStore(args.db)
+
+    if args.command == "import":
+        imported, skipped = store.import_text_file(args.text_file)
+        print(f"Imported {imported} descriptions ({skipped} failed fetches skipped) into {store.path}")
+    elif args.command == "get":
+        row = store.get(args.key) or store.get_by_uuid(args.key)
+        print(row if row else f"No description for {args.key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Deterministic SpeciesNet stand-in for benchmarks and offline runs
+
+INFERENCE_BACKEND=fake loads this instead of SpeciesNet. It needs no model
+weights or ML frameworks, but otherwise behaves like the real thing as far as
+the API can tell:
+
+- each image's prediction is derived from the SHA-256 of its bytes, so the
+  same image always gets the same answer and runs are reproducible
+- a configurable share of images come back blank with no detections, so
+  tiered inference has something to skip
+- every image costs ms_per_image of wall time, split between detect() and
+  classify() by detector_share; with busy=True that time is spent spinning a
+  core, which reproduces the CPU contention of real inference
+"""
+
+import hashlib
+import time
+
+from tiered_inference import BLANK_LABEL
+
+MODEL_VERSION = "fake"
+ANIMAL_LABELS = (
+    "ac0e8ba7-7261-4d17-8645-11ed3d02165a;mammalia;carnivora;canidae;vulpes;vulpes;red fox",
+    "3eb4472d-b8da-4bd8-9533-7b9b4e844f6a;aves;anseriformes;anatidae;anas;platyrhynchos;mallard",
+    "0f5a75b9-fd03-43c7-8b29-706b3904bcca;aves;passeriformes;muscicapidae;erithacus;rubecula;european robin",
+    "86f5b978-4f30-40cc-bd08-be9e3fba27a0;mammalia;rodentia;sciuridae;sciurus;carolinensis;eastern gray squirrel",
+    "eb3829b0-772e-4088-ae90-f11b9fe38284;mammalia;cetartiodactyla;cervidae;cervus;elaphus;red deer",
+    "3d80f1d6-b1df-4966-9ff4-94053c7a902a;mammalia;carnivora;canidae;canis;familiaris;domestic dog",
+    "9212982e-8a58-4775-a6ac-e9a43110d8f5;mammalia;carnivora;felidae;felis;catus;domestic cat",
+)
+
+
+class FakeSpeciesNet:
+    def __init__(self, ms_per_image=50.0, detector_share=0.3, blank_rate=0.2, busy=True):
+        self.ms_per_image = ms_per_image
+        self.detector_share = detector_share
+        self.blank_rate = blank_rate
+        self.busy = busy
+
+    def predict(self, filepaths, batch_size=8, progress_bars=False, **kwargs):
+        self._spend(len(filepaths), 1.0)
+        return {"predictions": [self._prediction(filepath) for filepath in filepaths]}
+
+    def detect(self, filepaths, batch_size=8, progress_bars=False, **kwargs):
+        self._spend(len(filepaths), self.detector_share)
+        predictions = []
+        for filepath in filepaths:
+            prediction = self._prediction(filepath)
+            predictions.append({
+                "filepath": filepath,
+                "detections": prediction.get("detections", []),
+                "model_version": MODEL_VERSION,
+            })
+        return {"predictions": predictions}
+
+    def classify(self, filepaths, detections_dict=None, batch_size=8, progress_bars=False, **kwargs):
+        self._spend(len(filepaths), 1.0 - self.detector_share)
+        predictions = []
+        for filepath in filepaths:
+            prediction = self._prediction(filepath)
+            predictions.append({
+                "filepath": filepath,
+                "classifications": prediction["classifications"],
+                "model_version": MODEL_VERSION,
+            })
+        return {"predictions": predictions}
+
+    def ensemble_from_past_runs(self, filepaths, classifications_dict=None, detections_dict=None, **kwargs):
+        return {"predictions": [self._prediction(filepath) for filepath in filepaths]}
+
+    def _prediction(self, filepath):
+        with open(filepath, "rb") as f:
+            digest = hashlib.sha256(f.read()).digest()
+
+        if digest[0] < self.blank_rate * 256:
+            label, score, detections = BLANK_LABEL, 0.9, []
+        else:
+            label = ANIMAL_LABELS[digest[1] % len(ANIMAL_LABELS)]
+            score = 0.5 + digest[2] / 512
+            detections = [{"category": "1", "label": "animal", "conf": score, "bbox": [0.1, 0.1, 0.5, 0.5]}]
+
+        return {
+            "filepath": filepath,
+            "classifications": {"classes": [label], "scores": [score]},
+            "detections": detections,
+            "prediction": label,
+            "prediction_score": score,
+            "prediction_source": "classifier",
+            "model_version": MODEL_VERSION,
+        }
+
+    def _spend(self, images, share):
+        seconds = images * share * self.ms_per_image / 1000
+        if not self.busy:
+            time.sleep(seconds)
+            return
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
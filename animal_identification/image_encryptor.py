@@ -2,6 +2,42 @@ import base64
 import sys
 import os
 import argparse
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+except ImportError:
+    AESGCM = None
+
+# Base64 chunks must be a multiple of 3 bytes so the encoded pieces concatenate cleanly
+BASE64_CHUNK_SIZE = 3 * 256 * 1024
+
+# Encrypted file layout:
+#   header: magic, version, chunk size, nonce prefix, plaintext size
+#   chunks: AES-256-GCM(chunk i) + 16-byte tag, each chunk_size bytes of plaintext
+#           (the last one may be shorter)
+# Chunk i's nonce is the 8-byte random prefix followed by i as a 32-bit counter, and
+# the header is the associated data of every chunk, so chunks cannot be reordered,
+# swapped between files or truncated without decryption failing. Because every chunk
+# has the same size, chunk i sits at a fixed offset and can be decrypted on its own.
+ENCRYPTION_MAGIC = b"BHENC"
+ENCRYPTION_VERSION = 1
+ENCRYPTION_CHUNK_SIZE = 64 * 1024
+HEADER = struct.Struct(">5sBxxI8sQ")
+TAG_SIZE = 16
+KEY_SIZE = 32
+
+KEY_ENV = "IMAGE_ENCRYPTION_KEY"
+
+MODES = ("base64", "decode-base64", "encrypt", "decrypt")
+OUTPUT_SUFFIXES = {"base64": ".b64", "decode-base64": "", "encrypt": ".enc", "decrypt": ""}
+
+
+class EncryptionError(Exception):
+    """A file that is not in our format, was tampered with, or used the wrong key."""
+
 
 def encode_image_to_base64(image_path):
     """
@@ -46,16 +82,349 @@ def save_to_file(encoded_string, output_path):
     except Exception as e:
         print(f"Error saving to file: {e}")
 
+def encode_base64_stream(src, dst, chunk_size=BASE64_CHUNK_SIZE):
+    """
+    Base64-encodes a binary stream into another one chunk by chunk, so memory
+    use stays at one chunk whatever the file size.
+
+    Args:
+        src: Binary file object to read
+        dst: Binary file object to write ASCII Base64 to
+        chunk_size (int): Bytes read per step, rounded down to a multiple of 3
+
+    Returns:
+        int: Number of Base64 characters written
+    """
+    chunk_size = max(3, chunk_size - chunk_size % 3)
+    written = 0
+    while True:
+        chunk = src.read(chunk_size)
+        # Short reads from pipes would break the 3-byte alignment, so top the chunk up
+        while chunk and len(chunk) % 3 and len(chunk) < chunk_size:
+            more = src.read(chunk_size - len(chunk))
+            if not more:
+                break
+            chunk += more
+        if not chunk:
+            return written
+        encoded = base64.b64encode(chunk)
+        dst.write(encoded)
+        written += len(encoded)
+
+def decode_base64_stream(src, dst, chunk_size=BASE64_CHUNK_SIZE):
+    """
+    Decodes a Base64 stream (whitespace and line breaks allowed) chunk by chunk.
+
+    Args:
+        src: Binary file object holding Base64 text
+        dst: Binary file object to write the decoded bytes to
+        chunk_size (int): Bytes read per step
+
+    Returns:
+        int: Number of decoded bytes written
+    """
+    written = 0
+    pending = b""
+    while True:
+        chunk = src.read(chunk_size)
+        if chunk:
+            pending += b"".join(chunk.split())
+        usable = len(pending) - len(pending) % 4 if chunk else len(pending)
+        if usable:
+            decoded = base64.b64decode(pending[:usable], validate=True)
+            dst.write(decoded)
+            written += len(decoded)
+            pending = pending[usable:]
+        if not chunk:
+            return written
+
+def generate_key():
+    """A new random 256-bit key, Base64-encoded for storing in an env var or file."""
+    return base64.b64encode(os.urandom(KEY_SIZE)).decode("ascii")
+
+def load_key(key_file=None):
+    """
+    Reads the encryption key from key_file, or from $IMAGE_ENCRYPTION_KEY.
+
+    Returns:
+        bytes: The raw 32-byte key
+    """
+    if key_file:
+        with open(key_file, "r") as f:
+            encoded = f.read().strip()
+    else:
+        encoded = os.environ.get(KEY_ENV, "").strip()
+    if not encoded:
+        raise EncryptionError(f"No key given; pass --key-file or set {KEY_ENV}")
+    key = base64.b64decode(encoded)
+    if len(key) != KEY_SIZE:
+        raise EncryptionError(f"Key must be {KEY_SIZE} bytes, got {len(key)}")
+    return key
+
+def _aesgcm(key):
+    if AESGCM is None:
+        raise EncryptionError("Encryption needs the cryptography package: pip install cryptography")
+    return AESGCM(key)
+
+def _nonce(prefix, index):
+    return prefix + struct.pack(">I", index)
+
+def encrypt_stream(src, dst, key, size, chunk_size=ENCRYPTION_CHUNK_SIZE):
+    """
+    Encrypts a binary stream of known size into the chunked AES-GCM format.
+
+    Args:
+        src: Binary file object to read
+        dst: Binary file object to write the encrypted file to
+        key (bytes): 32-byte key
+        size (int): Number of plaintext bytes src will yield
+        chunk_size (int): Plaintext bytes per authenticated chunk
+
+    Returns:
+        int: Number of bytes written
+    """
+    aesgcm = _aesgcm(key)
+    if -(-size // chunk_size) >= 2 ** 32:
+        raise EncryptionError("File too large for this chunk size")
+    header = HEADER.pack(ENCRYPTION_MAGIC, ENCRYPTION_VERSION, chunk_size, os.urandom(8), size)
+    prefix = header[12:20]
+    dst.write(header)
+    written = len(header)
+
+    index = 0
+    remaining = size
+    while remaining > 0:
+        chunk = src.read(min(chunk_size, remaining))
+        if not chunk:
+            raise EncryptionError(f"Input ended {remaining} bytes early")
+        while len(chunk) < min(chunk_size, remaining):
+            more = src.read(min(chunk_size, remaining) - len(chunk))
+            if not more:
+                break
+            chunk += more
+        encrypted = aesgcm.encrypt(_nonce(prefix, index), chunk, header)
+        dst.write(encrypted)
+        written += len(encrypted)
+        remaining -= len(chunk)
+        index += 1
+    return written
+
+def read_header(src):
+    """
+    Reads and checks an encrypted file's header.
+
+    Returns:
+        tuple: (header bytes, chunk size, nonce prefix, plaintext size)
+    """
+    header = src.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise EncryptionError("File is too short to be encrypted")
+    magic, version, chunk_size, prefix, size = HEADER.unpack(header)
+    if magic != ENCRYPTION_MAGIC:
+        raise EncryptionError("Not an encrypted image file")
+    if version != ENCRYPTION_VERSION:
+        raise EncryptionError(f"Unsupported format version {version}")
+    if chunk_size <= 0:
+        raise EncryptionError("Corrupt header")
+    return header, chunk_size, prefix, size
+
+def _decrypt_chunk(aesgcm, src, header, chunk_size, prefix, size, index):
+    plain_length = min(chunk_size, size - index * chunk_size)
+    src.seek(HEADER.size + index * (chunk_size + TAG_SIZE))
+    encrypted = src.read(plain_length + TAG_SIZE)
+    if len(encrypted) != plain_length + TAG_SIZE:
+        raise EncryptionError(f"Chunk {index} is truncated")
+    try:
+        return aesgcm.decrypt(_nonce(prefix, index), encrypted, header)
+    except Exception:
+        raise EncryptionError(f"Chunk {index} failed authentication (wrong key or tampered file)")
+
+def decrypt_stream(src, dst, key):
+    """
+    Decrypts a whole encrypted file, verifying every chunk.
+
+    Args:
+        src: Seekable binary file object in the chunked format
+        dst: Binary file object to write plaintext to
+        key (bytes): 32-byte key
+
+    Returns:
+        int: Number of plaintext bytes written
+    """
+    aesgcm = _aesgcm(key)
+    header, chunk_size, prefix, size = read_header(src)
+    chunks = -(-size // chunk_size)
+    for index in range(chunks):
+        dst.write(_decrypt_chunk(aesgcm, src, header, chunk_size, prefix, size, index))
+    if src.read(1):
+        raise EncryptionError("Unexpected data after the last chunk")
+    return size
+
+def decrypt_range(path, key, offset, length):
+    """
+    Decrypts plaintext bytes [offset, offset + length) without touching the rest of the file.
+
+    Returns:
+        bytes: The requested plaintext (shorter if the range runs past the end)
+    """
+    aesgcm = _aesgcm(key)
+    with open(path, "rb") as src:
+        header, chunk_size, prefix, size = read_header(src)
+        end = min(size, offset + length)
+        if offset >= end:
+            return b""
+        parts = []
+        for index in range(offset // chunk_size, (end - 1) // chunk_size + 1):
+            chunk = _decrypt_chunk(aesgcm, src, header, chunk_size, prefix, size, index)
+            start = index * chunk_size
+            parts.append(chunk[max(0, offset - start):end - start])
+        return b"".join(parts)
+
+def process_file(mode, input_path, output_path, key=None):
+    """
+    Runs one streaming operation from input_path to output_path.
+
+    The output is written to a temporary file and renamed into place, so a
+    failure (e.g. a tampered chunk) never leaves a partial file behind.
+
+    Returns:
+        tuple: (input_path, bytes read, bytes written, seconds)
+    """
+    started = time.perf_counter()
+    partial_path = f"{output_path}.partial"
+    try:
+        with open(input_path, "rb") as src, open(partial_path, "wb") as dst:
+            if mode == "base64":
+                written = encode_base64_stream(src, dst)
+            elif mode == "decode-base64":
+                written = decode_base64_stream(src, dst)
+            elif mode == "encrypt":
+                written = encrypt_stream(src, dst, key, os.fstat(src.fileno()).st_size)
+            elif mode == "decrypt":
+                written = decrypt_stream(src, dst, key)
+            else:
+                raise ValueError(f"Unknown mode {mode!r}")
+        os.replace(partial_path, output_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return input_path, os.path.getsize(input_path), written, time.perf_counter() - started
+
+def output_path_for(mode, input_path, input_root, output_root):
+    """Mirror input_path's place under input_root into output_root, adjusting the suffix."""
+    relative = os.path.relpath(input_path, input_root)
+    if mode in ("decode-base64", "decrypt"):
+        base, ext = os.path.splitext(relative)
+        if ext in (".b64", ".enc"):
+            relative = base
+    else:
+        relative += OUTPUT_SUFFIXES[mode]
+    return os.path.join(output_root, relative)
+
+def process_directory(mode, input_dir, output_dir, key=None, workers=None):
+    """
+    Processes every file under input_dir (e.g. uploaded_images/ and its session
+    folders) across a process pool, mirroring the folder layout into output_dir.
+
+    Returns:
+        dict: files, failed, bytes read/written, seconds and MB/s throughput
+    """
+    jobs = []
+    for root, _, files in os.walk(input_dir):
+        for name in sorted(files):
+            if name.endswith(".partial"):
+                continue
+            input_path = os.path.join(root, name)
+            output_path = output_path_for(mode, input_path, input_dir, output_dir)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            jobs.append((input_path, output_path))
+
+    read_bytes = written_bytes = 0
+    failed = []
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_file, mode, i, o, key): i for i, o in jobs}
+        for future in as_completed(futures):
+            try:
+                _, read, written, _ = future.result()
+            except Exception as e:
+                failed.append((futures[future], str(e)))
+                print(f"Error processing {futures[future]}: {e}")
+                continue
+            read_bytes += read
+            written_bytes += written
+    seconds = time.perf_counter() - started
+
+    return {
+        "files": len(jobs) - len(failed),
+        "failed": failed,
+        "bytes_read": read_bytes,
+        "bytes_written": written_bytes,
+        "seconds": seconds,
+        "mb_per_s": read_bytes / (1024 * 1024) / seconds if seconds else 0.0,
+    }
+
 def main():
     # Create argument parser
-    parser = argparse.ArgumentParser(description="Encode an image file to Base64 string for Flutter")
-    parser.add_argument("image_path", help="Path to the image file to encode")
-    parser.add_argument("-o", "--output", help="Output file path (optional)")
+    parser = argparse.ArgumentParser(description="Encode an image file to Base64 string for Flutter, or encrypt/decrypt images")
+    parser.add_argument("image_path", nargs="?", help="Path to the image file (or, with --batch, a folder) to process")
+    parser.add_argument("-o", "--output", help="Output file path (optional; required for --batch and encrypt/decrypt)")
     parser.add_argument("-c", "--clipboard", action="store_true", help="Copy result to clipboard")
+    parser.add_argument("-m", "--mode", choices=MODES, default="base64", help="Operation to run (default: base64)")
+    parser.add_argument("--batch", action="store_true", help="Process every file under image_path with a process pool")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Processes for --batch (default: one per CPU)")
+    parser.add_argument("--key-file", help=f"File holding a Base64 key (default: ${KEY_ENV})")
+    parser.add_argument("--generate-key", action="store_true", help="Print a new random key and exit")
+    parser.add_argument("--range", help="With -m decrypt: only decrypt OFFSET:LENGTH plaintext bytes")
 
     # Parse arguments
     args = parser.parse_args()
 
+    if args.generate_key:
+        print(generate_key())
+        return
+
+    if not args.image_path:
+        parser.error("image_path is required")
+
+    try:
+        key = load_key(args.key_file) if args.mode in ("encrypt", "decrypt") else None
+
+        if args.batch:
+            if not args.output:
+                parser.error("--batch needs -o/--output for the output folder")
+            stats = process_directory(args.mode, args.image_path, args.output, key, args.workers)
+            print(f"Processed {stats['files']} file(s), {stats['bytes_read'] / (1024 * 1024):.1f} MB "
+                  f"in {stats['seconds']:.2f}s ({stats['mb_per_s']:.1f} MB/s)")
+            if stats["failed"]:
+                print(f"{len(stats['failed'])} file(s) failed")
+                sys.exit(1)
+            return
+
+        if args.range:
+            if args.mode != "decrypt":
+                parser.error("--range only applies to -m decrypt")
+            offset, length = (int(part) for part in args.range.split(":"))
+            data = decrypt_range(args.image_path, key, offset, length)
+            if args.output:
+                with open(args.output, "wb") as f:
+                    f.write(data)
+            else:
+                sys.stdout.buffer.write(data)
+            return
+
+        if args.mode != "base64" or (args.output and not args.clipboard):
+            if not args.output:
+                parser.error(f"-m {args.mode} needs -o/--output")
+            _, read, written, seconds = process_file(args.mode, args.image_path, args.output, key)
+            print(f"Wrote {written} bytes to {args.output} "
+                  f"({read / (1024 * 1024) / seconds if seconds else 0:.1f} MB/s)")
+            return
+    except EncryptionError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
     # Encode the image
     encoded_string = encode_image_to_base64(args.image_path)
 
@@ -81,4 +450,4 @@ def main():
                 print(f"Error copying to clipboard: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
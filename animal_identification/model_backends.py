@@ -0,0 +1,38 @@
+"""
+Model backend selection
+
+Everything that loads SpeciesNet (the API's worker pool and the bulk CLI) goes
+through load_model(), so the runtime is one config switch:
+
+- "speciesnet": the stock package, full precision
+- "onnx": detector and classifier on ONNX Runtime (see onnx_backend.py)
+- "fake": a deterministic stand-in for benchmarks and offline runs (see fake_backend.py)
+"""
+
+BACKENDS = ("speciesnet", "onnx", "fake")
+# Kept here rather than in onnx_backend so CLIs can offer them without importing numpy
+ONNX_PRECISIONS = ("fp32", "fp16", "int8")
+
+
+def load_model(backend="speciesnet", model_name=None, tiered_threshold=None, **options):
+    """Load a model with SpeciesNet's predict() interface, optionally wrapped for tiered inference."""
+    if backend == "speciesnet":
+        from speciesnet import DEFAULT_MODEL, SpeciesNet
+
+        model = SpeciesNet(model_name or DEFAULT_MODEL, components="all")
+    elif backend == "onnx":
+        from onnx_backend import load_onnx_speciesnet
+
+        model = load_onnx_speciesnet(model_name, **options)
+    elif backend == "fake":
+        from fake_backend import FakeSpeciesNet
+
+        model = FakeSpeciesNet(**options)
+    else:
+        raise ValueError(f"Unknown inference backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+    if tiered_threshold is not None:
+        from tiered_inference import TieredClassifier
+
+        model = TieredClassifier(model, tiered_threshold)
+    return model
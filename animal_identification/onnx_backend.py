@@ -0,0 +1,103 @@
+"""
+ONNX Runtime CPU backend for SpeciesNet
+
+scripts/export_onnx.py exports SpeciesNet's detector (PyTorch) and classifier
+(Keras) to ONNX, optionally with int8 or fp16 weights. This module loads those
+files into ONNX Runtime sessions with explicit intra-/inter-op thread counts and
+swaps them in for the framework models inside a regular SpeciesNet object.
+Image loading, preprocessing, NMS, label lookup and the ensemble stay
+SpeciesNet's own code, so predictions keep exactly the same shape.
+
+The adapters follow how SpeciesNet calls its models (the classifier as
+model(batch, training=False) returning logits, the detector as model(images)
+returning a tuple whose first element is the raw YOLO output). Run
+scripts/onnx_parity.py after upgrading speciesnet to confirm they still match.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+from model_backends import ONNX_PRECISIONS as PRECISIONS
+
+DEFAULT_ONNX_DIR = Path(__file__).resolve().parent / "onnx_models"
+
+
+def model_paths(onnx_dir=None, precision="int8"):
+    """(detector path, classifier path) for an export directory and weight precision."""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}; expected one of {', '.join(PRECISIONS)}")
+    onnx_dir = Path(onnx_dir or DEFAULT_ONNX_DIR)
+    return onnx_dir / f"detector.{precision}.onnx", onnx_dir / f"classifier.{precision}.onnx"
+
+
+def make_session(path, intra_op_threads=0, inter_op_threads=0):
+    """A CPU inference session; 0 threads lets ONNX Runtime pick."""
+    if ort is None:
+        raise RuntimeError("The onnx backend needs onnxruntime: pip install onnxruntime")
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    if inter_op_threads > 1:
+        options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    return ort.InferenceSession(str(path), sess_options=options, providers=["CPUExecutionProvider"])
+
+
+class OrtClassifierModel:
+    """Stands in for the Keras classifier: model(batch, training=False) -> logits."""
+
+    def __init__(self, session):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+
+    def __call__(self, inputs, training=False):
+        batch = np.asarray(inputs, dtype=np.float32)
+        return self.session.run(None, {self.input_name: batch})[0]
+
+    def predict(self, inputs, **kwargs):
+        return self(inputs)
+
+
+class OrtDetectorModel:
+    """Stands in for the YOLO detector: model(images) -> (raw predictions, ...) as torch tensors."""
+
+    def __init__(self, session):
+        import torch
+
+        self._torch = torch
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+
+    def __call__(self, images, *args, **kwargs):
+        batch = images.detach().cpu().numpy().astype(np.float32)
+        outputs = self.session.run(None, {self.input_name: batch})
+        return tuple(self._torch.from_numpy(output) for output in outputs)
+
+    # SpeciesNet may move or switch the model to eval mode; those are no-ops here
+    def to(self, *args, **kwargs):
+        return self
+
+    def eval(self):
+        return self
+
+
+def load_onnx_speciesnet(model_name=None, onnx_dir=None, precision="int8", intra_op_threads=0, inter_op_threads=0):
+    """A SpeciesNet object whose detector and classifier run on ONNX Runtime."""
+    from speciesnet import DEFAULT_MODEL, SpeciesNet
+
+    detector_path, classifier_path = model_paths(onnx_dir, precision)
+    for path in (detector_path, classifier_path):
+        if not path.exists():
+            raise FileNotFoundError(f"{path} not found; run scripts/export_onnx.py --precision {precision} first")
+
+    model = SpeciesNet(model_name or DEFAULT_MODEL, components="all")
+    model.detector.model = OrtDetectorModel(make_session(detector_path, intra_op_threads, inter_op_threads))
+    model.classifier.model = OrtClassifierModel(make_session(classifier_path, intra_op_threads, inter_op_threads))
+    return model
+
@@ -0,0 +1,492 @@
+"""
+Load and latency benchmark for the detection API
+
+    python benchmark_api.py run --spawn --concurrency 8 --duration 60 -o base.json
+    python benchmark_api.py run --url http://localhost:8000 --mix single=1 -o capture.json
+    python benchmark_api.py compare base.json new.json --threshold 0.1
+
+`run` drives /detect-animals and /detection-status/{session_id} from
+--concurrency virtual clients. Each client uploads a session and polls its
+status (with ETags) until it finishes, then starts the next one. Sessions are
+drawn from a seeded mix of:
+
+- single: one capture, with new bytes every time, so it always needs inference
+- burst: --burst-size frames taken from one uploaded_images/ session, i.e. real
+  burst captures, padded by repeating frames when the session is shorter
+- repeat: the same image byte for byte every time, which the prediction
+  cache should answer
+
+--spawn starts a private uvicorn server in a temporary directory. It uses
+INFERENCE_BACKEND=fake, a deterministic SpeciesNet stand-in, so the run needs
+no model weights or network. Add --server-env KEY=VALUE to compare settings
+such as TIERED_INFERENCE=1 or BATCH_MAX_SIZE=32.
+
+The report, printed and written with -o as JSON, has:
+
+- throughput in sessions/s and images/s
+- p50/p95/p99 upload-to-result latency, overall and per scenario
+- upload time, 429 rejections and errors
+- event-loop lag as measured by the server's /loop/stats
+
+`compare` lines two reports up metric by metric and exits 1 when any metric
+is worse than the baseline by more than --threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+API_DIR = REPO_ROOT / "animal_identification" / "api"
+DEFAULT_IMAGES = REPO_ROOT / "uploaded_images"
+SCENARIOS = ("single", "burst", "repeat")
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+# Metrics compared between runs, and whether higher values are better
+COMPARED_METRICS = {
+    "images_per_s": True,
+    "sessions_per_s": True,
+    "latency_ms.p50": False,
+    "latency_ms.p95": False,
+    "latency_ms.p99": False,
+    "upload_ms.p95": False,
+    "loop_lag_ms.p99": False,
+    "loop_lag_ms.max": False,
+    "error_rate": False,
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarise(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 2),
+        "p50": round(percentile(values, 0.50), 2),
+        "p95": round(percentile(values, 0.95), 2),
+        "p99": round(percentile(values, 0.99), 2),
+        "max": round(values[-1], 2),
+    }
+
+
+class Corpus:
+    """Image bytes grouped the way they were uploaded, one group per session directory."""
+
+    def __init__(self, root):
+        self.sessions = []
+        for session_dir in sorted(Path(root).iterdir()):
+            if session_dir.is_dir():
+                frames = [
+                    path.read_bytes() for path in sorted(session_dir.iterdir())
+                    if path.suffix.lower() in IMAGE_SUFFIXES
+                ]
+                if frames:
+                    self.sessions.append(frames)
+        if not self.sessions:
+            raise SystemExit(f"No images found under {root}")
+        self.images = [frame for frames in self.sessions for frame in frames]
+
+    def single(self, rng):
+        # Bytes after the end-of-image marker are ignored by decoders but change the content hash
+        return [rng.choice(self.images) + rng.randbytes(16)]
+
+    def burst(self, rng, size):
+        longest = max(len(frames) for frames in self.sessions)
+        candidates = [frames for frames in self.sessions if len(frames) >= min(size, longest)]
+        frames = rng.choice(candidates)
+        return [frames[index % len(frames)] + rng.randbytes(16) for index in range(size)]
+
+    def repeat(self, rng):
+        return [self.images[0]]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}; expected {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_server(workdir, port, extra_env):
+    """Start uvicorn on the fake backend with every store inside workdir."""
+    env = dict(os.environ)
+    env.update({
+        "INFERENCE_BACKEND": "fake",
+        "PREDICTION_CACHE_PATH": str(workdir / "prediction_cache.sqlite3"),
+        "RESULTS_DB_PATH": str(workdir / "results.sqlite3"),
+        "JOB_STORE_PATH": str(workdir / "jobs.sqlite3"),
+        "DESCRIPTIONS_DB": str(workdir / "descriptions.sqlite3"),
+        "SIGHTING_DB_PATH": "",
+    })
+    env.update(extra_env)
+    log = open(workdir / "server.log", "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(API_DIR),
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    return process
+
+
+async def wait_ready(http, url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with http.get(f"{url}/ready") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit(f"{url} did not become ready within {timeout:.0f}s")
+
+
+async def get_json(http, url):
+    try:
+        async with http.get(url) as response:
+            return await response.json() if response.status == 200 else None
+    except aiohttp.ClientError:
+        return None
+
+
+class Client:
+    """One virtual user: upload a session, poll it to completion, repeat."""
+
+    def __init__(self, index, args, corpus, records):
+        self.index = index
+        self.args = args
+        self.corpus = corpus
+        self.records = records
+        self.rng = random.Random(args.seed * 1000 + index)
+        self.scenarios = list(args.mix)
+        self.weights = list(args.mix.values())
+
+    async def run(self, http, stop_at, record_after):
+        sessions = 0
+        while time.monotonic() < stop_at and (not self.args.sessions or sessions < self.args.sessions):
+            scenario = self.rng.choices(self.scenarios, self.weights)[0]
+            if scenario == "burst":
+                images = self.corpus.burst(self.rng, self.args.burst_size)
+            else:
+                images = getattr(self.corpus, scenario)(self.rng)
+            started = time.monotonic()
+            record = await self.session(http, scenario, images)
+            sessions += 1
+            if started >= record_after:
+                self.records.append(record)
+            if record["status"] == "rejected":
+                await asyncio.sleep(min(record["retry_after"], 5))
+
+    async def session(self, http, scenario, images):
+        record = {"scenario": scenario, "images": len(images), "client": self.index}
+        form = aiohttp.FormData()
+        for index, data in enumerate(images):
+            form.add_field("files", data, filename=f"c{self.index}_{index}.jpg", content_type="image/jpeg")
+
+        started = time.monotonic()
+        try:
+            async with http.post(f"{self.args.url}/detect-animals", data=form,
+                                 headers={"X-Client-Id": f"bench-{self.index}"}) as response:
+                record["upload_ms"] = (time.monotonic() - started) * 1000
+                if response.status == 429:
+                    record.update(status="rejected", retry_after=float(response.headers.get("Retry-After", 1)))
+                    return record
+                if response.status != 200:
+                    record.update(status="error", error=f"upload returned {response.status}")
+                    return record
+                session_id = (await response.json())["session_id"]
+
+            etag = None
+            polls = 0
+            while True:
+                await asyncio.sleep(self.args.poll_interval)
+                polls += 1
+                headers = {"If-None-Match": etag} if etag else {}
+                async with http.get(f"{self.args.url}/detection-status/{session_id}", headers=headers) as response:
+                    if response.status == 304:
+                        continue
+                    etag = response.headers.get("ETag")
+                    status = (await response.json()).get("status")
+                if status != "processing":
+                    break
+                if time.monotonic() - started > self.args.session_timeout:
+                    status = "timeout"
+                    break
+        except aiohttp.ClientError as e:
+            record.update(status="error", error=repr(e))
+            return record
+
+        record.update(
+            status="complete" if status == "complete" else "error",
+            latency_ms=(time.monotonic() - started) * 1000,
+            polls=polls,
+        )
+        if status != "complete":
+            record["error"] = status
+        return record
+
+
+def build_report(args, records, elapsed, loop_stats, server_stats):
+    completed = [record for record in records if record["status"] == "complete"]
+    errors = [record for record in records if record["status"] == "error"]
+    rejected = [record for record in records if record["status"] == "rejected"]
+    attempted = len(completed) + len(errors)
+    images = sum(record["images"] for record in completed)
+
+    report = {
+        "elapsed_s": round(elapsed, 2),
+        "sessions": len(completed),
+        "images": images,
+        "sessions_per_s": round(len(completed) / elapsed, 3) if elapsed else 0.0,
+        "images_per_s": round(images / elapsed, 3) if elapsed else 0.0,
+        "errors": len(errors),
+        "error_rate": round(len(errors) / attempted, 4) if attempted else 0.0,
+        "rejected": len(rejected),
+        "latency_ms": summarise([record["latency_ms"] for record in completed]),
+        "upload_ms": summarise([record["upload_ms"] for record in records if "upload_ms" in record]),
+        "polls_per_session": summarise([record["polls"] for record in completed]),
+        "scenarios": {
+            scenario: {
+                "sessions": sum(1 for record in completed if record["scenario"] == scenario),
+                "latency_ms": summarise([record["latency_ms"] for record in completed if record["scenario"] == scenario]),
+            }
+            for scenario in args.mix
+        },
+        "loop_lag_ms": {
+            "p50": loop_stats.get("p50_ms"),
+            "p99": loop_stats.get("p99_ms"),
+            "max": loop_stats.get("max_ms"),
+        } if loop_stats and loop_stats.get("enabled") else None,
+        "error_samples": sorted({record.get("error", "") for record in errors})[:10],
+    }
+    return {
+        "config": {
+            "url": None if args.spawn else args.url,
+            "spawn": args.spawn,
+            "server_env": dict(args.server_env),
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "sessions_per_client": args.sessions,
+            "mix": args.mix,
+            "burst_size": args.burst_size,
+            "poll_interval": args.poll_interval,
+            "seed": args.seed,
+        },
+        "environment": environment(),
+        "results": report,
+        "server": server_stats,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+async def run_benchmark(args):
+    corpus = Corpus(args.images)
+    server = None
+    workdir = None
+    if args.spawn:
+        workdir = Path(tempfile.mkdtemp(prefix="bench-api-"))
+        port = free_port()
+        args.url = f"http://127.0.0.1:{port}"
+        server = spawn_server(workdir, port, dict(args.server_env))
+        print(f"Started server on {args.url} (logs in {workdir / 'server.log'})")
+
+    timeout = aiohttp.ClientTimeout(total=args.session_timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency * 2)
+    try:
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as http:
+            await wait_ready(http, args.url, args.ready_timeout)
+            print(f"Running {args.concurrency} clients for {args.warmup:.0f}s warm-up + {args.duration:.0f}s "
+                  f"({', '.join(f'{name}={weight:g}' for name, weight in args.mix.items())})")
+
+            records = []
+            clients = [Client(index, args, corpus, records) for index in range(args.concurrency)]
+            started = time.monotonic()
+            record_after = started + args.warmup
+            stop_at = record_after + args.duration
+
+            async def reset_loop_stats():
+                await asyncio.sleep(args.warmup)
+                await get_json(http, f"{args.url}/loop/stats?reset=true")
+
+            resetter = asyncio.create_task(reset_loop_stats())
+            await asyncio.gather(*(client.run(http, stop_at, record_after) for client in clients))
+            await resetter
+            elapsed = max(0.001, time.monotonic() - record_after)
+
+            loop_stats = await get_json(http, f"{args.url}/loop/stats")
+            server_stats = {
+                name: await get_json(http, f"{args.url}/{name}/stats")
+                for name in ("queue", "scheduler", "cache", "preprocess")
+            }
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    return build_report(args, records, elapsed, loop_stats, server_stats)
+
+
+def print_report(report):
+    results = report["results"]
+    print(f"\n{results['sessions']} sessions, {results['images']} images in {results['elapsed_s']}s: "
+          f"{results['sessions_per_s']} sessions/s, {results['images_per_s']} images/s")
+    print(f"Errors: {results['errors']} ({results['error_rate']:.2%}), rejected with 429: {results['rejected']}")
+    latency = results["latency_ms"]
+    if latency["count"]:
+        print(f"Upload-to-result latency (ms): p50 {latency['p50']}, p95 {latency['p95']}, "
+              f"p99 {latency['p99']}, max {latency['max']}")
+    for scenario, stats in results["scenarios"].items():
+        if stats["sessions"]:
+            print(f"  {scenario:<7} {stats['sessions']:>6} sessions, p50 {stats['latency_ms']['p50']} ms, "
+                  f"p99 {stats['latency_ms']['p99']} ms")
+    if results["loop_lag_ms"]:
+        lag = results["loop_lag_ms"]
+        print(f"Event-loop lag (ms): p50 {lag['p50']}, p99 {lag['p99']}, max {lag['max']}")
+
+
+def metric(report, path):
+    value = report["results"]
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def compare(baseline, candidate, threshold):
+    """Rows of (metric, baseline, candidate, relative change, regressed)."""
+    rows = []
+    for path, higher_is_better in COMPARED_METRICS.items():
+        before, after = metric(baseline, path), metric(candidate, path)
+        if before is None or after is None:
+            continue
+        if before == 0:
+            change = 0.0 if after == 0 else float("inf")
+        else:
+            change = (after - before) / abs(before)
+        worse = -change if higher_is_better else change
+        if path == "error_rate":
+            regressed = after > before + 0.001
+        else:
+            regressed = worse > threshold
+            if "_ms" in path:
+                # Sub-millisecond shifts (e.g. in loop lag) are noise, not regressions
+                regressed = regressed and abs(after - before) > 1.0
+        rows.append((path, before, after, change, regressed))
+    return rows
+
+
+def run_command(args):
+    report = asyncio.run(run_benchmark(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+def compare_command(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate, args.threshold)
+    print(f"{'metric':<20} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for path, before, after, change, regressed in rows:
+        flag = "  REGRESSED" if regressed else ""
+        print(f"{path:<20} {before:>12} {after:>12} {change:>+8.1%}{flag}")
+    if baseline.get("config") != candidate.get("config"):
+        print("\nNote: the two runs used different settings")
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and latency benchmark for the detection API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Drive the API and report throughput and latency")
+    target = run.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="Benchmark a running server")
+    target.add_argument("--spawn", action="store_true", help="Start a private server on the fake backend")
+    run.add_argument("--server-env", action="append", default=[], type=lambda text: tuple(text.split("=", 1)),
+                     metavar="KEY=VALUE", help="Extra environment for the spawned server; repeatable")
+    run.add_argument("--concurrency", type=int, default=8, help="Virtual clients (default: 8)")
+    run.add_argument("--duration", type=float, default=30, help="Measured seconds (default: 30)")
+    run.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before the run (default: 5)")
+    run.add_argument("--sessions", type=int, default=0, help="Stop each client after this many sessions")
+    run.add_argument("--mix", type=parse_mix, default=parse_mix("single=0.5,burst=0.3,repeat=0.2"),
+                     help="Scenario weights (default: single=0.5,burst=0.3,repeat=0.2)")
+    run.add_argument("--burst-size", type=int, default=12)
+    run.add_argument("--images", default=str(DEFAULT_IMAGES), help="Folder of session sub-folders of images")
+    run.add_argument("--poll-interval", type=float, default=0.1)
+    run.add_argument("--session-timeout", type=float, default=120)
+    run.add_argument("--ready-timeout", type=float, default=120)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("-o", "--output", help="Write the report as JSON")
+
+    diff = commands.add_parser("compare", help="Compare two JSON reports")
+    diff.add_argument("baseline")
+    diff.add_argument("candidate")
+    diff.add_argument("--threshold", type=float, default=0.10, help="Allowed relative change (default: 0.10)")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run_command(args)
+    else:
+        compare_command(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Export SpeciesNet's detector and classifier to ONNX for the CPU backend
+
+    python export_onnx.py --precision int8 --precision fp16
+
+Writes detector.<precision>.onnx and classifier.<precision>.onnx into
+--output-dir (default: animal_identification/onnx_models/), which is where the
+onnx backend looks for them. fp32 is always exported first, since the other
+precisions are derived from it:
+
+- int8: dynamic quantization, with int8 weights and activations quantized at runtime
+- fp16: half-precision weights with float32 inputs and outputs kept
+
+Needs tf2onnx (classifier), torch (detector), onnx and onnxruntime;
+onnxconverter-common as well for fp16.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from onnx_backend import DEFAULT_ONNX_DIR, PRECISIONS, model_paths
+
+OPSET = 17
+
+
+def export_classifier(classifier, path):
+    import tensorflow as tf
+    import tf2onnx
+
+    keras_model = classifier.model
+    shape = (None,) + tuple(keras_model.input_shape[1:])
+    signature = (tf.TensorSpec(shape, tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(keras_model, input_signature=signature, opset=OPSET, output_path=str(path))
+
+
+def export_detector(detector, path, image_size=1280):
+    import torch
+
+    torch_model = detector.model
+    torch_model.eval()
+    dummy = torch.zeros(1, 3, image_size, image_size)
+    torch.onnx.export(
+        torch_model,
+        dummy,
+        str(path),
+        opset_version=OPSET,
+        input_names=["images"],
+        output_names=["output"],
+        # Letterboxed detector inputs vary in height and width
+        dynamic_axes={"images": {0: "batch", 2: "height", 3: "width"}, "output": {0: "batch", 1: "anchors"}},
+    )
+
+
+def derive(fp32_path, path, precision):
+    if precision == "int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(fp32_path), str(path), weight_type=QuantType.QInt8)
+    elif precision == "fp16":
+        import onnx
+        from onnxconverter_common import float16
+
+        model = float16.convert_float_to_float16(onnx.load(str(fp32_path)), keep_io_types=True)
+        onnx.save(model, str(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export SpeciesNet to ONNX for the CPU inference backend")
+    parser.add_argument("--model", default=None, help="SpeciesNet model name (default: the package default)")
+    parser.add_argument("--output-dir", default=str(DEFAULT_ONNX_DIR))
+    parser.add_argument("--precision", action="append", choices=PRECISIONS,
+                        help="Weight precision to produce; repeatable (default: int8)")
+    parser.add_argument("--detector-size", type=int, default=1280, help="Example input size used to trace the detector")
+    args = parser.parse_args()
+
+    from speciesnet import DEFAULT_MODEL, SpeciesNet
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    precisions = args.precision or ["int8"]
+
+    print("Loading SpeciesNet...")
+    model = SpeciesNet(args.model or DEFAULT_MODEL, components="all")
+
+    detector_fp32, classifier_fp32 = model_paths(output_dir, "fp32")
+    started = time.perf_counter()
+    export_classifier(model.classifier, classifier_fp32)
+    print(f"Exported {classifier_fp32} in {time.perf_counter() - started:.1f}s")
+    started = time.perf_counter()
+    export_detector(model.detector, detector_fp32, args.detector_size)
+    print(f"Exported {detector_fp32} in {time.perf_counter() - started:.1f}s")
+
+    for precision in precisions:
+        if precision == "fp32":
+            continue
+        detector_path, classifier_path = model_paths(output_dir, precision)
+        for source, target in ((detector_fp32, detector_path), (classifier_fp32, classifier_path)):
+            derive(source, target, precision)
+            print(f"Wrote {target} ({target.stat().st_size / (1024 * 1024):.1f} MB, "
+                  f"fp32 was {source.stat().st_size / (1024 * 1024):.1f} MB)")
+
+    print("\nCheck accuracy and speed before switching: python onnx_parity.py LABELLED_DIR --precision "
+          + precisions[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Accuracy and speed parity check: ONNX Runtime backend vs stock SpeciesNet
+
+    python onnx_parity.py LABELLED_DIR --precision int8 --intra-op-threads 8
+
+LABELLED_DIR holds one sub-folder per label (a common name such as "red fox",
+or a taxonomy UUID) with that label's images inside; --labels FILE.csv with
+filepath,label rows can be used instead. Both backends classify the same images
+on CPU. The report covers:
+
+- top-1 agreement between the two backends (final prediction and raw classifier)
+- accuracy of each backend against the labels
+- images/second for each backend, after a warm-up batch
+
+The exit status is 0 only when agreement and speedup both clear their thresholds.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model_backends import load_model
+from onnx_backend import PRECISIONS
+from taxonomy import entry_name, get_taxonomy
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".avif", ".heic"}
+
+
+def load_labelled_set(root=None, labels_csv=None):
+    """[(filepath, label)] from label sub-folders or a filepath,label CSV."""
+    items = []
+    if labels_csv:
+        with open(labels_csv, newline="") as f:
+            for row in csv.reader(f):
+                if row and row[0] != "filepath":
+                    items.append((os.path.abspath(row[0]), row[1].strip()))
+        return items
+
+    for label_dir in sorted(Path(root).iterdir()):
+        if label_dir.is_dir():
+            for path in sorted(label_dir.rglob("*")):
+                if path.suffix.lower() in IMAGE_EXTENSIONS:
+                    items.append((str(path.resolve()), label_dir.name.replace("_", " ")))
+    return items
+
+
+def matches_label(prediction, label):
+    if not prediction.get("prediction"):
+        return False
+    entry = get_taxonomy().parse_label(prediction["prediction"])
+    return label.lower() in (entry.uuid.lower(), entry_name(entry).lower())
+
+
+def top_class(prediction):
+    classes = (prediction.get("classifications") or {}).get("classes") or []
+    return classes[0] if classes else None
+
+
+def run_backend(backend, filepaths, batch_size, model_name=None, **options):
+    """(predictions by filepath, load seconds, images/second excluding a warm-up batch)."""
+    started = time.perf_counter()
+    model = load_model(backend, model_name, **options)
+    load_seconds = time.perf_counter() - started
+
+    warmup = filepaths[:batch_size]
+    model.predict(filepaths=warmup, batch_size=batch_size, progress_bars=False)
+
+    started = time.perf_counter()
+    output = model.predict(filepaths=filepaths, batch_size=batch_size, progress_bars=False) or {}
+    seconds = time.perf_counter() - started
+
+    predictions = {p["filepath"]: p for p in output.get("predictions", [])}
+    return predictions, load_seconds, len(filepaths) / seconds if seconds else 0.0
+
+
+def compare(items, stock, onnx):
+    both = [(path, label) for path, label in items if path in stock and path in onnx]
+    if not both:
+        return {"images": 0}
+    agree = sum(stock[p].get("prediction") == onnx[p].get("prediction") for p, _ in both)
+    classifier_agree = sum(top_class(stock[p]) == top_class(onnx[p]) for p, _ in both)
+    return {
+        "images": len(both),
+        "top1_agreement": agree / len(both),
+        "classifier_top1_agreement": classifier_agree / len(both),
+        "stock_accuracy": sum(matches_label(stock[p], label) for p, label in both) / len(both),
+        "onnx_accuracy": sum(matches_label(onnx[p], label) for p, label in both) / len(both),
+        "disagreements": [
+            {"filepath": p, "label": label, "stock": stock[p].get("prediction"), "onnx": onnx[p].get("prediction")}
+            for p, label in both
+            if stock[p].get("prediction") != onnx[p].get("prediction")
+        ][:50],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ONNX backend against stock SpeciesNet")
+    parser.add_argument("root", nargs="?", help="Folder with one sub-folder of images per label")
+    parser.add_argument("--labels", help="CSV of filepath,label instead of label sub-folders")
+    parser.add_argument("--model", default=None, help="SpeciesNet model name (default: the package default)")
+    parser.add_argument("--onnx-dir", default=None)
+    parser.add_argument("--precision", choices=PRECISIONS, default="int8")
+    parser.add_argument("--intra-op-threads", type=int, default=0)
+    parser.add_argument("--inter-op-threads", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="Required top-1 agreement with stock")
+    parser.add_argument("--min-speedup", type=float, default=1.2, help="Required images/s ratio onnx/stock")
+    parser.add_argument("-o", "--output", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    if not args.root and not args.labels:
+        parser.error("Pass a labelled folder or --labels")
+    items = load_labelled_set(args.root, args.labels)
+    if not items:
+        parser.error("No labelled images found")
+    filepaths = [path for path, _ in items]
+    print(f"{len(items)} labelled images, {len({label for _, label in items})} labels")
+
+    print("Running stock SpeciesNet...")
+    stock, stock_load, stock_rate = run_backend("speciesnet", filepaths, args.batch_size, args.model)
+    print(f"  loaded in {stock_load:.1f}s, {stock_rate:.2f} images/s")
+
+    print(f"Running ONNX Runtime ({args.precision})...")
+    onnx, onnx_load, onnx_rate = run_backend(
+        "onnx", filepaths, args.batch_size, args.model,
+        onnx_dir=args.onnx_dir,
+        precision=args.precision,
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+    )
+    print(f"  loaded in {onnx_load:.1f}s, {onnx_rate:.2f} images/s")
+
+    report = compare(items, stock, onnx)
+    speedup = onnx_rate / stock_rate if stock_rate else 0.0
+    passed = report["images"] > 0 and report["top1_agreement"] >= args.min_agreement and speedup >= args.min_speedup
+    report.update({
+        "precision": args.precision,
+        "intra_op_threads": args.intra_op_threads,
+        "inter_op_threads": args.inter_op_threads,
+        "stock_images_per_s": stock_rate,
+        "onnx_images_per_s": onnx_rate,
+        "speedup": speedup,
+        "passed": passed,
+    })
+
+    if report["images"]:
+        print(f"\nTop-1 agreement:            {report['top1_agreement']:.1%} (classifier only: "
+              f"{report['classifier_top1_agreement']:.1%})")
+        print(f"Accuracy vs labels:         stock {report['stock_accuracy']:.1%}, onnx {report['onnx_accuracy']:.1%}")
+    print(f"Speed:                      {speedup:.2f}x ({stock_rate:.2f} -> {onnx_rate:.2f} images/s)")
+    print("PASS: the onnx backend is safe to select" if passed else
+          f"FAIL: needs >= {args.min_agreement:.0%} agreement and >= {args.min_speedup:.2f}x speed")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,137 +1,418 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
-import random
+"""
+Synthetic sighting generator for load tests
+
+Generates photo sightings in NumPy-vectorized chunks for any number of species,
+each following a migration pattern, and streams every chunk to one or more
+sinks: Firestore batched writes (500 documents per commit, against the real
+project or the local emulator), an in-memory sink, CSV or Parquet.
+
+    python simulate_dog_migration.py                        # the original 100-dog run
+    python simulate_dog_migration.py --rows 5000000 --species 40 --sink parquet -o sightings.parquet
+    python simulate_dog_migration.py --rows 200000 --sink emulator --emulator-host localhost:8080
+"""
+
+import argparse
+import csv
 import datetime
-import uuid
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Starting coordinates (Bath)
+START_LAT = 51.3781017
+START_LNG = -2.3596817
+
+# Animal classification ID (domestic dog)
+DOG_ANIMAL_ID = "eznjYhDJrqFSTCOXZiM2"
+
+# User ID who took the photos
+USER_ID = "568be83a-562d-4386-85aa-6e5d41696029"
+
+PATTERNS = ("spread", "linear", "radial", "seasonal", "stationary")
+
+COLUMNS = ["id", "userId", "animalClassification", "timestamp", "latitude", "longitude", "encryptedImageData"]
+
+FIRESTORE_BATCH_LIMIT = 500
+
+_HEX = np.frombuffer(b"0123456789abcdef", dtype="S1")
+
+
+class Species:
+    """One simulated species: where its sightings start and how they move over the run."""
+
+    def __init__(self, animal_id, pattern, origin_lat, origin_lng, distance=1.0, heading=270.0, spread=1.0):
+        if pattern not in PATTERNS:
+            raise ValueError(f"Unknown pattern {pattern!r}; expected one of {', '.join(PATTERNS)}")
+        self.animal_id = animal_id
+        self.pattern = pattern
+        self.origin_lat = origin_lat
+        self.origin_lng = origin_lng
+        self.distance = distance
+        self.heading = heading
+        self.spread = spread
+
+
+def make_species(count, pattern="mixed", rng=None):
+    """The original westward-spreading dog, plus count - 1 random species around it."""
+    rng = rng or np.random.default_rng()
+    species = [Species(DOG_ANIMAL_ID, "spread" if pattern == "mixed" else pattern, START_LAT, START_LNG)]
+    for k in range(1, count):
+        species.append(Species(
+            f"sim_species_{k:04d}",
+            PATTERNS[k % len(PATTERNS)] if pattern == "mixed" else pattern,
+            START_LAT + rng.uniform(-3, 3),
+            START_LNG + rng.uniform(-3, 3),
+            distance=rng.uniform(0.2, 2.0),
+            heading=rng.uniform(0, 360),
+            spread=rng.uniform(0.1, 1.0),
+        ))
+    return species
+
+
+def random_uuids(rng, n):
+    """n random version-4 UUID strings, built without a Python-level loop."""
+    raw = np.frombuffer(rng.bytes(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    nibbles = np.stack([raw >> 4, raw & 0x0F], axis=2).reshape(n, 32)
+    chars = _HEX[nibbles]
+    chars = np.insert(chars, [8, 12, 16, 20], b"-", axis=1)
+    return chars.view("S36").ravel().astype("U36")
+
+
+def _offsets(pattern, t, rng, distance, heading, spread):
+    """Lat/lng offsets from the origin for sightings at time fractions t (0-1)."""
+    n = len(t)
+    if pattern == "spread":
+        # Dogs spread west and +-spread degrees north/south over time
+        return rng.uniform(-1, 1, n) * t * spread, -distance * t
+    if pattern == "stationary":
+        return rng.normal(0, 0.1 * spread, n), rng.normal(0, 0.1 * spread, n)
+    if pattern == "radial":
+        radius = distance * np.sqrt(t * rng.random(n))
+        angle = rng.uniform(0, 2 * np.pi, n)
+        return radius * np.cos(angle), radius * np.sin(angle)
+
+    # linear moves steadily along the heading; seasonal goes out and comes back
+    along = distance * (t if pattern == "linear" else np.sin(np.pi * t))
+    across = rng.normal(0, 0.05 * spread, n)
+    radians = np.radians(heading)
+    return (along * np.cos(radians) - across * np.sin(radians),
+            along * np.sin(radians) + across * np.cos(radians))
+
+
+def generate_sightings(rows, species, days=10, chunk_size=100_000, seed=None, end=None, user_id=USER_ID):
+    """
+    Yield sightings in chunks, each a dict of equal-length NumPy arrays keyed by COLUMNS.
+
+    Sightings are evenly spread over the `days` before `end` (default: now), in
+    time order across chunks, and each one is assigned a random species.
+    Timestamps are naive local wall-clock times, as the original script wrote.
+    """
+    rng = np.random.default_rng(seed)
+    end = end or datetime.datetime.now()
+    if end.tzinfo is not None:
+        end = end.astimezone().replace(tzinfo=None)
+    # Milliseconds of the local wall-clock start, not of the UTC instant, so CSV and
+    # Firestore get the same local times as before
+    start_ms = (end - datetime.timedelta(days=days) - datetime.datetime(1970, 1, 1)) // datetime.timedelta(milliseconds=1)
+    span_ms = days * 86_400_000
+
+    animal_ids = np.array([s.animal_id for s in species])
+    origin_lat = np.array([s.origin_lat for s in species])
+    origin_lng = np.array([s.origin_lng for s in species])
+
+    for first in range(0, rows, chunk_size):
+        n = min(chunk_size, rows - first)
+        index = np.arange(first + 1, first + n + 1)
+        t = index / rows
+        which = rng.integers(len(species), size=n)
+
+        lat = origin_lat[which] + rng.uniform(-0.05, 0.05, n)
+        lng = origin_lng[which] + rng.uniform(-0.05, 0.05, n)
+        for k, s in enumerate(species):
+            mask = which == k
+            if mask.any():
+                d_lat, d_lng = _offsets(s.pattern, t[mask], rng, s.distance, s.heading, s.spread)
+                lat[mask] += d_lat
+                lng[mask] += d_lng
+
+        yield {
+            "id": random_uuids(rng, n),
+            "userId": np.full(n, user_id),
+            "animalClassification": animal_ids[which],
+            "timestamp": (start_ms + (t * span_ms).astype(np.int64)).astype("datetime64[ms]"),
+            "latitude": lat,
+            "longitude": lng,
+            "encryptedImageData": np.char.add("mock_dog_image_", index.astype(str)),
+        }
+
+
+def format_timestamps(timestamps):
+    return np.char.replace(np.datetime_as_string(timestamps, unit="s"), "T", " ")
+
+
+class MemorySink:
+    """Keeps every chunk in memory; a stand-in for Firestore in tests and benchmarks."""
+
+    def __init__(self):
+        self.chunks = []
+        self.rows = 0
+
+    def write(self, chunk):
+        self.chunks.append(chunk)
+        self.rows += len(chunk["id"])
+
+    def close(self):
+        pass
+
+    def documents(self):
+        """Rows shaped like the Firestore photo documents."""
+        for chunk in self.chunks:
+            yield from chunk_documents(chunk)
+
+
+def chunk_documents(chunk):
+    """Turn one chunk into Firestore photo documents (location is [lat, lng])."""
+    timestamps = chunk["timestamp"].astype("datetime64[us]").tolist()
+    for i, doc_id in enumerate(chunk["id"].tolist()):
+        yield {
+            "id": doc_id,
+            "userId": str(chunk["userId"][i]),
+            "animalClassification": str(chunk["animalClassification"][i]),
+            "timestamp": timestamps[i],
+            "location": [float(chunk["latitude"][i]), float(chunk["longitude"][i])],
+            "encryptedImageData": str(chunk["encryptedImageData"][i]),
+        }
+
+
+class FirestoreSink:
+    """Writes documents with batched commits of up to 500, a few commits in flight at once."""
+
+    def __init__(self, db, collection="photos", batch_size=FIRESTORE_BATCH_LIMIT, max_in_flight=4):
+        self.db = db
+        self.collection = db.collection(collection)
+        self.batch_size = min(batch_size, FIRESTORE_BATCH_LIMIT)
+        self.rows = 0
+        self.failed = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._max_in_flight = max_in_flight
+        self._pending = []
+
+    def write(self, chunk):
+        batch, size = self.db.batch(), 0
+        for document in chunk_documents(chunk):
+            batch.set(self.collection.document(document["id"]), document)
+            size += 1
+            if size == self.batch_size:
+                self._commit(batch, size)
+                batch, size = self.db.batch(), 0
+        if size:
+            self._commit(batch, size)
+
+    def _commit(self, batch, size):
+        while len(self._pending) >= self._max_in_flight:
+            self._wait(self._pending.pop(0))
+        self._pending.append((self._executor.submit(batch.commit), size))
+
+    def _wait(self, pending):
+        future, size = pending
+        try:
+            future.result()
+            self.rows += size
+        except Exception as e:
+            self.failed += size
+            print(f"Error committing batch of {size}: {e}")
+
+    def close(self):
+        for pending in self._pending:
+            self._wait(pending)
+        self._pending = []
+        self._executor.shutdown()
+
+
+class CsvSink:
+    """Streams rows to a CSV file with the same columns as the original export."""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, chunk):
+        self._writer.writerows(zip(
+            chunk["id"].tolist(),
+            chunk["userId"].tolist(),
+            chunk["animalClassification"].tolist(),
+            format_timestamps(chunk["timestamp"]).tolist(),
+            chunk["latitude"].tolist(),
+            chunk["longitude"].tolist(),
+            chunk["encryptedImageData"].tolist(),
+        ))
+        self.rows += len(chunk["id"])
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """Streams chunks as row groups of a Parquet file (needs pyarrow)."""
+
+    def __init__(self, path):
+        if pa is None:
+            raise RuntimeError("The parquet sink needs pyarrow: pip install pyarrow")
+        self.path = path
+        self.rows = 0
+        self._writer = None
+
+    def write(self, chunk):
+        table = pa.table({name: chunk[name] for name in COLUMNS})
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
 
 # Initialize Firebase (you'll need to provide your own credentials file)
-# If you're not using Firebase, you can modify the database connection code
-def initialize_firebase():
+def initialize_firebase(credentials_path="path_to_your_serviceAccountKey.json"):
     try:
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
         # Use service account credentials
-        cred = credentials.Certificate("path_to_your_serviceAccountKey.json")
+        cred = credentials.Certificate(credentials_path)
         firebase_admin.initialize_app(cred)
         db = firestore.client()
         return db
     except Exception as e:
         print(f"Firebase initialization error: {e}")
-        print("Continuing in simulation mode without database connection")
         return None
 
-def simulate_dog_migration():
-    print("Starting dog migration simulation...")
 
-    # Starting coordinates
-    start_lat = 51.3781017
-    start_lng = -2.3596817
+def connect_emulator(host, project):
+    """Firestore client for the local emulator; no credentials needed."""
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud import firestore
 
-    # Animal classification ID (domestic dog)
-    animal_id = "eznjYhDJrqFSTCOXZiM2"
+    os.environ["FIRESTORE_EMULATOR_HOST"] = host
+    return firestore.Client(project=project, credentials=AnonymousCredentials())
 
-    # User ID who took the photos
-    user_id = "568be83a-562d-4386-85aa-6e5d41696029"
 
-    # Get database connection (or None if in simulation mode)
-    db = initialize_firebase()
+def default_csv_path():
+    return f"dog_migration_data_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
 
-    # Generate dates spanning 10 days from current date
-    current_date = datetime.datetime.now()
-    start_date = current_date - datetime.timedelta(days=10)
 
-    # Generate 100 dog sightings
-    generated_data = []
+def make_sink(kind, args):
+    if kind == "memory":
+        return MemorySink()
+    if kind == "csv":
+        return CsvSink(args.output or default_csv_path())
+    if kind == "parquet":
+        return ParquetSink(args.output or default_csv_path().replace(".csv", ".parquet"))
+    if kind == "emulator":
+        db = connect_emulator(args.emulator_host, args.project)
+    else:
+        db = initialize_firebase(args.credentials)
+        if db is None:
+            # Nothing to write to, so keep the data as a CSV instead (used to be an input() prompt)
+            print("Database connection wasn't established; saving the data as CSV instead")
+            return CsvSink(args.output or default_csv_path())
+    return FirestoreSink(db, args.collection, args.batch_size, args.max_in_flight)
 
-    for i in range(1, 101):
-        # Calculate time progression (0-1 range)
-        time_factor = i / 100
 
-        # Calculate days since start (distributed over 10 days)
-        days_since_start = time_factor * 10
+def run(rows, species, sinks, days=10, chunk_size=100_000, seed=None, quiet=False):
+    """Generate rows sightings into every sink; returns timing stats."""
+    generate_seconds = 0.0
+    sink_seconds = {type(sink).__name__: 0.0 for sink in sinks}
+    started = time.perf_counter()
 
-        # Generate timestamp
-        timestamp = start_date + datetime.timedelta(days=days_since_start)
+    chunks = generate_sightings(rows, species, days=days, chunk_size=chunk_size, seed=seed)
+    done = 0
+    while True:
+        t0 = time.perf_counter()
+        chunk = next(chunks, None)
+        generate_seconds += time.perf_counter() - t0
+        if chunk is None:
+            break
+        for sink in sinks:
+            t0 = time.perf_counter()
+            sink.write(chunk)
+            sink_seconds[type(sink).__name__] += time.perf_counter() - t0
+        done += len(chunk["id"])
+        if not quiet:
+            elapsed = time.perf_counter() - started
+            print(f"{done}/{rows} sightings ({done / elapsed:,.0f} rows/s)")
 
-        # Calculate position spread based on time progression
-        # Dogs spread +1 degree west and ±1 degree north/south over time
-        lng_offset = -1 * time_factor  # Moving west (negative)
+    for sink in sinks:
+        t0 = time.perf_counter()
+        sink.close()
+        sink_seconds[type(sink).__name__] += time.perf_counter() - t0
 
-        # Random north/south movement within range determined by time
-        max_lat_offset = time_factor  # Maximum offset grows with time
-        lat_offset = random.uniform(-max_lat_offset, max_lat_offset)
+    total = time.perf_counter() - started
+    return {
+        "rows": done,
+        "seconds": total,
+        "rows_per_s": done / total if total else 0.0,
+        "generate_rows_per_s": done / generate_seconds if generate_seconds else 0.0,
+        "sink_rows_per_s": {name: done / seconds if seconds else 0.0 for name, seconds in sink_seconds.items()},
+    }
 
-        # Add some randomness to movement
-        random_lat = random.uniform(-0.05, 0.05)  # Small random variation
-        random_lng = random.uniform(-0.05, 0.05)  # Small random variation
 
-        # Calculate final position
-        final_lat = start_lat + lat_offset + random_lat
-        final_lng = start_lng + lng_offset + random_lng
+def main():
+    parser = argparse.ArgumentParser(description="Generate simulated animal sightings for load tests")
+    parser.add_argument("--rows", type=int, default=100, help="Number of sightings (default: 100)")
+    parser.add_argument("--species", type=int, default=1, help="Number of species (the first is the Bath dog)")
+    parser.add_argument("--pattern", choices=PATTERNS + ("mixed",), default="mixed",
+                        help="Migration pattern for every species, or mixed (default)")
+    parser.add_argument("--days", type=float, default=10, help="Days the sightings span, ending now")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for repeatable runs")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="Rows generated per vectorized step")
+    parser.add_argument("--sink", action="append", choices=("firestore", "emulator", "memory", "csv", "parquet"),
+                        help="Where to write; repeatable (default: firestore)")
+    parser.add_argument("-o", "--output", help="Output path for the csv/parquet sink")
+    parser.add_argument("--credentials", default="path_to_your_serviceAccountKey.json",
+                        help="Firebase service account JSON")
+    parser.add_argument("--emulator-host", default=os.environ.get("FIRESTORE_EMULATOR_HOST", "localhost:8080"))
+    parser.add_argument("--project", default="demo-bath-hack", help="Project ID used with the emulator")
+    parser.add_argument("--collection", default="photos")
+    parser.add_argument("--batch-size", type=int, default=FIRESTORE_BATCH_LIMIT, help="Documents per Firestore commit (max 500)")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Concurrent Firestore commits")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print the final summary")
+    args = parser.parse_args()
 
-        # Create data entry
-        photo_data = {
-            "userId": user_id,
-            "animalClassification": animal_id,
-            "timestamp": timestamp,
-            "location": [final_lat, final_lng],
-            "encryptedImageData": f"mock_dog_image_{i}",  # Placeholder for encrypted image data
-            "id": str(uuid.uuid4()),  # Generate random ID for the photo
-        }
-
-        generated_data.append(photo_data)
-
-        # If connected to database, add document
-        if db:
-            try:
-                doc_ref = db.collection("photos").document(photo_data["id"])
-                doc_ref.set(photo_data)
-                print(f"Added entry {i}/100: Dog at {final_lat}, {final_lng}")
-            except Exception as e:
-                print(f"Error adding document {i}: {e}")
-        else:
-            # Print simulation output
-            print(f"Simulation {i}/100: Dog at {final_lat}, {final_lng} on {timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
-
-    # Output summary of what was generated
-    print("\nSimulation Complete!")
-    print(f"Generated 100 dog sightings over 10 days")
-    print(f"Starting location: {start_lat}, {start_lng}")
-    print(f"Final locations spread approximately ±1 degree N/S and 1 degree W")
-
-    # If not connected to database, output CSV option
-    if not db:
-        print("\nDatabase connection wasn't established.")
-        print("Would you like to save the data as CSV? (yes/no)")
-        response = input().strip().lower()
-        if response == "yes":
-            save_as_csv(generated_data)
+    species = make_species(args.species, args.pattern, np.random.default_rng(args.seed))
+    try:
+        sinks = [make_sink(kind, args) for kind in (args.sink or ["firestore"])]
+    except (RuntimeError, ImportError) as e:
+        parser.error(str(e))
 
-def save_as_csv(data):
-    import csv
+    print(f"Generating {args.rows} sightings of {len(species)} species over {args.days:g} days...")
+    stats = run(args.rows, species, sinks, days=args.days, chunk_size=args.chunk_size,
+                seed=args.seed, quiet=args.quiet)
 
-    filename = f"dog_migration_data_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    print("\nSimulation Complete!")
+    print(f"Generated {stats['rows']} sightings in {stats['seconds']:.2f}s ({stats['rows_per_s']:,.0f} rows/s)")
+    print(f"  generator: {stats['generate_rows_per_s']:,.0f} rows/s")
+    for sink in sinks:
+        name = type(sink).__name__
+        where = f" -> {sink.path}" if hasattr(sink, "path") else ""
+        failed = f", {sink.failed} failed" if getattr(sink, "failed", 0) else ""
+        print(f"  {name}: {sink.rows} rows, {stats['sink_rows_per_s'][name]:,.0f} rows/s{failed}{where}")
 
-    try:
-        with open(filename, 'w', newline='') as file:
-            writer = csv.writer(file)
-            # Write header
-            writer.writerow(['id', 'userId', 'animalClassification', 'timestamp', 'latitude', 'longitude', 'encryptedImageData'])
-
-            # Write data
-            for entry in data:
-                writer.writerow([
-                    entry['id'],
-                    entry['userId'],
-                    entry['animalClassification'],
-                    entry['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-                    entry['location'][0],
-                    entry['location'][1],
-                    entry['encryptedImageData']
-                ])
-
-        print(f"Data saved to {filename}")
-    except Exception as e:
-        print(f"Error saving CSV: {e}")
 
 if __name__ == "__main__":
-    simulate_dog_migration()
\ No newline at end of file
+    main()
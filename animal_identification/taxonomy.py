@@ -0,0 +1,204 @@
+"""
+Indexed SpeciesNet taxonomy
+
+Loads lib/database/taxonomy_release.txt once into flat tuples plus a few
+indices: UUID -> entry, one index per rank (class/order/family/genus), and a
+word-prefix plus trigram index over names for search. SpeciesNet prediction
+strings use the same "uuid;class;order;family;genus;species;common name"
+layout, so parse_label() resolves them through the UUID index instead of
+everyone splitting on ';' themselves.
+"""
+
+import os
+import re
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+DEFAULT_TAXONOMY_PATH = Path(__file__).resolve().parent.parent / "lib" / "database" / "taxonomy_release.txt"
+
+RANKS = ("class", "order", "family", "genus", "species")
+
+# Longest word prefix kept in the prefix index; longer queries are checked against the name itself
+MAX_PREFIX = 12
+
+TaxonEntry = namedtuple(
+    "TaxonEntry",
+    ["uuid", "taxon_class", "order", "family", "genus", "species", "common_name"],
+)
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def entry_name(entry):
+    """Display name: the common name, or the last non-empty rank when there isn't one."""
+    if entry.common_name:
+        return entry.common_name
+    for value in reversed(entry[1:6]):
+        if value:
+            return value
+    return entry.uuid
+
+
+def entry_rank_value(entry, rank):
+    return entry[1 + RANKS.index(rank)]
+
+
+def entry_to_dict(entry):
+    return {
+        "uuid": entry.uuid,
+        "class": entry.taxon_class,
+        "order": entry.order,
+        "family": entry.family,
+        "genus": entry.genus,
+        "species": entry.species,
+        "common_name": entry.common_name,
+        "name": entry_name(entry),
+        "scientific_name": f"{entry.genus} {entry.species}".strip() if entry.genus else "",
+    }
+
+
+def _split_label(label):
+    parts = [part.strip() for part in label.split(";")]
+    parts += [""] * (7 - len(parts))
+    return TaxonEntry(*parts[:7])
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Taxonomy:
+    def __init__(self, entries):
+        self.entries = tuple(entries)
+        self._by_uuid = {}
+        self._by_rank = {rank: {} for rank in RANKS}
+        self._by_name = {}
+        self._prefixes = {}
+        self._trigrams = {}
+        self._names = []
+
+        for index, entry in enumerate(self.entries):
+            self._by_uuid[entry.uuid] = index
+            for rank in RANKS[:-1]:
+                value = entry_rank_value(entry, rank)
+                if value:
+                    self._by_rank[rank].setdefault(value, []).append(index)
+            if entry.genus and entry.species:
+                self._by_rank["species"].setdefault(f"{entry.genus} {entry.species}", []).append(index)
+
+            name = entry_name(entry).lower()
+            self._names.append(name)
+            self._by_name.setdefault(name, []).append(index)
+
+            searchable = " ".join(filter(None, (name, entry.genus, entry.species)))
+            for word in set(_WORD.findall(searchable)):
+                for length in range(1, min(len(word), MAX_PREFIX) + 1):
+                    self._prefixes.setdefault(word[:length], set()).add(index)
+            for gram in _trigrams(name):
+                self._trigrams.setdefault(gram, set()).add(index)
+
+        # Freeze the index values into tuples; they are never mutated again
+        for rank in RANKS:
+            self._by_rank[rank] = {value: tuple(indices) for value, indices in self._by_rank[rank].items()}
+        self._prefixes = {prefix: frozenset(indices) for prefix, indices in self._prefixes.items()}
+        self._trigrams = {gram: frozenset(indices) for gram, indices in self._trigrams.items()}
+
+    @classmethod
+    def load(cls, path=None):
+        path = Path(path or os.environ.get("TAXONOMY_PATH") or DEFAULT_TAXONOMY_PATH)
+        with open(path, "r", encoding="utf-8") as f:
+            entries = [_split_label(line) for line in f if line.strip()]
+        return cls(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, uuid):
+        """O(1) lookup by taxonomy UUID."""
+        index = self._by_uuid.get(uuid)
+        return None if index is None else self.entries[index]
+
+    def by_name(self, name):
+        return [self.entries[index] for index in self._by_name.get(name.strip().lower(), ())]
+
+    def by_rank(self, rank, value):
+        """Every entry whose class/order/family/genus (or 'genus species') equals value."""
+        if rank not in self._by_rank:
+            raise ValueError(f"Unknown rank {rank!r}; expected one of {', '.join(RANKS)}")
+        return [self.entries[index] for index in self._by_rank[rank].get(value.strip().lower(), ())]
+
+    def rank_values(self, rank):
+        return sorted(self._by_rank[rank])
+
+    def parse_label(self, label):
+        """Resolve a SpeciesNet prediction string to an entry, falling back to its own fields."""
+        if not label:
+            return None
+        uuid = label.split(";", 1)[0].strip()
+        return self.get(uuid) or _split_label(label)
+
+    def search(self, query, limit=20, rank=None, value=None):
+        """Rank entries by how well their names match query.
+
+        Every query word has to be a word prefix of the name (or its genus or
+        species); if that finds nothing we fall back to trigram similarity so
+        small typos still return something.
+        """
+        query = query.strip().lower()
+        words = _WORD.findall(query)
+        allowed = None
+        if rank and value:
+            allowed = set(self._by_rank.get(rank, {}).get(value.strip().lower(), ()))
+
+        candidates = None
+        for word in words:
+            matches = self._prefixes.get(word[:MAX_PREFIX], frozenset())
+            if len(word) > MAX_PREFIX:
+                matches = {index for index in matches if word in self._names[index]}
+            candidates = set(matches) if candidates is None else candidates & matches
+            if not candidates:
+                break
+
+        if candidates:
+            scored = []
+            for index in candidates:
+                name = self._names[index]
+                if name == query:
+                    score = 3.0
+                elif name.startswith(query):
+                    score = 2.0
+                else:
+                    score = 1.0
+                scored.append((score, -len(name), index))
+        else:
+            grams = _trigrams(query)
+            counts = {}
+            for gram in grams:
+                for index in self._trigrams.get(gram, ()):
+                    counts[index] = counts.get(index, 0) + 1
+            scored = [
+                (count / len(grams | _trigrams(self._names[index])), -len(self._names[index]), index)
+                for index, count in counts.items()
+                if count >= max(1, len(grams) // 3)
+            ]
+
+        if allowed is not None:
+            scored = [item for item in scored if item[2] in allowed]
+        scored.sort(reverse=True)
+        return [self.entries[index] for _, _, index in scored[:limit]]
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_taxonomy():
+    """Process-wide taxonomy, loaded on first use."""
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = Taxonomy.load()
+    return _default
@@ -0,0 +1,153 @@
+"""
+Detector-first tiered SpeciesNet inference
+
+SpeciesNet's full pipeline runs the MegaDetector-style detector and the species
+classifier on every image. Blank frames and frames with only people or vehicles
+never need the classifier, so the tiered mode runs the detector on the whole
+batch first. Images with no animal detection above the threshold get a
+blank/human/vehicle prediction straight from their detections. Only the rest
+go through the classifier, which crops to their detections, and the ensemble.
+
+Predictions keep the usual SpeciesNet shape. Each one gets a "tier"
+("detector", "classifier" or "failed") and its share of the batch's detector/classifier
+time, so callers can report skip rates and the compute saved.
+"""
+
+import time
+
+BLANK_LABEL = "f1856211-cfb7-4a5b-9158-c0f72fd09ee6;;;;;;blank"
+HUMAN_LABEL = "990ae9dd-7a59-4344-afcb-1b7b21368000;mammalia;primates;hominidae;homo;sapiens;human"
+VEHICLE_LABEL = "e2895ed5-780b-48f6-8a11-9e27cb594511;;;;;;vehicle"
+
+DEFAULT_ANIMAL_THRESHOLD = 0.2
+
+
+def best_detection(detections, label):
+    """Highest-confidence detection with the given label, or None."""
+    matches = [d for d in detections or [] if d.get("label") == label]
+    return max(matches, key=lambda d: d.get("conf", 0), default=None)
+
+
+def short_circuit(detection, animal_threshold=DEFAULT_ANIMAL_THRESHOLD):
+    """
+    Final prediction for an image the classifier can skip, or None if it needs classifying.
+
+    Detector failures are final too: there is nothing to crop for the classifier.
+    """
+    if detection.get("failures"):
+        return dict(detection, prediction=None)
+
+    detections = detection.get("detections") or []
+    animal = best_detection(detections, "animal")
+    if animal is not None and animal.get("conf", 0) >= animal_threshold:
+        return None
+
+    label, score = BLANK_LABEL, 1.0 - (animal.get("conf", 0) if animal else 0.0)
+    for kind, kind_label in (("human", HUMAN_LABEL), ("vehicle", VEHICLE_LABEL)):
+        found = best_detection(detections, kind)
+        if found is not None and found.get("conf", 0) >= animal_threshold:
+            label, score = kind_label, found["conf"]
+            break
+
+    return {
+        "filepath": detection["filepath"],
+        "detections": detections,
+        "prediction": label,
+        "prediction_score": score,
+        "prediction_source": "detector",
+        "model_version": detection.get("model_version"),
+    }
+
+
+class TieredClassifier:
+    """Wraps a loaded SpeciesNet model; predict() is a drop-in for SpeciesNet.predict()."""
+
+    def __init__(self, model, animal_threshold=DEFAULT_ANIMAL_THRESHOLD):
+        self.model = model
+        self.animal_threshold = animal_threshold
+
+    def predict(self, filepaths, batch_size=8, progress_bars=False, **kwargs):
+        started = time.perf_counter()
+        detected = self.model.detect(filepaths=filepaths, batch_size=batch_size, progress_bars=progress_bars) or {}
+        detector_seconds = time.perf_counter() - started
+
+        detections = {p["filepath"]: p for p in detected.get("predictions", [])}
+        final = {}
+        to_classify = []
+        for filepath in filepaths:
+            detection = detections.get(filepath) or {"filepath": filepath, "failures": ["DETECTOR"]}
+            prediction = short_circuit(detection, self.animal_threshold)
+            if prediction is None:
+                to_classify.append(filepath)
+            else:
+                prediction["tier"] = "failed" if prediction.get("failures") else "detector"
+                final[filepath] = prediction
+
+        classifier_seconds = 0.0
+        if to_classify:
+            detections_dict = {filepath: detections[filepath] for filepath in to_classify}
+            started = time.perf_counter()
+            classified = self.model.classify(
+                filepaths=to_classify,
+                detections_dict=detections_dict,
+                batch_size=batch_size,
+                progress_bars=progress_bars,
+            ) or {}
+            ensembled = self.model.ensemble_from_past_runs(
+                filepaths=to_classify,
+                classifications_dict={p["filepath"]: p for p in classified.get("predictions", [])},
+                detections_dict=detections_dict,
+                progress_bars=progress_bars,
+            ) or {}
+            classifier_seconds = time.perf_counter() - started
+            for prediction in ensembled.get("predictions", []):
+                prediction["tier"] = "classifier"
+                final[prediction["filepath"]] = prediction
+
+        detector_share = detector_seconds / len(filepaths) if filepaths else 0.0
+        classifier_share = classifier_seconds / len(to_classify) if to_classify else 0.0
+        predictions = []
+        for filepath in filepaths:
+            prediction = final.get(filepath) or {
+                "filepath": filepath, "prediction": None, "failures": ["CLASSIFIER"], "tier": "classifier",
+            }
+            prediction["tier_seconds"] = {
+                "detector": detector_share,
+                "classifier": classifier_share if prediction["tier"] == "classifier" else 0.0,
+            }
+            predictions.append(prediction)
+        return {"predictions": predictions}
+
+
+def summarise_tiers(predictions, classifier_seconds_per_image=None):
+    """
+    Skip rate and compute saved over tiered predictions. Cached and
+    burst-propagated copies are left out, since they never reached the model.
+
+    The saving is the skipped images times the mean classifier time of the
+    images that were classified (or classifier_seconds_per_image when none were).
+    """
+    tiered = [p for p in predictions if p.get("tier") and not p.get("cached") and not p.get("propagated")]
+    if not tiered:
+        return None
+
+    skipped = [p for p in tiered if p["tier"] == "detector"]
+    classified = [p for p in tiered if p["tier"] == "classifier"]
+    detector_seconds = sum(p.get("tier_seconds", {}).get("detector", 0.0) for p in tiered)
+    classifier_seconds = sum(p.get("tier_seconds", {}).get("classifier", 0.0) for p in classified)
+    if classified:
+        classifier_seconds_per_image = classifier_seconds / len(classified)
+
+    saved = None
+    if classifier_seconds_per_image is not None:
+        saved = classifier_seconds_per_image * len(skipped)
+
+    return {
+        "images": len(tiered),
+        "classifier_skipped": len(skipped),
+        "classified": len(classified),
+        "skip_rate": len(skipped) / len(tiered),
+        "detector_seconds": detector_seconds,
+        "classifier_seconds": classifier_seconds,
+        "estimated_seconds_saved": saved,
+    }
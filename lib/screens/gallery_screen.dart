@@ -238,7 +238,7 @@ class _GalleryScreenState extends State<GalleryScreen> {
 
     try {
       _logDebug("Checking status for session: $_sessionId");
-      final statusResponse = await _api.checkStatus(_sessionId);
+      final statusResponse = await _api.checkStatus(_sessionId, fields: ['animal']);
 
       if (statusResponse['status'] == 'complete') {
         _logDebug("Processing complete, parsing results");
@@ -1,5 +1,6 @@
 import 'dart:convert';
 import 'dart:io';
+import 'dart:math';
 import 'package:http/http.dart' as http;
 import 'package:http_parser/http_parser.dart';
 
@@ -10,11 +11,15 @@ class AnimalDetectionApi {
 
   AnimalDetectionApi({this.baseUrl = 'http://172.26.15.254:8000'});
 
-  Future<Map<String, dynamic>> startDetection(List<File> images) async {
+  // priority is 'interactive' or 'bulk'; the server picks from the image count when omitted
+  Future<Map<String, dynamic>> startDetection(List<File> images, {String? priority}) async {
     try {
       final Uri url = Uri.parse('$baseUrl/detect-animals');
 
       var request = http.MultipartRequest('POST', url);
+      if (priority != null) {
+        request.fields['priority'] = priority;
+      }
 
       // Add all images to the request
       for (var i = 0; i < images.length; i++) {
@@ -37,6 +42,9 @@ class AnimalDetectionApi {
       if (response.statusCode == 200) {
         final jsonResponse = json.decode(response.body);
         return jsonResponse;
+      } else if (response.statusCode == 429) {
+        final retryAfter = response.headers['retry-after'] ?? '?';
+        throw Exception('Server busy, retry in ${retryAfter}s');
       } else {
         throw Exception('Failed to upload images: ${response.statusCode}');
       }
@@ -45,10 +53,129 @@ class AnimalDetectionApi {
     }
   }
 
-  Future<Map<String, dynamic>> checkStatus(String sessionId) async {
+  // Resumable upload: each file is sent in chunks, so a dropped connection only
+  // costs the chunk in flight. Pass the uploadId of an interrupted call to resume it.
+  Future<Map<String, dynamic>> startResumableDetection(List<File> images,
+      {String? priority, String? uploadId, int maxAttempts = 5}) async {
+    try {
+      Map<String, dynamic> upload;
+      if (uploadId != null) {
+        upload = await _uploadStatus(uploadId);
+      } else {
+        final files = [
+          for (final file in images) {'name': file.path.split('/').last, 'size': await file.length()}
+        ];
+        final response = await http.post(
+          Uri.parse('$baseUrl/uploads'),
+          headers: {'Content-Type': 'application/json'},
+          body: json.encode({'files': files, if (priority != null) 'priority': priority}),
+        );
+        if (response.statusCode != 201) {
+          throw Exception('Failed to create upload: ${response.statusCode}');
+        }
+        upload = json.decode(response.body);
+      }
+
+      final id = upload['upload_id'] as String;
+      final chunkSize = upload['chunk_size'] as int;
+      final byName = {for (final file in images) file.path.split('/').last: file};
+      Map<String, dynamic>? detection = upload['detection'];
+
+      for (final entry in upload['files']) {
+        if (detection != null) break;
+        final name = entry['name'] as String;
+        final size = entry['size'] as int;
+        var offset = entry['offset'] as int;
+        var failures = 0;
+        final raf = await byName[name]!.open();
+        try {
+          while (offset < size && detection == null) {
+            await raf.setPosition(offset);
+            final chunk = await raf.read(min(chunkSize, size - offset));
+            try {
+              final response = await http.patch(
+                Uri.parse('$baseUrl/uploads/$id/${Uri.encodeComponent(name)}'),
+                headers: {'Upload-Offset': '$offset', 'Content-Type': 'application/offset+octet-stream'},
+                body: chunk,
+              );
+              if (response.statusCode == 200) {
+                final body = json.decode(response.body);
+                offset = body['offset'];
+                detection = body['detection'];
+                failures = 0;
+                continue;
+              }
+              if (response.statusCode != 409) {
+                throw Exception('Failed to upload $name: ${response.statusCode}');
+              }
+            } on SocketException {
+              if (++failures >= maxAttempts) rethrow;
+              await Future.delayed(Duration(seconds: failures));
+            } on http.ClientException {
+              if (++failures >= maxAttempts) rethrow;
+              await Future.delayed(Duration(seconds: failures));
+            }
+
+            // Out of step or cut off: carry on from what the server committed
+            final status = await _uploadStatus(id);
+            detection = status['detection'];
+            offset = status['files'].firstWhere((file) => file['name'] == name)['offset'];
+          }
+        } finally {
+          await raf.close();
+        }
+      }
+
+      // The last chunk starts detection unless the queue was full at that moment
+      while (detection == null) {
+        final response = await http.post(Uri.parse('$baseUrl/uploads/$id/start'));
+        if (response.statusCode == 200) {
+          detection = json.decode(response.body);
+        } else if (response.statusCode == 429) {
+          final retryAfter = int.tryParse(response.headers['retry-after'] ?? '') ?? 5;
+          await Future.delayed(Duration(seconds: retryAfter));
+        } else {
+          throw Exception('Failed to start detection: ${response.statusCode}');
+        }
+      }
+      return detection;
+    } catch (e) {
+      throw Exception('API error: $e');
+    }
+  }
+
+  // Taxonomy entries with descriptions. Pass the version of the last sync to get
+  // only what changed since: 'entries' to upsert and 'deleted' UUIDs to drop.
+  // When 'full' is true the response replaces the local catalog instead.
+  Future<Map<String, dynamic>> fetchCatalog({int? since}) async {
+    try {
+      final query = since == null ? '' : '?since=$since';
+      final response = await http.get(Uri.parse('$baseUrl/catalog$query'));
+      if (response.statusCode == 200) {
+        return json.decode(utf8.decode(response.bodyBytes));
+      } else {
+        throw Exception('Failed to fetch catalog: ${response.statusCode}');
+      }
+    } catch (e) {
+      throw Exception('API error: $e');
+    }
+  }
+
+  Future<Map<String, dynamic>> _uploadStatus(String uploadId) async {
+    final response = await http.get(Uri.parse('$baseUrl/uploads/$uploadId'));
+    if (response.statusCode != 200) {
+      throw Exception('Failed to check upload: ${response.statusCode}');
+    }
+    return json.decode(response.body);
+  }
+
+  // fields (e.g. ['animal', 'confidence']) asks for a compact response with only
+  // those result fields; filename is always included
+  Future<Map<String, dynamic>> checkStatus(String sessionId, {List<String>? fields}) async {
     try {
+      final query = fields == null ? '' : '?compact=true&fields=${fields.join(',')}';
       final response = await http.get(
-        Uri.parse('$baseUrl/detection-status/$sessionId'),
+        Uri.parse('$baseUrl/detection-status/$sessionId$query'),
       );
 
       if (response.statusCode == 200) {